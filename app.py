@@ -3,6 +3,7 @@ import gspread
 import pandas as pd
 from openai import OpenAI
 from flask import Flask, request, jsonify
+from app.services.google_sheets_service import get_spreadsheet, open_worksheet
 import datetime
 
 # --- KHỞI TẠO ỨNG DỤNG FLASK ---
@@ -22,9 +23,7 @@ HISTORY_WORKSHEET_NAME = os.getenv("HISTORY_WORKSHEET_NAME")
 def get_google_sheet_data(sheet_name):
     """Kết nối với Google Sheets và đọc dữ liệu vào một DataFrame."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(sheet_name)
-        worksheet = spreadsheet.sheet1
+        worksheet = open_worksheet(sheet_name)
         data = worksheet.get_all_records()
         df = pd.DataFrame(data)
         print(f"Đọc dữ liệu từ Google Sheet '{sheet_name}' thành công.")
@@ -39,8 +38,7 @@ def get_google_sheet_data(sheet_name):
 def get_worksheet(sheet_name, worksheet_index=0):
     """Hàm trợ giúp để lấy đối tượng worksheet."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(sheet_name)
+        spreadsheet = get_spreadsheet(sheet_name)
         # Lấy sheet đầu tiên theo index
         worksheet = spreadsheet.get_worksheet(worksheet_index)
         return worksheet
@@ -81,9 +79,7 @@ def find_relevant_data(question, dataframe, max_rows=5):
 def add_data_to_google_sheet(sheet_name, data_to_add):
     """Thêm một hàng dữ liệu mới vào cuối Google Sheet."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(sheet_name)
-        worksheet = spreadsheet.sheet1
+        worksheet = open_worksheet(sheet_name)
         worksheet.append_row(data_to_add)
         return True, None
     except Exception as e:
@@ -92,9 +88,7 @@ def add_data_to_google_sheet(sheet_name, data_to_add):
 def log_chat_history(spreadsheet_name, worksheet_name, data_to_log):
     """Ghi lịch sử chat vào một trang tính cụ thể."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(spreadsheet_name)
-        worksheet = spreadsheet.worksheet(worksheet_name)
+        worksheet = open_worksheet(spreadsheet_name, worksheet_name)
         worksheet.append_row(data_to_log)
         return True, None
     except Exception as e:
@@ -309,9 +303,7 @@ def delete_knowledge(item_id):
 def get_log_chat():
     """Lấy danh sách toàn bộ lịch sử chat."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(GOOGLE_SHEET_NAME)
-        worksheet = spreadsheet.worksheet(HISTORY_WORKSHEET_NAME)
+        worksheet = open_worksheet(GOOGLE_SHEET_NAME, HISTORY_WORKSHEET_NAME)
         history_data = worksheet.get_all_records()
         return jsonify(history_data), 200
     except gspread.exceptions.WorksheetNotFound:
@@ -327,9 +319,7 @@ def get_chat_detail(chat_id):
         return jsonify({'error': 'Cần cung cấp chat_id.'}), 400
 
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(GOOGLE_SHEET_NAME)
-        worksheet = spreadsheet.worksheet(HISTORY_WORKSHEET_NAME)
+        worksheet = open_worksheet(GOOGLE_SHEET_NAME, HISTORY_WORKSHEET_NAME)
         if worksheet is None:
             return jsonify({'error': f'Không tìm thấy trang tính lịch sử "{HISTORY_WORKSHEET_NAME}".'}), 404
         
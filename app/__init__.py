@@ -1,4 +1,6 @@
 # /chatbotAI/app/__init__.py
+import threading
+
 from flask import Flask
 from config import Config
 
@@ -12,16 +14,51 @@ def create_app(config_class=Config):
     # Sử dụng app_context để đảm bảo context của ứng dụng có sẵn
     with app.app_context():
         # Import các thành phần khác ở đây để tránh lỗi circular import
-        from .services import google_sheets_service as gs
-        
-        # --- Tải dữ liệu một lần khi khởi động ---
-        print("Đang tải dữ liệu từ Google Sheet khi khởi động...")
-        initial_data = gs.get_google_sheet_data()
-        if initial_data is None:
-            print("LỖI NGHIÊM TRỌNG: Không thể tải dữ liệu ban đầu.")
+        from .services import storage, snapshot_cache
+        from .services.knowledge_store import KnowledgeStore
+        from .services.knowledge_refresher import KnowledgeRefresher
         
-        # Gắn dữ liệu đã tải vào đối tượng app để các blueprint có thể truy cập
-        app.initial_sheet_data = initial_data
+        # --- Tải dữ liệu khi khởi động: ưu tiên snapshot đã lưu trên đĩa ---
+        # Có snapshot thì phục vụ ngay, rồi kiểm tra lại với Google Sheet ở luồng nền;
+        # nhờ vậy server vẫn khởi động nhanh và trả lời được khi Google Sheet chậm hoặc mất kết nối.
+        snapshot_path = config_class.SNAPSHOT_CACHE_PATH
+        cached = snapshot_cache.load_snapshot(snapshot_path)
+        if cached:
+            app.knowledge_store = KnowledgeStore(cached['dataframe'], cached['index'], cached['vectors'],
+                                                 cached['bm25'])
+            change_token = cached['change_token']
+        else:
+            print("Đang tải dữ liệu kiến thức khi khởi động...")
+            change_token = storage.get_change_token()
+            initial_data = storage.get_knowledge_data()
+            if initial_data is None:
+                print("LỖI NGHIÊM TRỌNG: Không thể tải dữ liệu ban đầu.")
+                change_token = None
+
+            # Gắn dữ liệu đã tải (kèm chỉ mục tìm kiếm) vào đối tượng app dưới dạng
+            # snapshot bất biến để các blueprint đọc chung mà không cần sao chép
+            app.knowledge_store = KnowledgeStore(initial_data)
+            snapshot_cache.save_snapshot(snapshot_path, app.knowledge_store.get(), change_token)
+
+        # Luồng nền theo dõi thay đổi của Google Sheet (kể cả sửa trực tiếp trên sheet)
+        # và hoán đổi snapshot mới ngoài luồng request
+        app.knowledge_refresher = KnowledgeRefresher(
+            app.knowledge_store,
+            storage.get_knowledge_data,
+            storage.get_change_token,
+            interval_seconds=config_class.KNOWLEDGE_REFRESH_INTERVAL,
+            full_resync_seconds=config_class.KNOWLEDGE_FULL_RESYNC_INTERVAL,
+            change_token=change_token,
+            on_refresh=lambda snapshot, token: snapshot_cache.save_snapshot(snapshot_path, snapshot, token),
+        )
+        app.knowledge_refresher.start()
+        if cached:
+            # Kiểm tra lại snapshot từ đĩa với Google Sheet mà không chặn khởi động
+            threading.Thread(
+                target=app.knowledge_refresher.refresh,
+                kwargs={'force': change_token is None},
+                daemon=True,
+            ).start()
         
         # --- Đăng ký Blueprints ---
         from .api.chat_api import chat_bp
@@ -33,6 +70,29 @@ def create_app(config_class=Config):
         app.register_blueprint(knowledge_bp, url_prefix='/api/knowledge')
         print("Đã đăng ký các blueprint thành công!")
 
+        # --- Khởi động luồng ghi lịch sử chat nền (ghi theo lô vào Google Sheet) ---
+        from .services.history_logger import history_logger
+        history_logger.start()
+
+        # --- Nạp sẵn lịch sử chat vào bộ nhớ ở luồng nền để API lịch sử không phải đọc cả sheet ---
+        from .services.history_store import history_store
+        threading.Thread(target=history_store.ensure_loaded, daemon=True).start()
+
+        # --- Nạp danh mục phường/xã, cơ quan (nếu có cấu hình) ở luồng nền ---
+        from .services import gazetteer
+        if config_class.WORK_SHEET_PHUONG_XA or config_class.WORK_SHEET_CO_QUAN:
+            def _load_gazetteer():
+                gazetteer.reload()
+                # Dựng sẵn ánh xạ đơn vị -> hàng theo danh mục vừa nạp, ngoài đường trả lời request
+                app.knowledge_store.refresh_unit_labels()
+
+            threading.Thread(target=_load_gazetteer, daemon=True).start()
+
+        # --- Mở sẵn kết nối tới DeepSeek (tùy chọn, chạy nền để không chặn khởi động) ---
+        from .services import deepseek_client
+        if config_class.DEEPSEEK_WARMUP_CONNECTIONS > 0:
+            threading.Thread(target=deepseek_client.warm_up, daemon=True).start()
+
     # Route đơn giản để kiểm tra server có đang chạy không
     @app.route('/health')
     def health():
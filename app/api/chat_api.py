@@ -1,17 +1,41 @@
 # /chatbotAI/app/api/chat_api.py
-from flask import Blueprint, request, jsonify, current_app
-from app.services import ai_service, google_sheets_service as gs
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from app.services import ai_service, storage
+from app.services.answer_cache import answer_cache
+from app.services.history_logger import history_logger
+from app.services.history_store import history_store
+from app.services.single_flight import answer_flight, async_answer_flight
 import datetime
+import json
 
 # Tạo một Blueprint
 chat_bp = Blueprint('chat_api', __name__)
 
+def _build_log_row(question, answer, now=None):
+    """Tạo một hàng lịch sử chat: [id, thời gian, câu hỏi, câu trả lời]."""
+    now = now or datetime.datetime.now()
+    return [
+        now.strftime("%Y%m%d%H%M%S%f"),
+        now.strftime("%Y-%m-%d %H:%M:%S"),
+        question,
+        answer
+    ]
+
+def _record_chat(log_data):
+    """Ghi nhận một lượt hỏi đáp: cập nhật kho lịch sử trong bộ nhớ và ghi nền vào Google Sheet."""
+    history_store.add(log_data)
+    history_logger.submit(log_data)
+
+def _sse_event(payload):
+    """Định dạng một sự kiện Server-Sent Events chứa JSON."""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
 @chat_bp.route('/ask', methods=['POST'])
 def ask():
-    # Lấy dữ liệu đã được tải sẵn từ application context
-    sheet_data_df = current_app.initial_sheet_data
+    # Lấy snapshot dữ liệu đã được tải sẵn từ application context (dùng chung, không sao chép)
+    snapshot = current_app.knowledge_store.get()
  
-    if sheet_data_df is None:
+    if not snapshot.is_loaded:
         return jsonify({'error': 'Dữ liệu chưa được tải hoặc tải lỗi.'}), 500
 
     data = request.get_json()
@@ -20,28 +44,181 @@ def ask():
         return jsonify({'error': 'Câu hỏi không được để trống.'}), 400
 
     print(f"Nhận được câu hỏi: {question}")
-    answer = ai_service.answer_question_with_deepseek(question, sheet_data_df.copy())
+    # Câu hỏi trùng khớp rõ ràng với một câu hỏi đã lưu thì trả lời ngay, không gọi AI
+    direct = ai_service.find_direct_answer(question, snapshot)
+    if direct:
+        print(f"Trả lời trực tiếp từ dữ liệu kiến thức (độ tin cậy {direct['confidence']}).")
+        answer = direct['answer']
+    else:
+        answer = ai_service.answer_question_with_deepseek(question, snapshot)
 
-    log_data = [
-        datetime.datetime.now().strftime("%Y%m%d%H%M%S%f"),
-        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        question,
-        answer
-    ]
-    gs.log_chat_history(log_data)
+    log_data = _build_log_row(question, answer)
+    # Ghi lịch sử nền theo lô, không chờ Google Sheets
+    _record_chat(log_data)
+    if direct:
+        return jsonify({**direct, 'source': 'knowledge_base'})
     return jsonify({'answer': answer})
 
-@chat_bp.route('/history-chat', methods=['GET'])
-def get_log_chat():
-    """Endpoint để lấy toàn bộ lịch sử trò chuyện."""
-    history_data = gs.get_chat_history_data()
+@chat_bp.route('/ask-batch', methods=['POST'])
+def ask_batch():
+    """
+    Hỏi nhiều câu một lần: body {"questions": [...]} (hoặc một mảng câu hỏi).
+    Trả về kết quả theo đúng thứ tự gửi lên; câu hỏi lỗi có trường 'error' mà không làm hỏng cả lô.
+    Lịch sử của cả lô được ghi bằng một lần append.
+    """
+    snapshot = current_app.knowledge_store.get()
+    if not snapshot.is_loaded:
+        return jsonify({'error': 'Dữ liệu chưa được tải hoặc tải lỗi.'}), 500
+
+    data = request.get_json(silent=True)
+    questions = data.get('questions') if isinstance(data, dict) else data
+    if not isinstance(questions, list) or not questions:
+        return jsonify({'error': 'Danh sách câu hỏi không được để trống.'}), 400
+    max_questions = current_app.config['BATCH_MAX_QUESTIONS']
+    if len(questions) > max_questions:
+        return jsonify({'error': f'Tối đa {max_questions} câu hỏi mỗi lần.'}), 400
+
+    results = [{'index': position, 'question': question} for position, question in enumerate(questions)]
+    valid = [position for position, question in enumerate(questions) if isinstance(question, str) and question.strip()]
+    for position in set(range(len(questions))) - set(valid):
+        results[position]['error'] = 'Câu hỏi không được để trống.'
+
+    print(f"Nhận được {len(valid)} câu hỏi theo lô.")
+    answers = ai_service.answer_questions([questions[position] for position in valid], snapshot,
+                                          current_app.config['BATCH_LLM_CONCURRENCY'])
+
+    log_rows = []
+    now = datetime.datetime.now()
+    for offset, (position, answer) in enumerate(zip(valid, answers)):
+        # ID lịch sử lấy theo thời gian: lệch mỗi hàng một micro giây để các hàng trong lô không trùng ID
+        log_data = _build_log_row(questions[position], answer.get('answer', answer.get('error')),
+                                  now + datetime.timedelta(microseconds=offset))
+        log_rows.append(log_data)
+        results[position].update(answer, id=log_data[0])
+
+    # Ghi lịch sử của cả lô một lần: kho trong bộ nhớ cập nhật ngay, Google Sheet ghi nền cùng một append
+    history_store.add_many(log_rows)
+    history_logger.submit_many(log_rows)
+    return jsonify({'results': results, 'count': len(results)})
+
+@chat_bp.route('/ask-stream', methods=['POST'])
+def ask_stream():
+    """
+    Giống /ask nhưng trả câu trả lời dạng Server-Sent Events: mỗi đoạn văn bản được gửi
+    ngay khi DeepSeek sinh ra (`data: {"delta": ...}`), sự kiện cuối chứa toàn bộ câu trả lời
+    (`data: {"done": true, "answer": ...}`). Lịch sử được ghi sau khi stream kết thúc.
+    """
+    snapshot = current_app.knowledge_store.get()
+    if not snapshot.is_loaded:
+        return jsonify({'error': 'Dữ liệu chưa được tải hoặc tải lỗi.'}), 500
 
-    if history_data is not None:
-        # Nếu lấy dữ liệu thành công (kể cả là danh sách rỗng), trả về dữ liệu đó
-        return jsonify(history_data), 200
+    data = request.get_json()
+    question = data.get('question')
+    if not question:
+        return jsonify({'error': 'Câu hỏi không được để trống.'}), 400
+
+    print(f"Nhận được câu hỏi (stream): {question}")
+    direct = ai_service.find_direct_answer(question, snapshot)
+    if direct:
+        print(f"Trả lời trực tiếp từ dữ liệu kiến thức (độ tin cậy {direct['confidence']}).")
+        chunks = [direct['answer']]
     else:
+        chunks = ai_service.stream_answer_with_deepseek(question, snapshot)
+
+    def generate():
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield _sse_event({'delta': chunk})
+
+        answer = ''.join(parts).strip()
+        log_data = _build_log_row(question, answer)
+        _record_chat(log_data)
+
+        final_event = {'done': True, 'id': log_data[0], 'answer': answer}
+        if direct:
+            final_event.update({**direct, 'source': 'knowledge_base'})
+        yield _sse_event(final_event)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Tắt cache và buffer của proxy (nginx) để token đến client ngay lập tức
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@chat_bp.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Endpoint trả về thống kê bộ nhớ đệm câu trả lời (số lần trúng/trượt, kích thước) và số câu hỏi được gộp."""
+    stats = answer_cache.stats()
+    stats['single_flight'] = answer_flight.stats()
+    stats['single_flight_async'] = async_answer_flight.stats()
+    return jsonify(stats), 200
+
+def _parse_time_bound(value, end_of_range=False):
+    """
+    Chuyển tham số thời gian ('YYYY-MM-DD' hoặc 'YYYY-MM-DD HH:MM:SS') thành khóa ID lịch sử.
+    Với ngày không kèm giờ, cận trên được tính đến hết ngày. Trả về None nếu không hợp lệ.
+    """
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            moment = datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and end_of_range:
+            moment = moment.replace(hour=23, minute=59, second=59, microsecond=999999)
+        elif end_of_range:
+            moment = moment.replace(microsecond=999999)
+        return moment.strftime("%Y%m%d%H%M%S%f")
+    return None
+
+@chat_bp.route('/history-chat', methods=['GET'])
+def get_log_chat():
+    """
+    Endpoint để lấy lịch sử trò chuyện (mới nhất trước), đọc từ kho lịch sử trong bộ nhớ.
+    Query parameters:
+    - limit: số mục mỗi trang (mặc định 50, tối đa 500)
+    - cursor: giá trị next_cursor của trang trước
+    - from / to: khoảng thời gian ('YYYY-MM-DD' hoặc 'YYYY-MM-DD HH:MM:SS')
+    - q: từ khóa cần tìm trong câu hỏi/câu trả lời
+    - format=ndjson: stream toàn bộ kết quả khớp, mỗi dòng một JSON, không phân trang
+    """
+    if not history_store.ensure_loaded():
         # Nếu có lỗi xảy ra trong service, trả về lỗi 500
         return jsonify({'error': 'Lấy lịch sử chat thất bại từ máy chủ.'}), 500
+
+    start_id = end_id = None
+    if request.args.get('from'):
+        start_id = _parse_time_bound(request.args['from'])
+        if start_id is None:
+            return jsonify({'error': 'Tham số "from" không đúng định dạng thời gian.'}), 400
+    if request.args.get('to'):
+        end_id = _parse_time_bound(request.args['to'], end_of_range=True)
+        if end_id is None:
+            return jsonify({'error': 'Tham số "to" không đúng định dạng thời gian.'}), 400
+    keyword = request.args.get('q')
+    cursor = request.args.get('cursor')
+    # Backend có tìm kiếm toàn văn (SQLite FTS5) thì dùng chỉ mục thay cho quét chuỗi trong bộ nhớ
+    ids = storage.search_chat_history(keyword) if keyword else None
+    if ids is not None:
+        keyword = None
+
+    if request.args.get('format') == 'ndjson':
+        rows = history_store.iter_rows(cursor, start_id, end_id, keyword, ids)
+
+        def generate():
+            for _, row in rows:
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+    except ValueError:
+        return jsonify({'error': 'Tham số "limit" phải là số nguyên.'}), 400
+
+    items, next_cursor = history_store.page(limit, cursor, start_id, end_id, keyword, ids)
+    return jsonify({'items': items, 'count': len(items), 'next_cursor': next_cursor}), 200
     
 @chat_bp.route('/history-chat-detail', methods=['GET'])
 def get_log_chat_detail():
@@ -56,8 +233,10 @@ def get_log_chat_detail():
     if not chat_id:
         return jsonify({'error': 'Vui lòng cung cấp "id" của lịch sử chat.'}), 400
 
-    # Gọi service để lấy chi tiết
-    chat_detail = gs.get_chat_history_detail_by_id(chat_id)
+    # Ưu tiên lấy từ kho lịch sử trong bộ nhớ, chỉ gọi Google Sheet nếu không có
+    chat_detail = history_store.get(chat_id) if history_store.ensure_loaded() else None
+    if chat_detail is None:
+        chat_detail = storage.get_chat_history_detail_by_id(chat_id)
 
     # Xử lý kết quả trả về từ service
     if chat_detail:
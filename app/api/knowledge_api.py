@@ -1,19 +1,64 @@
 # /chatbotAI/app/api/knowledge_api.py
 from flask import Blueprint, request, jsonify, current_app
-from app.services import google_sheets_service as gs
+from app.services import google_sheets_service as gs, storage
+import csv
 import datetime
+import io
 
 knowledge_bp = Blueprint('knowledge_api', __name__)
 
-def _reload_data():
-    """Hàm nội bộ để tải lại dữ liệu và cập nhật vào app context."""
-    current_app.initial_sheet_data = gs.get_google_sheet_data()
+def _apply_delta(applied, token_before):
+    """
+    Sau khi ghi vào Google Sheet, thay đổi đã được áp dụng thẳng vào snapshot trong bộ nhớ.
+    Chỉ khi không áp dụng được (dữ liệu trong bộ nhớ lệch so với sheet) mới yêu cầu
+    luồng nền đồng bộ lại toàn bộ; ngược lại ghi nhận tín hiệu thay đổi mới (do chính lần ghi này
+    tạo ra) để luồng nền không tải lại cả sheet. `token_before` là tín hiệu thay đổi đọc trước khi ghi,
+    dùng để không che mất thay đổi từ bên ngoài chưa được đồng bộ (xem acknowledge_own_write).
+    """
+    if not applied:
+        print("Dữ liệu trong bộ nhớ lệch so với Google Sheet, yêu cầu đồng bộ lại toàn bộ.")
+        current_app.knowledge_refresher.request_refresh()
+    else:
+        current_app.knowledge_refresher.acknowledge_own_write(token_before)
+
+
+@knowledge_bp.route('/status', methods=['GET'])
+def get_knowledge_status():
+    """Endpoint quản trị: phiên bản snapshot hiện tại và thời điểm làm mới gần nhất."""
+    return jsonify({**current_app.knowledge_refresher.status(), 'storage': storage.status()}), 200
+
+
+@knowledge_bp.route('/search', methods=['GET'])
+def search_knowledge():
+    """
+    Endpoint tìm kiếm kiến thức: ?q=...&limit=10.
+    Dùng tìm kiếm toàn văn của nơi lưu trữ nếu có (SQLite FTS5), ngược lại dùng chỉ mục trong bộ nhớ.
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'Thiếu tham số tìm kiếm "q".'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+    except ValueError:
+        return jsonify({'error': 'Tham số "limit" phải là số nguyên.'}), 400
+
+    results = storage.search_knowledge(query, limit)
+    if results is None:
+        snapshot = current_app.knowledge_store.get()
+        if not snapshot.is_loaded:
+            return jsonify({'error': 'Dữ liệu kiến thức chưa được tải.'}), 500
+        matches = snapshot.index.search(query, max_rows=limit)
+        results = [
+            {**snapshot.dataframe.loc[label].to_dict(), 'score': score}
+            for label, score in matches
+        ]
+    return jsonify({'items': results, 'count': len(results)}), 200
 
 
 @knowledge_bp.route('/', methods=['GET'])
 def get_all_knowledge():
     """Endpoint để lấy danh sách toàn bộ kiến thức."""
-    sheet_data_df = current_app.initial_sheet_data
+    sheet_data_df = current_app.knowledge_store.get().dataframe
     if sheet_data_df is None:
         return jsonify({'error': 'Dữ liệu kiến thức chưa được tải.'}), 500
     
@@ -23,7 +68,7 @@ def get_all_knowledge():
 @knowledge_bp.route('/<item_id>', methods=['GET'])
 def get_knowledge_detail(item_id):
     """Endpoint để lấy chi tiết một kiến thức bằng ID."""
-    sheet_data_df = current_app.initial_sheet_data
+    sheet_data_df = current_app.knowledge_store.get().dataframe
     knowledge_item = gs.get_knowledge_detail_by_id(item_id, sheet_data_df)
     
     if knowledge_item is not None:
@@ -46,10 +91,13 @@ def add_new_knowledge():
         return jsonify({'error': 'Câu hỏi và câu trả lời là các trường bắt buộc.'}), 400
         
     # Gọi service để thêm dữ liệu
-    success, error_message, new_id = gs.add_knowledge(data)
+    token_before = current_app.knowledge_refresher.read_change_token()
+    success, error_message, new_id = storage.add_knowledge(data)
     
     if success:
-        _reload_data() # Tải lại dữ liệu trong bộ nhớ cache
+        # Cập nhật snapshot trong bộ nhớ bằng đúng hàng vừa ghi, không tải lại cả sheet
+        new_row = gs.build_knowledge_row(data, new_id)
+        _apply_delta(current_app.knowledge_store.apply_add(new_row), token_before)
         return jsonify({
             'message': 'Thêm kiến thức mới thành công!',
             'new_id': new_id
@@ -58,6 +106,106 @@ def add_new_knowledge():
         return jsonify({'error': f'Thêm thất bại: {error_message}'}), 500
 
 
+def _parse_bulk_payload():
+    """
+    Đọc danh sách hàng từ request: file CSV upload (trường 'file'), body text/csv,
+    hoặc JSON (mảng các object, hay {"items": [...]}).
+    Trả về (danh sách, thông báo lỗi).
+    """
+    if 'file' in request.files:
+        try:
+            text = request.files['file'].read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return None, 'File CSV phải được mã hóa UTF-8.'
+        return list(csv.DictReader(io.StringIO(text))), None
+    if request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True).lstrip('\ufeff')
+        return list(csv.DictReader(io.StringIO(text))), None
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list):
+        return None, 'Dữ liệu phải là CSV hoặc JSON dạng mảng (hoặc {"items": [...]}).'
+    return data, None
+
+@knowledge_bp.route('/bulk', methods=['POST'])
+def bulk_import_knowledge():
+    """
+    Endpoint nhập/cập nhật kiến thức hàng loạt.
+    Hàng có 'id' là cập nhật (chỉ các trường không rỗng), hàng không có 'id' là thêm mới
+    (bắt buộc 'question' và 'answer'). Toàn bộ được kiểm tra trước khi ghi; dữ liệu được ghi
+    lên Google Sheet theo lô và snapshot trong bộ nhớ chỉ được cập nhật một lần ở cuối.
+    Trả về kết quả cho từng hàng theo đúng thứ tự gửi lên.
+    """
+    items, error_message = _parse_bulk_payload()
+    if error_message:
+        return jsonify({'error': error_message}), 400
+    if not items:
+        return jsonify({'error': 'Không có hàng nào để nhập.'}), 400
+    max_rows = current_app.config['BULK_MAX_ROWS']
+    if len(items) > max_rows:
+        return jsonify({'error': f'Tối đa {max_rows} hàng mỗi lần nhập.'}), 400
+
+    # BƯỚC 1: Kiểm tra toàn bộ dữ liệu trước khi ghi
+    results = [{'row': position, 'status': 'error', 'id': None, 'error': None} for position in range(len(items))]
+    creates, updates = [], []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[position]['error'] = 'Mỗi hàng phải là một object.'
+            continue
+        item_id = str(item.get('id') or '').strip()
+        if item_id:
+            fields = {key: value for key, value in item.items() if key != 'id' and value not in (None, '')}
+            if not fields:
+                results[position]['error'] = 'Không có trường nào để cập nhật.'
+                continue
+            results[position]['id'] = item_id
+            updates.append((position, item_id, fields))
+        elif not item.get('question') or not item.get('answer'):
+            results[position]['error'] = 'Câu hỏi và câu trả lời là các trường bắt buộc.'
+        else:
+            creates.append((position, item))
+
+    if not creates and not updates:
+        return jsonify({'error': 'Không có hàng hợp lệ.', 'results': results}), 400
+
+    # BƯỚC 2: Ghi lên Google Sheet theo lô
+    token_before = current_app.knowledge_refresher.read_change_token()
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    created_rows = []
+    if creates:
+        add_results, created_rows = storage.bulk_add_knowledge([item for _, item in creates], chunk_size)
+        for (position, _), add_result in zip(creates, add_results):
+            results[position].update(add_result)
+            if not add_result['error']:
+                results[position]['status'] = 'created'
+
+    applied_updates = []
+    if updates:
+        snapshot = current_app.knowledge_store.get()
+        update_errors = storage.bulk_update_knowledge(
+            [(item_id, fields) for _, item_id, fields in updates], chunk_size,
+            worksheet_names=[snapshot.worksheet_of(item_id) for _, item_id, _ in updates],
+        )
+        for (position, item_id, fields), update_error in zip(updates, update_errors):
+            if update_error:
+                results[position]['error'] = update_error
+            else:
+                results[position]['status'] = 'updated'
+                applied_updates.append((item_id, fields))
+
+    # BƯỚC 3: Cập nhật snapshot trong bộ nhớ một lần
+    _apply_delta(current_app.knowledge_store.apply_batch(created_rows, applied_updates), token_before)
+
+    summary = {
+        'created': sum(1 for result in results if result['status'] == 'created'),
+        'updated': sum(1 for result in results if result['status'] == 'updated'),
+        'failed': sum(1 for result in results if result['status'] == 'error'),
+    }
+    return jsonify({**summary, 'results': results}), 200
+
+
 @knowledge_bp.route('/<item_id>', methods=['PUT'])
 def update_knowledge(item_id):
     """Endpoint để cập nhật kiến thức bằng ID."""
@@ -65,10 +213,14 @@ def update_knowledge(item_id):
     if not new_data:
         return jsonify({'error': 'Dữ liệu cập nhật không được để trống.'}), 400
     
-    success, error_message = gs.update_knowledge_by_id(item_id, new_data)
+    # Ghi vào đúng worksheet chứa hàng khi kiến thức được gộp từ nhiều worksheet
+    worksheet_name = current_app.knowledge_store.get().worksheet_of(item_id)
+    token_before = current_app.knowledge_refresher.read_change_token()
+    success, error_message, written = storage.update_knowledge_by_id(item_id, new_data, worksheet_name)
     
     if success:
-        current_app.initial_sheet_data = gs.get_google_sheet_data()
+        # Chỉ áp dụng vào snapshot đúng các trường đã ghi lên nơi lưu trữ
+        _apply_delta(current_app.knowledge_store.apply_update(item_id, written), token_before)
         return jsonify({'message': f'Cập nhật kiến thức ID {item_id} thành công.'}), 200
     else:
         if "Không tìm thấy" in error_message:
@@ -78,10 +230,12 @@ def update_knowledge(item_id):
 @knowledge_bp.route('/<item_id>', methods=['DELETE'])
 def delete_knowledge(item_id):
     """Endpoint để xóa kiến thức bằng ID."""
-    success, error_message = gs.delete_knowledge_by_id(item_id)
+    worksheet_name = current_app.knowledge_store.get().worksheet_of(item_id)
+    token_before = current_app.knowledge_refresher.read_change_token()
+    success, error_message = storage.delete_knowledge_by_id(item_id, worksheet_name)
     
     if success:
-        current_app.initial_sheet_data = gs.get_google_sheet_data()
+        _apply_delta(current_app.knowledge_store.apply_delete(item_id), token_before)
         return jsonify({'message': f'Xóa kiến thức ID {item_id} thành công.'}), 200
     else:
         if "Không tìm thấy" in error_message:
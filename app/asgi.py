@@ -0,0 +1,60 @@
+# /chatbotAI/app/asgi.py
+import asyncio
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from config import Config
+from app import create_app
+from app.api.chat_api import _build_log_row, _record_chat
+from app.services import ai_service
+
+
+async def ask(request):
+    """
+    Bản bất đồng bộ của POST /api/chat/ask: cùng đầu vào/đầu ra với bản Flask, nhưng trong lúc chờ
+    DeepSeek request chỉ là một coroutine, không giữ luồng xử lý nào.
+    """
+    snapshot = request.app.state.knowledge_store.get()
+    if not snapshot.is_loaded:
+        return JSONResponse({'error': 'Dữ liệu chưa được tải hoặc tải lỗi.'}, status_code=500)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    question = data.get('question') if isinstance(data, dict) else None
+    if not question:
+        return JSONResponse({'error': 'Câu hỏi không được để trống.'}, status_code=400)
+
+    print(f"Nhận được câu hỏi: {question}")
+    direct = await asyncio.to_thread(ai_service.find_direct_answer, question, snapshot)
+    if direct:
+        print(f"Trả lời trực tiếp từ dữ liệu kiến thức (độ tin cậy {direct['confidence']}).")
+        answer = direct['answer']
+    else:
+        answer = await ai_service.answer_question_async(question, snapshot)
+
+    # Cập nhật kho lịch sử cần giữ khóa (có thể tranh chấp với luồng khác) nên chạy ở luồng phụ;
+    # phần ghi lên Google Sheets vẫn do luồng ghi nền đảm nhận
+    await asyncio.to_thread(_record_chat, _build_log_row(question, answer))
+    if direct:
+        return JSONResponse({**direct, 'source': 'knowledge_base'})
+    return JSONResponse({'answer': answer})
+
+
+def create_asgi_app(config_class=Config):
+    """
+    Tạo ứng dụng ASGI: /api/chat/ask chạy bất đồng bộ trên event loop, mọi endpoint khác
+    được chuyển cho ứng dụng Flask (chạy trong pool luồng của WSGIMiddleware).
+    Dữ liệu kiến thức, bộ nhớ đệm và hàng đợi lịch sử dùng chung với ứng dụng Flask.
+    """
+    flask_app = create_app(config_class)
+    asgi_app = Starlette(routes=[
+        Route('/api/chat/ask', ask, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ])
+    asgi_app.state.knowledge_store = flask_app.knowledge_store
+    return asgi_app
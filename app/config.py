@@ -9,7 +9,7 @@ class Config:
     GOOGLE_SHEET_NAME = os.getenv("GOOGLE_SHEET_NAME")
     HISTORY_WORKSHEET_NAME = os.getenv("HISTORY_WORKSHEET_NAME")
     WORK_SHEET_PHUONG_XA= os.getenv("WORK_SHEET_PHUONG_XA")
-    WORK_SHEET_CO_QUAN= os.getenv("WORK_SHEET_PHUONG_XA")
+    WORK_SHEET_CO_QUAN= os.getenv("WORK_SHEET_CO_QUAN")
     KNOWLEDGE_WORKSHEET_STR = os.getenv("KNOWLEDGE_WORKSHEET_NAMES", "")
 
     # Tách chuỗi đó thành một danh sách các tên sheet
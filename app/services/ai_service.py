@@ -1,41 +1,145 @@
 # /chatbotAI/app/services/ai_service.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+
 import pandas as pd
-from openai import OpenAI
 from config import Config
+from app.services import context_builder, deepseek_client, gazetteer, search_index
+from app.services.answer_cache import answer_cache, normalize_question
+from app.services.single_flight import answer_flight, async_answer_flight
 
 api_key = Config.DEEPSEEK_API_KEY
 
-def find_relevant_data(question, dataframe, max_rows=5):
-    # ... (giữ nguyên code của hàm find_relevant_data)
-    question_words = set(question.lower().split())
-    dataframe['search_col'] = dataframe.apply(lambda row: ' '.join(row.astype(str)).lower(), axis=1)
+MODEL_NAME = "deepseek-chat"
+SYSTEM_PROMPT = "Bạn là một trợ lý AI chuyên nghiệp, phân tích dữ liệu từ Google Sheet và trả lời câu hỏi bằng tiếng Việt."
+API_KEY_MISSING_MESSAGE = "Lỗi: API key của DeepSeek chưa được cấu hình."
+AI_ERROR_MESSAGE = "Đã có lỗi xảy ra khi kết nối tới dịch vụ AI."
 
-    def relevance_score(row_text):
-        return len(question_words.intersection(row_text.split()))
+def find_unit_rows(question, snapshot):
+    """
+    Tìm các phường/xã, cơ quan được nhắc tới trong câu hỏi (theo danh mục đơn vị).
+    Trả về (danh sách tên đơn vị, tập nhãn hàng thuộc các đơn vị đó) hoặc ([], None) nếu không có.
+    """
+    units = gazetteer.get_gazetteer().extract(question)
+    if not units or not snapshot.is_loaded:
+        return units, None
+    unit_labels = snapshot.unit_labels(gazetteer.get_gazetteer())
+    labels = set().union(*(unit_labels.get(unit, ()) for unit in units))
+    return units, labels or None
 
-    dataframe['relevance'] = dataframe['search_col'].apply(relevance_score)
-    relevant_df = dataframe.sort_values(by='relevance', ascending=False).head(max_rows)
-    relevant_df = relevant_df.drop(columns=['search_col', 'relevance'])
+def find_relevant_data(question, dataframe, index=None, max_rows=5, allowed=None, vectors=None, bm25=None,
+                       matches=None):
+    """
+    Tìm các hàng liên quan nhất đến câu hỏi bằng chỉ mục ngược đã xây sẵn.
+    Nếu không truyền chỉ mục, sẽ tạo tạm một chỉ mục (chậm, chỉ dùng khi cần).
+    `allowed` (tập nhãn hàng) giới hạn phạm vi tìm kiếm, ví dụ theo đơn vị được nhắc tới.
+    Có chỉ mục vector (`vectors`) thì dùng thêm tìm kiếm ngữ nghĩa theo VECTOR_SEARCH_MODE:
+    'fallback' khi tìm theo từ không ra kết quả, 'hybrid' để kết hợp thứ hạng của cả hai.
+    Có ma trận BM25 (`bm25`) thì thứ hạng theo từ lấy từ điểm BM25 theo cột, dùng chung tập term
+    (đã sửa lỗi gõ) của chỉ mục ngược; term chưa có trong ma trận thì quay về điểm của chỉ mục ngược.
+    `matches` (nếu có) là thứ hạng theo từ đã tính sẵn, ví dụ khi chấm nhiều câu hỏi cùng lúc.
+    """
+    if dataframe is None or dataframe.empty:
+        return pd.DataFrame()
+    if index is None:
+        index = search_index.build_index(dataframe)
 
-    if relevant_df.empty or dataframe.loc[relevant_df.index]['relevance'].sum() == 0:
+    if matches is None and bm25 is not None:
+        matches = bm25.search_terms(index.query_terms(question), max_rows=max_rows, allowed=allowed)
+    if not matches:
+        matches = index.search(question, max_rows=max_rows, allowed=allowed)
+    mode = Config.VECTOR_SEARCH_MODE
+    if vectors is not None and (mode == 'hybrid' or (mode == 'fallback' and not matches)):
+        semantic = vectors.search(question, max_rows=max_rows, allowed=allowed)
+        matches = search_index.fuse_rankings([matches, semantic], max_rows) if matches else semantic
+    if not matches:
         return pd.DataFrame()
-    return relevant_df
 
-def answer_question_with_deepseek(question, dataframe):
+    labels = [label for label, _ in matches]
+    return dataframe.loc[labels]
+
+def find_direct_answer(question, snapshot, threshold=None, candidates=20):
     """
-    Gửi câu hỏi và dữ liệu LIÊN QUAN đến DeepSeek API để nhận câu trả lời.
+    Tìm câu hỏi đã lưu trong sheet gần giống hệt câu hỏi của người dùng.
+    Trả về dict gồm câu trả lời, metadata và độ tin cậy nếu vượt ngưỡng, ngược lại None.
     """
-    if not api_key:
-        return "Lỗi: API key của DeepSeek chưa được cấu hình."
+    threshold = Config.DIRECT_ANSWER_THRESHOLD if threshold is None else threshold
+    dataframe = snapshot.dataframe
+    if threshold > 1 or dataframe is None or 'question' not in dataframe.columns:
+        return None
+
+    normalized = normalize_question(question)
+    best_label, best_score = None, 0.0
+    # Chỉ so sánh với các hàng ứng viên từ chỉ mục, không duyệt toàn bộ bảng
+    for label, _ in snapshot.index.search(question, max_rows=candidates):
+        stored = normalize_question(dataframe.at[label, 'question'])
+        score = SequenceMatcher(None, normalized, stored).ratio()
+        if score > best_score:
+            best_label, best_score = label, score
+
+    if best_label is None or best_score < threshold:
+        return None
 
-    client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com/v1")
+    row = dataframe.loc[best_label]
+    answer = row.get('answer')
+    if not answer:
+        return None
+    return {
+        'answer': str(answer),
+        'matched_question': str(row.get('question', '')),
+        'answering_unit': str(row.get('answering_unit', '')),
+        'document': str(row.get('document', '')),
+        'Text_link': str(row.get('Text_link', '')),
+        'confidence': round(best_score, 4),
+    }
+
+def rank_questions(questions, snapshot, max_rows=5):
+    """
+    Chấm BM25 cho nhiều câu hỏi bằng một phép nhân ma trận thưa.
+    Trả về danh sách cùng thứ tự; câu hỏi nhắc tới đơn vị cụ thể (cần giới hạn phạm vi riêng)
+    hoặc khi không có ma trận BM25 thì phần tử tương ứng là None để tìm riêng như bình thường.
+    """
+    ranked = [None] * len(questions)
+    if snapshot.bm25 is None:
+        return ranked
+    positions = [position for position, question in enumerate(questions)
+                 if find_unit_rows(question, snapshot)[1] is None]
+    term_sets = [snapshot.index.query_terms(questions[position]) for position in positions]
+    for position, matches in zip(positions, snapshot.bm25.search_many(term_sets, max_rows)):
+        ranked[position] = matches
+    return ranked
 
+def build_chat_messages(question, snapshot, matches=None):
+    """
+    Tìm dữ liệu liên quan và dựng danh sách messages gửi cho DeepSeek.
+    `matches` là thứ hạng BM25 đã tính sẵn bằng rank_questions (nếu có).
+    """
     # BƯỚC 1: Tìm dữ liệu liên quan trước khi gửi cho AI
-    relevant_data = find_relevant_data(question, dataframe)
+    dataframe = snapshot.dataframe
+    # Câu hỏi nhắc tới phường/xã hay cơ quan cụ thể thì chỉ tìm trong các hàng của đơn vị đó trước
+    units, unit_rows = find_unit_rows(question, snapshot)
+    relevant_data = find_relevant_data(question, dataframe, snapshot.index, allowed=unit_rows,
+                                       vectors=snapshot.vectors, bm25=snapshot.bm25,
+                                       matches=matches if unit_rows is None else None)
+    if unit_rows is not None:
+        print(f"Giới hạn tìm kiếm theo đơn vị {', '.join(units)}: {len(unit_rows)} hàng.")
+        if relevant_data.empty:
+            relevant_data = find_relevant_data(question, dataframe, snapshot.index,
+                                               vectors=snapshot.vectors, bm25=snapshot.bm25)
 
-    # Nếu không có gì liên quan, dùng toàn bộ dữ liệu. Ngược lại, chỉ dùng dữ liệu liên quan.
-    data_to_send = dataframe if relevant_data.empty else relevant_data
-    data_string = data_to_send.to_csv(index=False)
+    # Nếu không có gì liên quan, dùng các hàng của đơn vị được nhắc tới (nếu có) hoặc các hàng đầu của bảng.
+    # Dù trường hợp nào, ngữ cảnh cũng bị giới hạn bởi ngân sách token.
+    if not relevant_data.empty:
+        data_to_send = relevant_data
+    elif unit_rows is not None:
+        data_to_send = dataframe.loc[sorted(unit_rows)]
+    else:
+        data_to_send = dataframe
+    context = context_builder.build_context(data_to_send)
+    data_string = context.text
+    print(f"Ngữ cảnh gửi AI: {context.rows_used} hàng, ~{context.tokens_used} token"
+          f"{' (đã cắt bớt)' if context.truncated else ''}.")
 
     # BƯỚC 2: Sử dụng prompt cải tiến từ ví dụ của bạn
     prompt = f"""
@@ -53,17 +157,163 @@ def answer_question_with_deepseek(question, dataframe):
     - Ưu tiên sắp xếp thông tin theo cấu trúc dễ đọc (ví dụ: gạch đầu dòng nếu cần).
     """
 
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def answer_question_with_deepseek(question, snapshot, matches=None):
+    """
+    Gửi câu hỏi và dữ liệu LIÊN QUAN đến DeepSeek API để nhận câu trả lời.
+    `snapshot` là KnowledgeSnapshot dùng chung, chỉ được đọc, không được sửa.
+    Các câu hỏi giống nhau (sau chuẩn hóa, cùng phiên bản dữ liệu) đến cùng lúc chỉ gọi DeepSeek một lần;
+    nơi gọi vẫn tự ghi lịch sử cho từng người hỏi.
+    """
+    if not api_key:
+        return API_KEY_MISSING_MESSAGE
+
+    # Câu hỏi đã được trả lời với cùng phiên bản dữ liệu thì trả về ngay
+    cached_answer = answer_cache.get(question, snapshot.version)
+    if cached_answer is not None:
+        print("Trả lời từ bộ nhớ đệm.")
+        return cached_answer
+
+    key = answer_cache.make_key(question, snapshot.version)
+    return answer_flight.do(key, lambda: _ask_deepseek(question, snapshot, matches))
+
+def _ask_deepseek(question, snapshot, matches=None):
+    """Tìm dữ liệu liên quan, gọi DeepSeek và lưu đệm câu trả lời thành công."""
+    client = deepseek_client.get_client()
+    messages = build_chat_messages(question, snapshot, matches)
+
     try:
         response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "Bạn là một trợ lý AI chuyên nghiệp, phân tích dữ liệu từ Google Sheet và trả lời câu hỏi bằng tiếng Việt."},
-                {"role": "user", "content": prompt}
-            ],
+            model=MODEL_NAME,
+            messages=messages,
+            max_tokens=2000,
+            temperature=0.2,
+        )
+        answer = response.choices[0].message.content.strip()
+        # Chỉ lưu đệm câu trả lời thành công, không lưu thông báo lỗi
+        answer_cache.put(question, snapshot.version, answer)
+        return answer
+    except Exception as e:
+        print(f"Đã xảy ra lỗi khi gọi DeepSeek API: {e}")
+        return AI_ERROR_MESSAGE
+
+async def answer_question_async(question, snapshot):
+    """
+    Bản bất đồng bộ của answer_question_with_deepseek dùng cho chế độ ASGI: chờ DeepSeek bằng
+    AsyncOpenAI nên không giữ luồng nào trong lúc chờ. Dùng chung bộ nhớ đệm câu trả lời;
+    các câu hỏi trùng đến cùng lúc được gộp trong event loop.
+    """
+    if not api_key:
+        return API_KEY_MISSING_MESSAGE
+
+    cached_answer = answer_cache.get(question, snapshot.version)
+    if cached_answer is not None:
+        print("Trả lời từ bộ nhớ đệm.")
+        return cached_answer
+
+    key = answer_cache.make_key(question, snapshot.version)
+    return await async_answer_flight.do(key, lambda: _ask_deepseek_async(question, snapshot))
+
+async def _ask_deepseek_async(question, snapshot):
+    client = deepseek_client.get_async_client()
+    # Tìm dữ liệu liên quan tốn CPU (BM25, vector) nên chạy ở luồng phụ để không chặn event loop
+    messages = await asyncio.to_thread(build_chat_messages, question, snapshot)
+
+    try:
+        response = await client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=messages,
             max_tokens=2000,
             temperature=0.2,
         )
-        return response.choices[0].message.content.strip()
+        answer = response.choices[0].message.content.strip()
+        answer_cache.put(question, snapshot.version, answer)
+        return answer
     except Exception as e:
         print(f"Đã xảy ra lỗi khi gọi DeepSeek API: {e}")
-        return "Đã có lỗi xảy ra khi kết nối tới dịch vụ AI."
\ No newline at end of file
+        return AI_ERROR_MESSAGE
+
+def answer_questions(questions, snapshot, max_workers=None):
+    """
+    Trả lời nhiều câu hỏi một lần. BM25 cho toàn bộ câu hỏi được chấm trong một lần nhân ma trận,
+    câu hỏi khớp trực tiếp với dữ liệu kiến thức được trả lời ngay, phần còn lại gọi DeepSeek song song
+    (tối đa `max_workers` lời gọi, mặc định BATCH_LLM_CONCURRENCY).
+    Trả về danh sách cùng thứ tự với `questions`; mỗi phần tử là dict chứa 'answer'
+    (kèm thông tin hàng kiến thức nếu trả lời trực tiếp) hoặc 'error' nếu câu hỏi đó lỗi.
+    """
+    max_workers = max(1, max_workers or Config.BATCH_LLM_CONCURRENCY)
+    results = [None] * len(questions)
+    pending = []
+    for position, question in enumerate(questions):
+        direct = find_direct_answer(question, snapshot)
+        if direct:
+            results[position] = {**direct, 'source': 'knowledge_base'}
+        else:
+            pending.append(position)
+
+    if pending:
+        ranked = rank_questions([questions[position] for position in pending], snapshot)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending)), thread_name_prefix='batch-ask') as executor:
+            futures = {
+                position: executor.submit(answer_question_with_deepseek, questions[position], snapshot, matches)
+                for position, matches in zip(pending, ranked)
+            }
+            for position, future in futures.items():
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    print(f"Lỗi khi trả lời câu hỏi thứ {position} trong lô: {e}")
+                    results[position] = {'error': AI_ERROR_MESSAGE}
+                    continue
+                if answer in (API_KEY_MISSING_MESSAGE, AI_ERROR_MESSAGE):
+                    results[position] = {'error': answer}
+                else:
+                    results[position] = {'answer': answer}
+    return results
+
+def stream_answer_with_deepseek(question, snapshot):
+    """
+    Giống answer_question_with_deepseek nhưng dùng chế độ stream của DeepSeek:
+    trả về generator sinh ra từng đoạn văn bản ngay khi nhận được.
+    """
+    if not api_key:
+        yield API_KEY_MISSING_MESSAGE
+        return
+
+    cached_answer = answer_cache.get(question, snapshot.version)
+    if cached_answer is not None:
+        print("Trả lời từ bộ nhớ đệm.")
+        yield cached_answer
+        return
+
+    client = deepseek_client.get_client()
+    messages = build_chat_messages(question, snapshot)
+
+    parts = []
+    try:
+        stream = client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=messages,
+            max_tokens=2000,
+            temperature=0.2,
+            stream=True,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        print(f"Đã xảy ra lỗi khi gọi DeepSeek API (stream): {e}")
+        yield AI_ERROR_MESSAGE
+        return
+
+    answer = ''.join(parts).strip()
+    if answer:
+        answer_cache.put(question, snapshot.version, answer)
@@ -0,0 +1,80 @@
+# /chatbotAI/app/services/answer_cache.py
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from config import Config
+
+
+def normalize_question(question):
+    """Chuẩn hóa câu hỏi để các cách gõ khác nhau nhẹ (hoa/thường, khoảng trắng, dấu câu cuối) dùng chung khóa."""
+    text = unicodedata.normalize('NFC', str(question)).lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip(' ?.!')
+
+
+class AnswerCache:
+    """
+    Bộ nhớ đệm câu trả lời trong tiến trình, khóa là (câu hỏi đã chuẩn hóa, phiên bản snapshot).
+    Khi dữ liệu kiến thức thay đổi, phiên bản snapshot tăng nên các mục cũ tự động không còn được dùng.
+    Loại bỏ theo LRU khi vượt quá kích thước và hết hạn theo TTL.
+    """
+
+    def __init__(self, max_size=1000, ttl_seconds=3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(question, version):
+        return (normalize_question(question), version)
+
+    def get(self, question, version):
+        """Trả về câu trả lời đã lưu hoặc None nếu không có / đã hết hạn."""
+        key = self.make_key(question, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                answer, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return answer
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, question, version, answer):
+        if self.max_size <= 0:
+            return
+        key = self.make_key(question, version)
+        with self._lock:
+            self._entries[key] = (answer, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# Bộ đệm dùng chung cho toàn bộ tiến trình
+answer_cache = AnswerCache(Config.ANSWER_CACHE_SIZE, Config.ANSWER_CACHE_TTL)
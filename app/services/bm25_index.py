@@ -0,0 +1,200 @@
+# /chatbotAI/app/services/bm25_index.py
+import numpy as np
+from scipy import sparse
+
+from config import Config
+from app.services.vietnamese_text import tokenize
+
+
+def _field_weights():
+    """Đọc BM25_FIELD_WEIGHTS dạng 'question:2,answer:1,document:0.5' thành dict."""
+    weights = {}
+    for item in Config.BM25_FIELD_WEIGHTS.split(','):
+        name, _, weight = item.partition(':')
+        if name.strip():
+            weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class Bm25Index:
+    """
+    Chấm điểm BM25F (BM25 với trọng số riêng cho từng cột: câu hỏi, câu trả lời, văn bản)
+    trên ma trận thưa hàng x term đã tính sẵn trọng số. Điểm của một câu hỏi là một phép nhân
+    ma trận thưa với vector term của câu hỏi; nhiều câu hỏi được chấm cùng lúc bằng một phép
+    nhân ma trận.
+
+    Giống các chỉ mục khác, đối tượng coi như bất biến: with_* trả về chỉ mục mới. Hàng mới/sửa
+    được chấm với độ dài trung bình và IDF lúc dựng; mọi thứ được tính lại khi đồng bộ toàn bộ.
+    """
+
+    def __init__(self, weights, labels, alive, vocabulary, idf, stats):
+        self.weights = weights          # csr_matrix (hàng x term)
+        self.labels = labels            # nhãn DataFrame của từng hàng trong ma trận
+        self.alive = alive              # hàng còn hiệu lực (hàng đã xóa/sửa bị đánh dấu False)
+        self.vocabulary = vocabulary    # term -> cột
+        self.idf = idf                  # IDF theo cột
+        self.stats = stats              # {'fields', 'average_lengths', 'k1', 'b'}
+
+    @property
+    def num_rows(self):
+        return int(np.count_nonzero(self.alive))
+
+    # --- CHẤM ĐIỂM ---
+
+    def _query_matrix(self, term_sets):
+        """Ma trận thưa term x câu hỏi (1 nếu câu hỏi chứa term)."""
+        rows, columns = [], []
+        for position, terms in enumerate(term_sets):
+            for term in terms:
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    rows.append(column)
+                    columns.append(position)
+        data = np.ones(len(rows), dtype=np.float32)
+        return sparse.csr_matrix((data, (rows, columns)), shape=(len(self.vocabulary), len(term_sets)))
+
+    def _top(self, scores, max_rows, valid):
+        scores = np.where(valid & (scores > 0), scores, 0.0)
+        k = min(max_rows, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Điểm cao trước, cùng điểm thì ưu tiên hàng đứng trước trong sheet (nhãn nhỏ hơn)
+        top = top[np.lexsort((self.labels[top], -scores[top]))]
+        return [(int(self.labels[i]), round(float(scores[i]), 4)) for i in top if scores[i] > 0]
+
+    def _valid(self, allowed):
+        if allowed is None:
+            return self.alive
+        return self.alive & np.isin(self.labels, np.fromiter(allowed, dtype=np.int64))
+
+    def search_terms(self, terms, max_rows=5, allowed=None):
+        """Trả về danh sách (nhãn hàng, điểm BM25) giảm dần cho một tập term."""
+        return self.search_many([terms], max_rows, allowed)[0]
+
+    def search_many(self, term_sets, max_rows=5, allowed=None):
+        """Chấm điểm nhiều câu hỏi (danh sách tập term) bằng một phép nhân ma trận thưa."""
+        if not term_sets:
+            return []
+        if self.weights.shape[0] == 0:
+            return [[] for _ in term_sets]
+        scores = (self.weights @ self._query_matrix(term_sets)).toarray()
+        valid = self._valid(allowed)
+        return [self._top(scores[:, position], max_rows, valid) for position in range(len(term_sets))]
+
+    # --- CẬP NHẬT DẠNG DELTA ---
+
+    def _without(self, labels):
+        return Bm25Index(self.weights, self.labels, self.alive & ~np.isin(self.labels, labels),
+                         self.vocabulary, self.idf, self.stats)
+
+    def _append(self, labels, records):
+        """Thêm nhiều hàng bằng một lần dựng ma trận tf và một lần vstack."""
+        if not records:
+            return self
+        rows_field_terms = [_record_field_terms(record, self.stats['fields']) for record in records]
+        vocabulary = dict(self.vocabulary)
+        rows = _term_frequencies(rows_field_terms, vocabulary, self.stats)
+        idf = self.idf
+        if len(vocabulary) > len(idf):
+            # Term mới: IDF như một term chỉ xuất hiện trong một hàng
+            total = max(len(self.labels), 1)
+            rare_idf = np.log(1 + (total - 1 + 0.5) / 1.5)
+            idf = np.concatenate([idf, np.full(len(vocabulary) - len(idf), rare_idf, dtype=np.float32)])
+        existing = sparse.csr_matrix(
+            (self.weights.data, self.weights.indices, self.weights.indptr),
+            shape=(self.weights.shape[0], len(vocabulary)),
+        )
+        return Bm25Index(
+            sparse.vstack([existing, _saturate(rows, idf, self.stats['k1'])], format='csr'),
+            np.append(self.labels, np.asarray(labels, dtype=np.int64)),
+            np.append(self.alive, np.ones(len(records), dtype=bool)),
+            vocabulary, idf, self.stats,
+        )
+
+    def with_row(self, label, record):
+        return self._append([label], [record])
+
+    def without_row(self, label):
+        return self._without([label])
+
+    def with_updated_row(self, label, record):
+        return self._without([label])._append([label], [record])
+
+    def with_changes(self, removed_labels=(), added=()):
+        """Áp dụng nhiều thay đổi cùng lúc: bỏ `removed_labels`, thêm `added` (danh sách (nhãn, bản ghi))."""
+        index = self._without(list(removed_labels)) if removed_labels else self
+        return index._append([label for label, _ in added], [record for _, record in added])
+
+
+def _record_field_terms(record, fields):
+    return {field: tokenize(record.get(field, '')) for field in fields}
+
+
+def _term_frequencies(rows_field_terms, vocabulary, stats):
+    """
+    Ma trận tf BM25F (hàng x term): tf của từng cột được chuẩn hóa theo độ dài cột so với trung bình,
+    nhân trọng số cột rồi cộng dồn. Term chưa có trong `vocabulary` được thêm vào cuối từ điển.
+    Python chỉ tra cột cho từng term; phần cộng dồn do scipy làm một lần khi dựng ma trận.
+    """
+    b = stats['b']
+    columns, lengths, field_values = [], [], []
+    for field, weight in stats['fields'].items():
+        average = stats['average_lengths'][field] or 1.0
+        field_lengths = []
+        for field_terms in rows_field_terms:
+            terms = field_terms.get(field, [])
+            field_lengths.append(len(terms))
+            columns.extend(vocabulary.setdefault(term, len(vocabulary)) for term in terms)
+        field_lengths = np.asarray(field_lengths, dtype=np.int64)
+        per_row = weight / (1 - b + b * field_lengths / average)
+        lengths.append(field_lengths)
+        field_values.append(np.repeat(per_row, field_lengths))
+
+    total = len(rows_field_terms)
+    row_ids = np.concatenate([np.repeat(np.arange(total, dtype=np.int64), field_lengths) for field_lengths in lengths])
+    matrix = sparse.csr_matrix(
+        (np.concatenate(field_values).astype(np.float32), (row_ids, np.asarray(columns, dtype=np.int64))),
+        shape=(total, len(vocabulary)),
+    )
+    matrix.sum_duplicates()
+    return matrix
+
+
+def _saturate(matrix, idf, k1):
+    """Bão hòa tf bằng k1 và nhân IDF theo cột, làm tại chỗ trên mảng data của ma trận thưa."""
+    tf = matrix.data
+    matrix.data = (idf[matrix.indices] * tf * (k1 + 1) / (tf + k1)).astype(np.float32)
+    return matrix
+
+
+def build_bm25_index(dataframe):
+    """Dựng Bm25Index cho DataFrame kiến thức (None nếu không có dữ liệu hoặc không có cột nào để chấm)."""
+    if dataframe is None:
+        return None
+    fields = {field: weight for field, weight in _field_weights().items() if field in dataframe.columns}
+    if not fields:
+        return None
+
+    records = dataframe[list(fields)].astype(str).to_dict(orient='records')
+    rows_field_terms = [_record_field_terms(record, fields) for record in records]
+    total = len(rows_field_terms)
+    stats = {
+        'fields': fields,
+        'average_lengths': {
+            field: (sum(len(field_terms[field]) for field_terms in rows_field_terms) / total if total else 0.0)
+            for field in fields
+        },
+        'k1': Config.BM25_K1,
+        'b': Config.BM25_B,
+    }
+
+    vocabulary = {}
+    weights = _term_frequencies(rows_field_terms, vocabulary, stats)
+    # Số hàng chứa mỗi term (mỗi cặp hàng-term chỉ còn một phần tử sau khi cộng dồn)
+    document_frequency = np.bincount(weights.indices, minlength=len(vocabulary)).astype(np.float32)
+    idf = np.log(1 + (total - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+    weights = _saturate(weights, idf, stats['k1'])
+    print(f"Đã xây dựng chỉ mục BM25: {total} hàng, {len(vocabulary)} term, {weights.nnz} phần tử khác 0.")
+    return Bm25Index(weights, np.asarray(dataframe.index, dtype=np.int64), np.ones(total, dtype=bool),
+                     vocabulary, idf, stats)
@@ -0,0 +1,92 @@
+# /chatbotAI/app/services/context_builder.py
+import csv
+import io
+import math
+
+from config import Config
+
+# Ước lượng thô: trung bình khoảng 3 ký tự tiếng Việt cho mỗi token
+CHARS_PER_TOKEN = 3
+
+
+class PackedContext:
+    """Kết quả đóng gói ngữ cảnh: chuỗi CSV, số hàng đã dùng và số token ước lượng."""
+
+    def __init__(self, text, rows_used, tokens_used, truncated):
+        self.text = text
+        self.rows_used = rows_used
+        self.tokens_used = tokens_used
+        self.truncated = truncated
+
+
+def estimate_tokens(text):
+    """Ước lượng số token của một chuỗi (không cần tokenizer của mô hình)."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def project_columns(dataframe, columns=None):
+    """Chỉ giữ lại các cột mang nội dung kiến thức, theo thứ tự cấu hình."""
+    columns = columns or Config.CONTEXT_COLUMNS
+    kept = [column for column in columns if column in dataframe.columns]
+    # Sheet không theo lược đồ quen thuộc thì giữ nguyên để không mất dữ liệu
+    return kept or list(dataframe.columns)
+
+
+def _to_csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(values)
+    return buffer.getvalue()
+
+
+def _fit_line(row, max_chars):
+    """Dòng CSV của hàng, cắt bớt các ô dài nhất (thêm '…') cho đến khi không quá `max_chars` ký tự."""
+    values = ['' if value is None else str(value) for value in row]
+    line = _to_csv_line(values)
+    while len(line) > max_chars:
+        longest = max(range(len(values)), key=lambda position: len(values[position]))
+        if len(values[longest]) <= 1:
+            break
+        keep = max(len(values[longest]) - (len(line) - max_chars) - 1, 0)
+        values[longest] = values[longest][:keep] + '…'
+        line = _to_csv_line(values)
+    return line
+
+
+def build_context(ranked_df, token_budget=None, columns=None):
+    """
+    Đóng gói các hàng (đã xếp hạng, hàng liên quan nhất đứng trước) thành CSV
+    cho đến khi chạm ngân sách token. Hàng đầu tiên luôn có mặt (cắt bớt nếu một mình nó
+    đã vượt ngân sách); hàng không vừa thì bị bỏ qua nhưng các hàng nhỏ hơn phía sau vẫn được xếp vào.
+    Dừng ngay khi hết ngân sách nên an toàn khi truyền cả bảng lớn.
+    """
+    token_budget = token_budget or Config.CONTEXT_TOKEN_BUDGET
+    if ranked_df is None or ranked_df.empty:
+        return PackedContext('', 0, 0, False)
+
+    kept_columns = project_columns(ranked_df, columns)
+    header = _to_csv_line(kept_columns)
+    parts = [header]
+    tokens_used = estimate_tokens(header)
+    rows_used = 0
+    truncated = False
+
+    for row in ranked_df[kept_columns].itertuples(index=False, name=None):
+        if tokens_used >= token_budget:
+            truncated = True
+            break
+        line = _to_csv_line(row)
+        line_tokens = estimate_tokens(line)
+        if tokens_used + line_tokens > token_budget:
+            truncated = True
+            if rows_used:
+                continue
+            # Hàng liên quan nhất dài hơn cả ngân sách: vẫn đưa vào, cắt cho vừa phần còn lại
+            line = _fit_line(row, (token_budget - tokens_used) * CHARS_PER_TOKEN)
+            line_tokens = estimate_tokens(line)
+        parts.append(line)
+        tokens_used += line_tokens
+        rows_used += 1
+
+    return PackedContext(''.join(parts), rows_used, tokens_used, truncated)
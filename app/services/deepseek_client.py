@@ -0,0 +1,103 @@
+# /chatbotAI/app/services/deepseek_client.py
+import threading
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from config import Config
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+
+
+def _build_timeout():
+    return httpx.Timeout(
+        Config.DEEPSEEK_READ_TIMEOUT,
+        connect=Config.DEEPSEEK_CONNECT_TIMEOUT,
+    )
+
+
+def _build_limits(pool_size):
+    return httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=Config.DEEPSEEK_KEEPALIVE_SECONDS,
+    )
+
+
+def _create_client():
+    """Tạo client OpenAI (DeepSeek) với pool kết nối keep-alive và timeout rõ ràng."""
+    http_client = DefaultHttpxClient(
+        limits=_build_limits(Config.DEEPSEEK_POOL_SIZE),
+        timeout=_build_timeout(),
+    )
+    return OpenAI(
+        api_key=Config.DEEPSEEK_API_KEY,
+        base_url=DEEPSEEK_BASE_URL,
+        http_client=http_client,
+        timeout=_build_timeout(),
+        max_retries=Config.DEEPSEEK_MAX_RETRIES,
+    )
+
+
+def get_client():
+    """
+    Trả về client dùng chung cho toàn tiến trình (tạo lần đầu khi cần).
+    httpx.Client an toàn khi dùng đồng thời từ nhiều luồng, nên các request dùng chung một pool.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+
+def get_async_client():
+    """
+    Trả về client bất đồng bộ (AsyncOpenAI) dùng chung cho chế độ ASGI.
+    Client gắn với event loop đang chạy, nên chỉ được gọi từ bên trong event loop của server.
+    Pool lớn hơn client đồng bộ vì một tiến trình có thể chờ hàng trăm lời gọi cùng lúc.
+    """
+    global _async_client
+    if _async_client is None:
+        http_client = DefaultAsyncHttpxClient(
+            limits=_build_limits(Config.DEEPSEEK_ASYNC_POOL_SIZE),
+            timeout=_build_timeout(),
+        )
+        _async_client = AsyncOpenAI(
+            api_key=Config.DEEPSEEK_API_KEY,
+            base_url=DEEPSEEK_BASE_URL,
+            http_client=http_client,
+            timeout=_build_timeout(),
+            max_retries=Config.DEEPSEEK_MAX_RETRIES,
+        )
+    return _async_client
+
+
+def warm_up(connections=None):
+    """
+    Mở sẵn một số kết nối tới DeepSeek (TLS + keep-alive) bằng các request nhẹ `GET /models`
+    chạy song song, để request đầu tiên của người dùng không phải chờ bắt tay kết nối.
+    """
+    connections = Config.DEEPSEEK_WARMUP_CONNECTIONS if connections is None else connections
+    if connections <= 0 or not Config.DEEPSEEK_API_KEY:
+        return
+
+    client = get_client()
+
+    def _ping():
+        try:
+            client.models.list()
+        except Exception as e:
+            print(f"Lỗi khi làm nóng kết nối DeepSeek: {e}")
+
+    threads = [threading.Thread(target=_ping, daemon=True) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"Đã làm nóng {connections} kết nối tới DeepSeek.")
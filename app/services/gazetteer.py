@@ -0,0 +1,152 @@
+# /chatbotAI/app/services/gazetteer.py
+import threading
+from collections import deque
+
+from config import Config
+from app.services import google_sheets_service as gs
+from app.services.vietnamese_text import fold_diacritics, words
+
+# Tiền tố loại đơn vị (đã bỏ dấu) và các cách viết tắt thường gặp.
+# "Phường Bến Nghé" còn được nhận ra khi người dùng chỉ gõ "Bến Nghé" hoặc "P. Bến Nghé".
+UNIT_PREFIXES = {
+    'phuong': ['p'],
+    'xa': ['x'],
+    'thi tran': ['tt'],
+    'thi xa': ['tx'],
+    'quan': ['q'],
+    'huyen': ['h'],
+    'thanh pho': ['tp'],
+    'uy ban nhan dan': ['ubnd'],
+}
+
+# Các cột kiến thức dùng để xác định một hàng thuộc đơn vị nào
+UNIT_COLUMNS = ('answering_unit', 'question')
+
+
+def _variants(name):
+    """Các chuỗi từ (đã bỏ dấu) dùng để nhận ra một đơn vị trong câu hỏi."""
+    tokens = words(fold_diacritics(name))
+    if not tokens:
+        return []
+    variants = [tokens]
+    for prefix, abbreviations in UNIT_PREFIXES.items():
+        prefix_tokens = prefix.split()
+        if tokens[:len(prefix_tokens)] != prefix_tokens:
+            continue
+        remainder = tokens[len(prefix_tokens):]
+        for abbreviation in abbreviations:
+            variants.append([abbreviation] + remainder)
+        # Chỉ bỏ hẳn tiền tố khi phần còn lại đủ đặc trưng ("Phường 1" thì không)
+        if len(remainder) >= 2 and not all(token.isdigit() for token in remainder):
+            variants.append(remainder)
+    return variants
+
+
+class Gazetteer:
+    """
+    Danh mục đơn vị hành chính / cơ quan, biên dịch thành automaton Aho-Corasick trên chuỗi từ
+    (đã bỏ dấu) để tìm tất cả đơn vị được nhắc tới trong một câu chỉ với một lần duyệt.
+    """
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(name.strip() for name in names if str(name).strip()))
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for name in self.names:
+            for tokens in _variants(name):
+                self._add_pattern(tokens, name)
+        self._build_failure_links()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _add_pattern(self, tokens, name):
+        node = 0
+        for token in tokens:
+            next_node = self._goto[node].get(token)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][token] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        if (len(tokens), name) not in self._output[node]:
+            self._output[node].append((len(tokens), name))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def extract(self, text, overlapping=False):
+        """
+        Trả về danh sách tên đơn vị (tên gốc trong danh mục) được nhắc tới trong `text`, theo thứ tự xuất hiện.
+        Các đoạn khớp chồng lấn nhau thì giữ đoạn dài nhất, trừ khi `overlapping=True`
+        (khi đó "UBND phường Bến Nghé" trả về cả "Phường Bến Nghé").
+        """
+        if not self.names:
+            return []
+        matches = []
+        node = 0
+        for position, token in enumerate(words(fold_diacritics(text))):
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            for length, name in self._output[node]:
+                matches.append((position - length + 1, -length, name))
+
+        found = []
+        covered_until = -1
+        for start, negative_length, name in sorted(matches):
+            if overlapping or start > covered_until:
+                covered_until = start - negative_length - 1
+                if name not in found:
+                    found.append(name)
+        return found
+
+
+def load_gazetteer(worksheet_names=None):
+    """Đọc tên đơn vị (cột đầu tiên, bỏ tiêu đề) từ các worksheet danh mục và dựng Gazetteer."""
+    if worksheet_names is None:
+        worksheet_names = [name for name in (Config.WORK_SHEET_PHUONG_XA, Config.WORK_SHEET_CO_QUAN) if name]
+    names = []
+    for worksheet_name in worksheet_names:
+        worksheet = gs.get_worksheet(Config.GOOGLE_SHEET_NAME, worksheet_name)
+        if not worksheet:
+            continue
+        try:
+            names.extend(worksheet.col_values(1)[1:])
+        except Exception as e:
+            print(f"Lỗi khi đọc danh mục đơn vị từ worksheet '{worksheet_name}': {e}")
+            gs.invalidate_handles(e)
+    gazetteer = Gazetteer(names)
+    if worksheet_names:
+        print(f"Đã nạp danh mục {len(gazetteer)} đơn vị hành chính / cơ quan.")
+    return gazetteer
+
+
+_gazetteer = Gazetteer([])
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Danh mục đơn vị hiện tại (rỗng cho đến khi được nạp)."""
+    return _gazetteer
+
+
+def reload():
+    """Nạp lại danh mục từ Google Sheet và thay thế danh mục đang dùng."""
+    global _gazetteer
+    gazetteer = load_gazetteer()
+    with _gazetteer_lock:
+        _gazetteer = gazetteer
+    return gazetteer
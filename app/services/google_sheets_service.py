@@ -2,54 +2,286 @@
 import gspread
 import pandas as pd
 from config import Config # Import từ file config gốc
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 # Lấy tên sheet từ config
 GOOGLE_SHEET_NAME = Config.GOOGLE_SHEET_NAME
 HISTORY_WORKSHEET_NAME = Config.HISTORY_WORKSHEET_NAME
+KNOWLEDGE_WORKSHEET_NAMES = Config.KNOWLEDGE_WORKSHEET_NAMES
+# Worksheet nhận kiến thức mới/sửa/xóa: worksheet kiến thức đầu tiên, hoặc sheet1 nếu không cấu hình
+KNOWLEDGE_WRITE_WORKSHEET = KNOWLEDGE_WORKSHEET_NAMES[0] if KNOWLEDGE_WORKSHEET_NAMES else None
+
+# --- BỘ NHỚ ĐỆM CLIENT / SPREADSHEET / WORKSHEET ---
+# Xác thực và tra cứu bảng tính theo tên (qua Drive) chỉ làm một lần, sau đó dùng lại.
+# google-auth tự làm mới access token khi hết hạn; handle chỉ bị làm mới khi có lỗi.
+_handles_lock = threading.RLock()
+_client = None
+_spreadsheet_keys = {}   # tên bảng tính -> key (để mở lại bằng key, không cần tra cứu theo tên)
+_spreadsheets = {}       # key -> Spreadsheet
+_worksheets = {}         # (tên bảng tính, tên worksheet) -> Worksheet
 
 def _get_gspread_client():
-    """Hàm nội bộ để khởi tạo client, tránh lặp code."""
-    return gspread.service_account(filename='credentials.json')
-
-def get_google_sheet_data(sheet_name=GOOGLE_SHEET_NAME):
-    """Kết nối và đọc dữ liệu chính."""
-    try:
-        gc = _get_gspread_client()
-        spreadsheet = gc.open(sheet_name)
-        worksheet = spreadsheet.sheet1
-        data = worksheet.get_all_records()
-        df = pd.DataFrame(data)
-        print(f"Đọc dữ liệu từ Google Sheet '{sheet_name}' thành công.")
+    """Hàm nội bộ trả về client dùng chung, chỉ xác thực lần đầu."""
+    global _client
+    with _handles_lock:
+        if _client is None:
+            _client = gspread.service_account(filename='credentials.json')
+        return _client
+
+def get_spreadsheet(sheet_name=GOOGLE_SHEET_NAME):
+    """
+    Lấy đối tượng Spreadsheet từ cache. Lần đầu mở theo tên, các lần mở lại
+    (sau khi handle bị làm mới) dùng key đã biết để tránh tra cứu Drive.
+    Request mạng chạy ngoài khóa; khóa chỉ giữ khi đọc/ghi cache, nên một lần mở chậm
+    không chặn các request đang dùng handle đã cache.
+    """
+    with _handles_lock:
+        key = _spreadsheet_keys.get(sheet_name)
+        if key and key in _spreadsheets:
+            return _spreadsheets[key]
+
+    gc = _get_gspread_client()
+    spreadsheet = gc.open_by_key(key) if key else gc.open(sheet_name)
+    with _handles_lock:
+        _spreadsheet_keys[sheet_name] = spreadsheet.id
+        # Luồng khác mở xong trước thì dùng chung handle của luồng đó
+        return _spreadsheets.setdefault(spreadsheet.id, spreadsheet)
+
+def open_worksheet(sheet_name, worksheet_name=None):
+    """Lấy worksheet từ cache (ném exception nếu lỗi); request mạng chạy ngoài khóa như get_spreadsheet."""
+    cache_key = (sheet_name, worksheet_name)
+    with _handles_lock:
+        worksheet = _worksheets.get(cache_key)
+    if worksheet is not None:
+        return worksheet
+
+    spreadsheet = get_spreadsheet(sheet_name)
+    worksheet = spreadsheet.worksheet(worksheet_name) if worksheet_name else spreadsheet.sheet1
+    with _handles_lock:
+        return _worksheets.setdefault(cache_key, worksheet)
+
+def open_worksheets(sheet_name, worksheet_names):
+    """
+    Lấy nhiều worksheet cùng lúc. Các worksheet chưa có trong cache được phân giải bằng
+    một lần gọi spreadsheet.worksheets() (ngoài khóa) thay vì mỗi tên một request.
+    """
+    with _handles_lock:
+        found = {name: _worksheets.get((sheet_name, name)) for name in worksheet_names}
+    missing = [name for name, worksheet in found.items() if worksheet is None]
+    if missing:
+        by_title = {worksheet.title: worksheet for worksheet in get_spreadsheet(sheet_name).worksheets()}
+        for name in missing:
+            if name not in by_title:
+                raise gspread.exceptions.WorksheetNotFound(name)
+        with _handles_lock:
+            for name in missing:
+                found[name] = _worksheets.setdefault((sheet_name, name), by_title[name])
+    return [found[name] for name in worksheet_names]
+
+def _is_auth_error(error):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) in (401, 403)
+
+def invalidate_handles(error=None):
+    """
+    Bỏ các handle đã cache để lần gọi sau phân giải lại (vẫn giữ key đã biết).
+    Nếu lỗi là lỗi xác thực thì tạo lại cả client.
+    """
+    global _client
+    with _handles_lock:
+        _spreadsheets.clear()
+        _worksheets.clear()
+        if error is None or _is_auth_error(error):
+            _client = None
+
+def get_google_sheet_data(sheet_name=GOOGLE_SHEET_NAME, worksheet_names=None):
+    """
+    Kết nối và đọc dữ liệu chính. Nếu có cấu hình nhiều worksheet kiến thức, các worksheet
+    được tải song song (tối đa KNOWLEDGE_LOAD_WORKERS luồng) rồi gộp thành một DataFrame;
+    df.attrs['worksheets'] ghi lại (tên worksheet, số hàng) theo thứ tự để dựng chỉ mục riêng.
+    """
+    if worksheet_names is None:
+        worksheet_names = KNOWLEDGE_WORKSHEET_NAMES
+    try:
+        if not worksheet_names:
+            worksheet = open_worksheet(sheet_name)
+            data = worksheet.get_all_records()
+            df = pd.DataFrame(data)
+            print(f"Đọc dữ liệu từ Google Sheet '{sheet_name}' thành công.")
+            return df
+
+        # Phân giải mọi handle bằng một request (đã cache thì không tốn request), phần đọc dữ liệu chạy song song
+        worksheets = open_worksheets(sheet_name, worksheet_names)
+        workers = max(1, min(Config.KNOWLEDGE_LOAD_WORKERS, len(worksheets)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sheet-loader') as pool:
+            frames = [pd.DataFrame(records) for records in pool.map(lambda ws: ws.get_all_records(), worksheets)]
+        df = pd.concat(frames, ignore_index=True).fillna('') if frames else pd.DataFrame()
+        df.attrs['worksheets'] = [(name, len(frame)) for name, frame in zip(worksheet_names, frames)]
+        print(f"Đọc dữ liệu từ {len(frames)} worksheet của Google Sheet '{sheet_name}' thành công "
+              f"({len(df)} hàng).")
         return df
     except gspread.exceptions.SpreadsheetNotFound:
         print(f"Lỗi: Không tìm thấy bảng tính '{sheet_name}'.")
         return None
     except Exception as e:
         print(f"Đã xảy ra lỗi khi đọc Google Sheet: {e}")
+        invalidate_handles(e)
+        return None
+
+def get_change_token(sheet_name=GOOGLE_SHEET_NAME):
+    """
+    Tín hiệu thay đổi rẻ của bảng tính: thời điểm sửa đổi cuối (modifiedTime) từ Drive API.
+    Trả về None nếu không lấy được.
+    """
+    try:
+        return get_spreadsheet(sheet_name).get_lastUpdateTime()
+    except Exception as e:
+        print(f"Lỗi khi kiểm tra thay đổi của Google Sheet: {e}")
+        invalidate_handles(e)
         return None
 
 def get_worksheet(sheet_name, worksheet_name=None):
-    """Lấy một worksheet cụ thể."""
+    """Lấy một worksheet cụ thể (dùng lại handle đã cache)."""
     try:
-        gc = _get_gspread_client()
-        spreadsheet = gc.open(sheet_name)
-        if worksheet_name:
-            return spreadsheet.worksheet(worksheet_name)
-        return spreadsheet.sheet1
+        return open_worksheet(sheet_name, worksheet_name)
     except Exception as e:
         print(f"Lỗi khi lấy worksheet: {e}")
+        invalidate_handles(e)
         return None
 
-def find_row_by_id(worksheet, item_id):
+# --- CHỈ MỤC ID -> SỐ HÀNG ---
+# Tránh tải toàn bộ cột A mỗi lần tìm hàng. Chỉ mục được cập nhật tăng dần khi
+# thêm/xóa hàng, và được kiểm tra lại bằng chính hàng vừa đọc: nếu sheet bị sửa
+# từ bên ngoài (ID ở hàng đó không khớp) thì xây dựng lại.
+
+class RowIndex:
+    """Ánh xạ ID (cột A) -> số hàng của một worksheet, kèm hàng tiêu đề."""
+
+    def __init__(self):
+        self.rows = {}
+        self.headers = []
+        self.last_row = 0
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def rebuild(self, worksheet):
+        """Đọc cột A và hàng tiêu đề trong một request duy nhất rồi dựng lại chỉ mục."""
+        id_range, header_range = worksheet.batch_get(['A:A', '1:1'])
+        ids = [cells[0] if cells else '' for cells in id_range]
+        rows = {}
+        # Bỏ qua hàng tiêu đề; ID trùng thì giữ hàng đầu tiên như cách quét tuần tự cũ
+        for i, cell_value in enumerate(ids[1:], start=2):
+            if cell_value != '':
+                rows.setdefault(str(cell_value), i)
+        with self._lock:
+            self.rows = rows
+            self.headers = list(header_range[0]) if header_range else []
+            self.last_row = len(ids)
+            self.loaded = True
+
+    def lookup(self, item_id):
+        with self._lock:
+            return self.rows.get(str(item_id))
+
+    def record_append(self, item_ids, first_row=None):
+        """Ghi nhận các hàng vừa được thêm vào cuối sheet."""
+        with self._lock:
+            if not self.loaded:
+                return
+            row = first_row or self.last_row + 1
+            for item_id in item_ids:
+                self.rows.setdefault(str(item_id), row)
+                row += 1
+            self.last_row = max(self.last_row, row - 1)
+
+    def record_delete(self, row_number):
+        """Ghi nhận một hàng bị xóa: các hàng phía sau dịch lên một dòng."""
+        with self._lock:
+            if not self.loaded:
+                return
+            self.rows = {
+                item_id: (row - 1 if row > row_number else row)
+                for item_id, row in self.rows.items()
+                if row != row_number
+            }
+            self.last_row = max(1, self.last_row - 1)
+
+_row_indexes = {}  # (spreadsheet_id, worksheet_id) -> RowIndex
+
+def get_row_index(worksheet, refresh=False):
+    """Lấy chỉ mục ID -> hàng của worksheet (xây dựng ở lần dùng đầu tiên hoặc khi refresh=True)."""
+    key = (worksheet.spreadsheet_id, worksheet.id)
+    with _handles_lock:
+        row_index = _row_indexes.get(key)
+        if row_index is None:
+            row_index = _row_indexes[key] = RowIndex()
+    if refresh or not row_index.loaded:
+        row_index.rebuild(worksheet)
+    return row_index
+
+def _first_appended_row(response):
+    """Lấy số hàng đầu tiên từ `updates.updatedRange` (ví dụ 'Sheet1!A12:K14') của append."""
     try:
-        str_item_id = str(item_id)
-        id_column_values = worksheet.col_values(1)
-        for i, cell_value in enumerate(id_column_values):
-            if str(cell_value) == str_item_id:
-                return i + 1
+        updated_range = response['updates']['updatedRange']
+        start = updated_range.split('!')[-1].split(':')[0]
+        return int(''.join(ch for ch in start if ch.isdigit()))
+    except (KeyError, TypeError, ValueError):
         return None
+
+def record_appended_rows(worksheet, rows, response=None):
+    """Cập nhật chỉ mục ID -> hàng sau khi append (ID nằm ở cột đầu tiên của mỗi hàng)."""
+    # Chưa có chỉ mục thì không cần làm gì, lần tra cứu đầu tiên sẽ tự xây dựng
+    row_index = _row_indexes.get((worksheet.spreadsheet_id, worksheet.id))
+    if row_index is not None:
+        row_index.record_append([row[0] for row in rows], _first_appended_row(response))
+
+def locate_row_by_id(worksheet, item_id):
+    """
+    Tìm hàng theo ID qua chỉ mục và đọc giá trị của hàng đó.
+    Trả về (số hàng, danh sách giá trị) hoặc (None, None) nếu không tìm thấy.
+    Nếu ID ở hàng đọc được không khớp (sheet bị sửa từ bên ngoài) thì dựng lại chỉ mục và thử lại.
+    """
+    str_item_id = str(item_id)
+    row_index = get_row_index(worksheet)
+    for attempt in range(2):
+        row_number = row_index.lookup(str_item_id)
+        if row_number:
+            values = worksheet.row_values(row_number)
+            if values and str(values[0]) == str_item_id:
+                return row_number, values
+        if attempt == 0:
+            row_index.rebuild(worksheet)
+    return None, None
+
+def _knowledge_worksheet_names(preferred=None):
+    """Thứ tự worksheet kiến thức để tìm một hàng: worksheet được chỉ định trước, rồi các worksheet còn lại."""
+    names = list(KNOWLEDGE_WORKSHEET_NAMES) or [None]
+    preferred = preferred or KNOWLEDGE_WRITE_WORKSHEET
+    return [preferred] + [name for name in names if name != preferred]
+
+def locate_knowledge_row(item_id, worksheet_name=None):
+    """
+    Tìm hàng kiến thức theo ID: trong `worksheet_name` (worksheet chứa hàng, nếu biết) trước,
+    sau đó trong các worksheet kiến thức còn lại.
+    Trả về (worksheet, số hàng, danh sách giá trị) hoặc (None, None, None) nếu không thấy.
+    """
+    for name in _knowledge_worksheet_names(worksheet_name):
+        worksheet = get_worksheet(GOOGLE_SHEET_NAME, name)
+        if not worksheet:
+            continue
+        row_number, values = locate_row_by_id(worksheet, item_id)
+        if row_number:
+            return worksheet, row_number, values
+    return None, None, None
+
+def find_row_by_id(worksheet, item_id):
+    try:
+        row_number, _ = locate_row_by_id(worksheet, item_id)
+        return row_number
     except Exception as e:
         print(f"Lỗi khi tìm hàng bằng ID: {e}")
+        invalidate_handles(e)
         return None
 
 def add_data_to_google_sheet(data_to_add, sheet_name=GOOGLE_SHEET_NAME):
@@ -60,17 +292,34 @@ def add_data_to_google_sheet(data_to_add, sheet_name=GOOGLE_SHEET_NAME):
             return True, None
         return False, "Không tìm thấy worksheet."
     except Exception as e:
+        invalidate_handles(e)
         return False, str(e)
 
 def log_chat_history(data_to_log):
     try:
         worksheet = get_worksheet(GOOGLE_SHEET_NAME, HISTORY_WORKSHEET_NAME)
         if worksheet:
-            worksheet.append_row(data_to_log)
+            response = worksheet.append_row(data_to_log)
+            record_appended_rows(worksheet, [data_to_log], response)
             return True, None
         return False, "Không tìm thấy worksheet lịch sử."
     except Exception as e:
         print(f"Lỗi khi ghi lịch sử chat: {e}")
+        invalidate_handles(e)
+        return False, str(e)
+
+def log_chat_history_rows(rows_to_log):
+    """Ghi nhiều hàng lịch sử chat bằng một lần gọi append_rows."""
+    try:
+        worksheet = get_worksheet(GOOGLE_SHEET_NAME, HISTORY_WORKSHEET_NAME)
+        if worksheet:
+            response = worksheet.append_rows(rows_to_log)
+            record_appended_rows(worksheet, rows_to_log, response)
+            return True, None
+        return False, "Không tìm thấy worksheet lịch sử."
+    except Exception as e:
+        print(f"Lỗi khi ghi lịch sử chat theo lô: {e}")
+        invalidate_handles(e)
         return False, str(e)
 
 
@@ -92,6 +341,7 @@ def get_chat_history_data():
         return None
     except Exception as e:
         print(f"Lỗi khi lấy lịch sử chat: {e}")
+        invalidate_handles(e)
         return None
 
 def get_chat_history_detail_by_id(chat_id):
@@ -105,18 +355,18 @@ def get_chat_history_detail_by_id(chat_id):
             print(f"Không thể lấy worksheet: {HISTORY_WORKSHEET_NAME}")
             return None
 
-        row_number = find_row_by_id(worksheet, chat_id)
+        row_number, values = locate_row_by_id(worksheet, chat_id)
         if not row_number:
             print(f"Không tìm thấy lịch sử chat với ID: {chat_id}")
             return None
 
-        headers = worksheet.row_values(1)
-        values = worksheet.row_values(row_number)
+        headers = get_row_index(worksheet).headers
         chat_detail = dict(zip(headers, values))
         return chat_detail
 
     except Exception as e:
         print(f"Lỗi khi lấy chi tiết lịch sử chat: {e}")
+        invalidate_handles(e)
         return None
 
 def delete_chat_history_by_id(chat_id):
@@ -129,14 +379,16 @@ def delete_chat_history_by_id(chat_id):
         if not worksheet:
             return False, f"Không tìm thấy worksheet lịch sử: {HISTORY_WORKSHEET_NAME}"
 
-        row_to_delete = find_row_by_id(worksheet, chat_id)
+        row_to_delete, _ = locate_row_by_id(worksheet, chat_id)
         if not row_to_delete:
             return False, f"Không tìm thấy lịch sử chat với ID: {chat_id}"
 
         worksheet.delete_rows(row_to_delete)
+        get_row_index(worksheet).record_delete(row_to_delete)
         return True, None
     except Exception as e:
         print(f"Lỗi khi xóa lịch sử chat: {e}")
+        invalidate_handles(e)
         return False, str(e)
 
 
@@ -161,79 +413,180 @@ def get_knowledge_detail_by_id(item_id, dataframe):
         print(f"Lỗi khi tìm kiến thức bằng ID trong DataFrame: {e}")
         return None
 
-def update_knowledge_by_id(item_id, new_data):
+def update_knowledge_by_id(item_id, new_data, worksheet_name=None):
     """
     Cập nhật một hàng kiến thức trong Google Sheet.
     new_data là một dictionary chứa các trường cần cập nhật, key là tên cột.
+    worksheet_name là worksheet chứa hàng (nếu biết); không có thì tìm lần lượt các worksheet kiến thức.
+    Trả về (thành công, thông báo lỗi, các trường đã thực sự ghi) để snapshot trong bộ nhớ
+    được cập nhật đúng bằng những gì có trên sheet.
     """
     try:
-        worksheet = get_worksheet(GOOGLE_SHEET_NAME)
-        print("update",worksheet)
-        if not worksheet:
-            return False, "Không tìm thấy worksheet kiến thức."
-
-        row_to_update = find_row_by_id(worksheet, item_id)
+        worksheet, row_to_update, current_values = locate_knowledge_row(item_id, worksheet_name)
         if not row_to_update:
-            return False, f"Không tìm thấy kiến thức với ID: {item_id}"
+            return False, f"Không tìm thấy kiến thức với ID: {item_id}", None
         
-        headers = worksheet.row_values(1)
-        current_values = worksheet.row_values(row_to_update)
+        headers = get_row_index(worksheet).headers
         
-        updated_values = list(current_values)
+        # row_values() bỏ các ô trống ở cuối hàng: đệm đủ số cột để ghi được vào các cột đó
+        updated_values = list(current_values) + [''] * (len(headers) - len(current_values))
         header_to_index = {header: i for i, header in enumerate(headers)}
+        written = {}
 
         for key, value in new_data.items():
             if key in header_to_index:
-                index = header_to_index[key]
-                if index < len(updated_values):
-                    updated_values[index] = value
+                updated_values[header_to_index[key]] = value
+                written[key] = value
         
         worksheet.update(f'A{row_to_update}', [updated_values])
-        return True, None
+        return True, None, written
 
     except Exception as e:
         print(f"Lỗi khi cập nhật kiến thức: {e}")
-        return False, str(e)
+        invalidate_handles(e)
+        return False, str(e), None
 
-def delete_knowledge_by_id(item_id):
+def delete_knowledge_by_id(item_id, worksheet_name=None):
     """
-    Xóa một hàng kiến thức dựa trên ID.
+    Xóa một hàng kiến thức dựa trên ID (tìm trong `worksheet_name` trước, như update_knowledge_by_id).
     """
     try:
-        worksheet = get_worksheet(GOOGLE_SHEET_NAME)
-        if not worksheet:
-            return False, "Không tìm thấy worksheet kiến thức."
-        
-        row_to_delete = find_row_by_id(worksheet, item_id)
+        worksheet, row_to_delete, _ = locate_knowledge_row(item_id, worksheet_name)
         if not row_to_delete:
             return False, f"Không tìm thấy kiến thức với ID: {item_id}"
         
         worksheet.delete_rows(row_to_delete)
+        get_row_index(worksheet).record_delete(row_to_delete)
         return True, None
     except Exception as e:
         print(f"Lỗi khi xóa kiến thức: {e}")
+        invalidate_handles(e)
         return False, str(e)
+def build_knowledge_row(knowledge_data, new_id):
+    """Tạo một hàng kiến thức theo đúng thứ tự cột trong sheet."""
+    return [
+        new_id,
+        knowledge_data.get('sender', ''),
+        knowledge_data.get('question'),
+        knowledge_data.get('time_question', ''),
+        knowledge_data.get('answer'),
+        knowledge_data.get('answering_unit', ''),
+        knowledge_data.get('time_answer', ''),
+        knowledge_data.get('document', ''),
+        knowledge_data.get('question_no', ''),
+        knowledge_data.get('Date_of_issue', ''),
+        knowledge_data.get('Text_link', ''),
+    ]
+
 def add_knowledge(knowledge_data):
     """Thêm kiến thức mới, sử dụng UUID cho ID."""
     try:
         new_id = str(uuid.uuid4()) # <-- SỬ DỤNG UUID
-        new_data_row = [
-            new_id,
-            knowledge_data.get('sender', ''),
-            knowledge_data.get('question'),
-            knowledge_data.get('time_question', ''),
-            knowledge_data.get('answer'),
-            knowledge_data.get('answering_unit', ''),
-            knowledge_data.get('time_answer', ''),
-            knowledge_data.get('document', ''),
-            knowledge_data.get('question_no', ''),
-            knowledge_data.get('Date_of_issue', ''),
-            knowledge_data.get('Text_link', ''),
-        ]
-        worksheet = get_worksheet(GOOGLE_SHEET_NAME)
+        new_data_row = build_knowledge_row(knowledge_data, new_id)
+        worksheet = get_worksheet(GOOGLE_SHEET_NAME, KNOWLEDGE_WRITE_WORKSHEET)
         if not worksheet:
             return False, "Không tìm thấy worksheet kiến thức.", None
-        worksheet.append_row(new_data_row)
+        response = worksheet.append_row(new_data_row)
+        record_appended_rows(worksheet, [new_data_row], response)
         return True, None, new_id
     except Exception as e:
-        return False, str(e), None  
\ No newline at end of file
+        invalidate_handles(e)
+        return False, str(e), None
+
+def append_knowledge_rows(rows):
+    """Ghi các hàng kiến thức đã dựng sẵn (đã có ID) bằng một lần append_rows."""
+    try:
+        worksheet = get_worksheet(GOOGLE_SHEET_NAME, KNOWLEDGE_WRITE_WORKSHEET)
+        if not worksheet:
+            return False, "Không tìm thấy worksheet kiến thức."
+        response = worksheet.append_rows(rows)
+        record_appended_rows(worksheet, rows, response)
+        return True, None
+    except Exception as e:
+        print(f"Lỗi khi ghi hàng kiến thức: {e}")
+        invalidate_handles(e)
+        return False, str(e)
+
+# --- NHẬP / CẬP NHẬT KIẾN THỨC HÀNG LOẠT ---
+
+def bulk_add_knowledge(items, chunk_size=500):
+    """
+    Thêm nhiều kiến thức bằng append_rows theo từng lô.
+    Trả về (danh sách kết quả theo thứ tự `items`, danh sách hàng đã ghi thành công).
+    Mỗi kết quả là dict {'id': ..., 'error': ...}.
+    """
+    results = [None] * len(items)
+    written_rows = []
+    worksheet = get_worksheet(GOOGLE_SHEET_NAME, KNOWLEDGE_WRITE_WORKSHEET)
+    if not worksheet:
+        return [{'id': None, 'error': "Không tìm thấy worksheet kiến thức."} for _ in items], []
+
+    rows = [build_knowledge_row(item, str(uuid.uuid4())) for item in items]
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            response = worksheet.append_rows(chunk)
+            record_appended_rows(worksheet, chunk, response)
+            written_rows.extend(chunk)
+            error_message = None
+        except Exception as e:
+            print(f"Lỗi khi thêm lô kiến thức (hàng {start}-{start + len(chunk) - 1}): {e}")
+            invalidate_handles(e)
+            error_message = str(e)
+        for offset, row in enumerate(chunk):
+            results[start + offset] = {'id': None if error_message else row[0], 'error': error_message}
+    return results, written_rows
+
+def bulk_update_knowledge(updates, chunk_size=500, worksheet_names=None):
+    """
+    Cập nhật nhiều kiến thức; `updates` là danh sách (item_id, new_data).
+    `worksheet_names` (nếu có) là worksheet chứa từng hàng theo cùng thứ tự; hàng không rõ worksheet,
+    hoặc không có ở worksheet được chỉ định, được tìm trong các worksheet kiến thức còn lại.
+    Chỉ ghi các ô thay đổi bằng batch_update theo từng worksheet, không đọc lại từng hàng.
+    Trả về danh sách lỗi theo thứ tự `updates` (None nếu thành công).
+    """
+    errors = [None] * len(updates)
+    worksheet_names = worksheet_names or [None] * len(updates)
+    names = _knowledge_worksheet_names()
+    try:
+        if names == [None]:
+            worksheets = [open_worksheet(GOOGLE_SHEET_NAME)]
+        else:
+            worksheets = open_worksheets(GOOGLE_SHEET_NAME, names)
+        # Dựng lại chỉ mục ID -> hàng của từng worksheet (mỗi worksheet một request) để vị trí hàng chắc chắn mới nhất
+        row_indexes = {   # tên worksheet -> (worksheet, chỉ mục ID -> hàng)
+            name: (worksheet, get_row_index(worksheet, refresh=True))
+            for name, worksheet in zip(names, worksheets)
+        }
+    except Exception as e:
+        print(f"Lỗi khi đọc chỉ mục ID của sheet kiến thức: {e}")
+        invalidate_handles(e)
+        return [str(e)] * len(updates)
+
+    cell_updates = {}   # tên worksheet -> danh sách (vị trí trong `updates`, dict range/values)
+    for position, ((item_id, new_data), preferred) in enumerate(zip(updates, worksheet_names)):
+        owner = next((name for name in _knowledge_worksheet_names(preferred)
+                      if name in row_indexes and row_indexes[name][1].lookup(item_id)), None)
+        if owner is None:
+            errors[position] = f"Không tìm thấy kiến thức với ID: {item_id}"
+            continue
+        row_index = row_indexes[owner][1]
+        row_number = row_index.lookup(item_id)
+        header_to_index = {header: i for i, header in enumerate(row_index.headers)}
+        for key, value in new_data.items():
+            if key in header_to_index and header_to_index[key] > 0:
+                cell = gspread.utils.rowcol_to_a1(row_number, header_to_index[key] + 1)
+                cell_updates.setdefault(owner, []).append((position, {'range': cell, 'values': [[value]]}))
+
+    for owner, owner_updates in cell_updates.items():
+        worksheet = row_indexes[owner][0]
+        for start in range(0, len(owner_updates), chunk_size):
+            chunk = owner_updates[start:start + chunk_size]
+            try:
+                worksheet.batch_update([update for _, update in chunk])
+            except Exception as e:
+                print(f"Lỗi khi cập nhật lô kiến thức: {e}")
+                invalidate_handles(e)
+                for position, _ in chunk:
+                    errors[position] = str(e)
+    return errors
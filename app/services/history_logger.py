@@ -0,0 +1,128 @@
+# /chatbotAI/app/services/history_logger.py
+import atexit
+import queue
+import threading
+import time
+
+from config import Config
+from app.services import storage
+
+
+class HistoryLogger:
+    """
+    Ghi lịch sử chat kiểu write-behind: request chỉ đẩy hàng vào hàng đợi có giới hạn,
+    một luồng nền duy nhất gom các hàng và ghi bằng một lần append_rows
+    mỗi `batch_size` hàng hoặc mỗi `flush_interval_ms` mili giây.
+    Mỗi phần tử trong hàng đợi là một nhóm hàng; khi đang chạy, nhóm luôn được ghi trọn trong cùng một lần append.
+    """
+
+    def __init__(self, write_rows, max_queue_size=10000, batch_size=50,
+                 flush_interval_ms=1000, max_retries=5):
+        self.write_rows = write_rows
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Khởi động luồng ghi nền (gọi nhiều lần cũng chỉ tạo một luồng)."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='history-logger', daemon=True)
+            self._thread.start()
+
+    def submit(self, row):
+        """Đưa một hàng lịch sử vào hàng đợi, không chờ ghi. Trả về False nếu hàng đợi đầy."""
+        return self.submit_many([row])
+
+    def submit_many(self, rows):
+        """Đưa nhiều hàng vào hàng đợi như một nhóm, được ghi cùng một lần append. Trả về False nếu hàng đợi đầy."""
+        if not rows:
+            return True
+        self.start()
+        try:
+            self._queue.put_nowait(list(rows))
+            return True
+        except queue.Full:
+            self.dropped += len(rows)
+            print(f"Hàng đợi lịch sử chat đã đầy, bỏ qua {len(rows)} hàng (đã bỏ {self.dropped}).")
+            return False
+
+    def pending(self):
+        """Số nhóm hàng đang chờ ghi trong hàng đợi."""
+        return self._queue.qsize()
+
+    def stop(self, timeout=10):
+        """Dừng luồng nền sau khi đã ghi hết các hàng còn trong hàng đợi."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _collect_batch(self):
+        """Chờ nhóm hàng đầu tiên, rồi gom thêm cho đến khi đủ lô hoặc hết thời gian chờ."""
+        try:
+            batch = list(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.is_set():
+                break
+            try:
+                batch.extend(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        """Lấy ngay tất cả các hàng còn lại (dùng khi tắt)."""
+        rows = []
+        while True:
+            try:
+                rows.extend(self._queue.get_nowait())
+            except queue.Empty:
+                return rows
+
+    def _write_with_retry(self, rows):
+        delay = 0.5
+        for attempt in range(1, self.max_retries + 1):
+            success, error_message = self.write_rows(rows)
+            if success:
+                return True
+            print(f"Ghi {len(rows)} hàng lịch sử thất bại (lần {attempt}/{self.max_retries}): {error_message}")
+            if attempt < self.max_retries:
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+        self.dropped += len(rows)
+        print(f"Bỏ {len(rows)} hàng lịch sử sau {self.max_retries} lần thử.")
+        return False
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._write_with_retry(batch)
+
+        # Ghi nốt phần còn lại trước khi thoát
+        remaining = self._drain()
+        for start in range(0, len(remaining), self.batch_size):
+            self._write_with_retry(remaining[start:start + self.batch_size])
+
+
+# Bộ ghi lịch sử dùng chung cho toàn bộ tiến trình
+history_logger = HistoryLogger(
+    storage.log_chat_history_rows,
+    max_queue_size=Config.HISTORY_QUEUE_SIZE,
+    batch_size=Config.HISTORY_BATCH_SIZE,
+    flush_interval_ms=Config.HISTORY_FLUSH_INTERVAL_MS,
+    max_retries=Config.HISTORY_MAX_RETRIES,
+)
+atexit.register(history_logger.stop)
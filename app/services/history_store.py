@@ -0,0 +1,160 @@
+# /chatbotAI/app/services/history_store.py
+import bisect
+import threading
+import time
+from collections import deque
+
+from config import Config
+from app.services import storage
+
+# Cột mặc định của một hàng lịch sử khi sheet chưa có dữ liệu để đọc tiêu đề
+DEFAULT_HEADERS = ['id', 'timestamp', 'question', 'answer']
+# Số hàng mới tối đa giữ lại để bổ sung sau mỗi lần tải (hàng cũ hơn vẫn có trong nơi lưu trữ)
+MAX_PENDING_ROWS = 10000
+
+
+class HistoryStore:
+    """
+    Bản sao lịch sử chat trong bộ nhớ, sắp xếp theo ID (ID là thời điểm dạng
+    %Y%m%d%H%M%S%f nên so sánh chuỗi cũng là so sánh thời gian).
+    Tải từ nơi lưu trữ (Google Sheet hoặc SQLite), sau đó được cập nhật ngay khi có hàng mới,
+    để các API lịch sử không phải tải lại cả worksheet mỗi lần gọi.
+    Mỗi tiến trình có bản sao riêng: với `reload_seconds` > 0, bản sao quá hạn được tải lại ở luồng nền
+    (request vẫn đọc bản hiện có) để thấy hàng do tiến trình khác ghi hoặc xóa.
+    """
+
+    def __init__(self, load_records, reload_seconds=0):
+        self.load_records = load_records
+        self.reload_seconds = reload_seconds
+        self.headers = list(DEFAULT_HEADERS)
+        self._ids = []
+        self._rows = []
+        # (thời điểm thêm, hàng) của các hàng do tiến trình này thêm, có thể chưa được ghi xuống nơi lưu trữ
+        self._recent = deque(maxlen=MAX_PENDING_ROWS)
+        self._loaded = False
+        self._loaded_at = None
+        self._lock = threading.RLock()
+        # Chỉ một luồng tải lịch sử tại một thời điểm; tải qua mạng không giữ self._lock
+        self._load_lock = threading.Lock()
+
+    def ensure_loaded(self):
+        """
+        Tải lịch sử từ nơi lưu trữ nếu chưa tải. Trả về False nếu tải thất bại.
+        Đã tải nhưng quá hạn thì tải lại ở luồng nền và trả về ngay với dữ liệu hiện có.
+        """
+        if self._loaded:
+            if self._is_stale() and not self._load_lock.locked():
+                threading.Thread(target=self._load, name='history-reload', daemon=True).start()
+            return True
+        return self._load()
+
+    def _is_stale(self):
+        return self.reload_seconds > 0 and time.monotonic() - self._loaded_at >= self.reload_seconds
+
+    def _load(self):
+        """
+        Tải và sắp xếp chạy ngoài khóa dữ liệu, nên add()/get() của các request khác
+        không phải chờ; chỉ bước hoán đổi danh sách đã sắp xếp mới giữ khóa.
+        """
+        with self._load_lock:
+            if self._loaded and not self._is_stale():
+                return True
+            started = time.monotonic()
+            records = self.load_records()
+            if records is None:
+                if self._loaded:
+                    # Giữ bản hiện có, thử lại sau một chu kỳ
+                    self._loaded_at = started
+                return self._loaded
+            headers = list(records[0].keys()) if records else self.headers
+            entries = sorted((str(record.get(headers[0], '')), record) for record in records)
+            with self._lock:
+                previous = self._loaded_at
+                self.headers = headers
+                self._ids = [item_id for item_id, _ in entries]
+                self._rows = [record for _, record in entries]
+                # Hàng thêm từ lúc bắt đầu lần tải trước có thể chưa có trong dữ liệu vừa tải
+                # (luồng ghi nền chưa ghi xong) thì bổ sung vào; hàng cũ hơn chắc chắn đã có
+                while self._recent and previous is not None and self._recent[0][0] < previous:
+                    self._recent.popleft()
+                for _, row in self._recent:
+                    self._insert(row)
+                self._loaded = True
+                self._loaded_at = started
+                print(f"Đã nạp {len(self._rows)} hàng lịch sử chat vào bộ nhớ.")
+            return True
+
+    def _insert(self, values):
+        record = dict(zip(self.headers, values))
+        item_id = str(values[0])
+        position = bisect.bisect_right(self._ids, item_id)
+        if position and self._ids[position - 1] == item_id:
+            return
+        self._ids.insert(position, item_id)
+        self._rows.insert(position, record)
+
+    def add(self, values):
+        """Thêm một hàng lịch sử vừa tạo (danh sách giá trị theo thứ tự cột)."""
+        self.add_many([values])
+
+    def add_many(self, rows):
+        """Thêm nhiều hàng lịch sử vừa tạo trong một lần giữ khóa."""
+        with self._lock:
+            if self._loaded:
+                for values in rows:
+                    self._insert(values)
+            added_at = time.monotonic()
+            self._recent.extend((added_at, values) for values in rows)
+
+    def get(self, item_id):
+        with self._lock:
+            position = bisect.bisect_left(self._ids, str(item_id))
+            if position < len(self._ids) and self._ids[position] == str(item_id):
+                return self._rows[position]
+            return None
+
+    def iter_rows(self, before=None, start_id=None, end_id=None, keyword=None, ids=None, chunk_size=500):
+        """
+        Duyệt các hàng từ mới đến cũ.
+        - before: chỉ lấy hàng có ID nhỏ hơn (con trỏ phân trang)
+        - start_id / end_id: khoảng ID (thời gian) bao gồm hai đầu
+        - keyword: lọc theo từ khóa (không phân biệt hoa thường) trên mọi cột
+        - ids: chỉ lấy các ID trong tập này (kết quả tìm kiếm toàn văn từ nơi lưu trữ)
+        Mỗi lần chỉ sao chép một đoạn nhỏ dưới khóa, nên an toàn khi có hàng mới được thêm vào.
+        """
+        keyword = keyword.lower() if keyword else None
+        cursor = str(before) if before is not None else None
+        while True:
+            with self._lock:
+                upper = bisect.bisect_left(self._ids, cursor) if cursor is not None else len(self._ids)
+                if end_id is not None:
+                    upper = min(upper, bisect.bisect_right(self._ids, str(end_id)))
+                lower = bisect.bisect_left(self._ids, str(start_id)) if start_id is not None else 0
+                lower = max(lower, upper - chunk_size)
+                chunk_ids = self._ids[lower:upper]
+                chunk_rows = self._rows[lower:upper]
+            if not chunk_ids:
+                return
+
+            for item_id, row in zip(reversed(chunk_ids), reversed(chunk_rows)):
+                if ids is not None and item_id not in ids:
+                    continue
+                if keyword and not any(keyword in str(value).lower() for value in row.values()):
+                    continue
+                yield item_id, row
+            cursor = chunk_ids[0]
+
+    def page(self, limit, before=None, start_id=None, end_id=None, keyword=None, ids=None):
+        """Trả về (danh sách hàng, con trỏ trang kế tiếp hoặc None)."""
+        items = []
+        last_id = None
+        for item_id, row in self.iter_rows(before, start_id, end_id, keyword, ids):
+            if len(items) == limit:
+                return items, last_id
+            items.append(row)
+            last_id = item_id
+        return items, None
+
+
+# Kho lịch sử dùng chung cho toàn bộ tiến trình
+history_store = HistoryStore(storage.get_chat_history_data, reload_seconds=Config.HISTORY_RELOAD_INTERVAL)
@@ -0,0 +1,167 @@
+# /chatbotAI/app/services/knowledge_refresher.py
+import datetime
+import threading
+import time
+
+# Số lần tải lại tối đa trong một lần làm mới khi liên tục có delta được áp dụng trong lúc tải
+MAX_LOAD_ATTEMPTS = 3
+
+
+class KnowledgeRefresher:
+    """
+    Luồng nền theo dõi thay đổi của Google Sheet và làm mới snapshot kiến thức.
+    Mỗi chu kỳ chỉ đọc một tín hiệu thay đổi rẻ (modifiedTime); chỉ khi tín hiệu đổi,
+    khi đến hạn đồng bộ toàn bộ, hoặc khi được yêu cầu, mới tải lại cả sheet.
+    Snapshot mới được dựng ngoài luồng request rồi hoán đổi nguyên tử vào KnowledgeStore.
+    """
+
+    def __init__(self, store, load_data, get_change_token, interval_seconds=60,
+                 full_resync_seconds=3600, change_token=None, on_refresh=None):
+        self.store = store
+        self.load_data = load_data
+        self.get_change_token = get_change_token
+        self.interval_seconds = interval_seconds
+        self.full_resync_seconds = full_resync_seconds
+        # Hàm gọi sau mỗi lần hoán đổi snapshot mới: on_refresh(snapshot, change_token)
+        self.on_refresh = on_refresh
+
+        self.last_change_token = change_token
+        self.last_check_at = None
+        self.last_refresh_at = None
+        self.last_error = None
+        self._last_full_sync = time.monotonic()
+        self._force_next = False
+        self._refresh_lock = threading.Lock()
+        # Bảo vệ last_change_token; tách khỏi _refresh_lock để lần ghi của quản trị không phải chờ tải cả sheet
+        self._token_lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Khởi động luồng nền (không làm gì nếu chu kỳ <= 0)."""
+        if self.interval_seconds <= 0 or self.is_running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='knowledge-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def request_refresh(self):
+        """Yêu cầu đồng bộ toàn bộ: chạy nền nếu luồng đang chạy, ngược lại chạy ngay."""
+        if self.is_running:
+            self._force_next = True
+            self._wake_event.set()
+        else:
+            self.refresh(force=True)
+
+    def read_change_token(self):
+        """Đọc tín hiệu thay đổi hiện tại (gọi trước khi ghi, rồi truyền cho acknowledge_own_write)."""
+        return self.get_change_token()
+
+    def acknowledge_own_write(self, token_before):
+        """
+        Gọi sau khi chính ứng dụng ghi vào nơi lưu trữ và đã áp dụng delta vào snapshot.
+        `token_before` là tín hiệu thay đổi đọc ngay trước khi ghi: nếu nó trùng mốc đã đồng bộ thì
+        ngoài lần ghi này không có thay đổi nào khác, nên đọc lại tín hiệu và ghi nhận làm mốc để lần
+        kiểm tra kế tiếp không tải lại toàn bộ. Ngược lại (có sửa từ bên ngoài chưa được đồng bộ) thì
+        giữ nguyên mốc để luồng nền tải lại.
+        Trả về True nếu đã ghi nhận mốc mới.
+        """
+        with self._token_lock:
+            if token_before is None or token_before != self.last_change_token:
+                return False
+            token = self.get_change_token()
+            if token is None:
+                return False
+            self.last_change_token = token
+            return True
+
+    def refresh(self, force=False):
+        """Kiểm tra tín hiệu thay đổi và tải lại nếu cần. Trả về True nếu đã hoán đổi snapshot mới."""
+        with self._refresh_lock:
+            self.last_check_at = datetime.datetime.now()
+            token = self.get_change_token()
+            resync_due = time.monotonic() - self._last_full_sync >= self.full_resync_seconds
+
+            if self.last_change_token is None and token is not None and not force \
+                    and self.store.get().is_loaded:
+                # Lần kiểm tra đầu tiên sau khi khởi động: chỉ ghi nhận mốc
+                with self._token_lock:
+                    self.last_change_token = token
+                return False
+
+            with self._token_lock:
+                changed = token is not None and token != self.last_change_token
+            if not (force or changed or resync_due or not self.store.get().is_loaded):
+                return False
+
+            for attempt in range(MAX_LOAD_ATTEMPTS):
+                if attempt:
+                    token = self.get_change_token()
+                base_version = self.store.get().version
+                data = self.load_data()
+                if data is None:
+                    self.last_error = "Tải dữ liệu từ Google Sheet thất bại."
+                    print(f"Làm mới dữ liệu kiến thức thất bại, giữ snapshot phiên bản {self.store.get().version}.")
+                    return False
+                # Delta của quản trị được áp dụng trong lúc tải thì dữ liệu vừa tải có thể chưa chứa nó: tải lại
+                snapshot = self.store.load(data, base_version=base_version)
+                if snapshot is not None:
+                    break
+                print("Snapshot đã thay đổi trong lúc tải dữ liệu kiến thức, tải lại.")
+            else:
+                self.last_error = "Snapshot liên tục thay đổi trong lúc tải, sẽ thử lại ở chu kỳ sau."
+                self._force_next = True
+                return False
+
+            with self._token_lock:
+                self.last_change_token = token
+            self.last_refresh_at = datetime.datetime.now()
+            self.last_error = None
+            self._last_full_sync = time.monotonic()
+            print(f"Đã làm mới dữ liệu kiến thức: phiên bản {snapshot.version}, {len(data)} hàng.")
+            if self.on_refresh:
+                self.on_refresh(snapshot, token)
+            return True
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self.interval_seconds)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            force, self._force_next = self._force_next, False
+            try:
+                self.refresh(force=force)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Lỗi trong luồng làm mới dữ liệu kiến thức: {e}")
+
+    def status(self):
+        """Thông tin trạng thái cho endpoint quản trị."""
+        snapshot = self.store.get()
+
+        def _iso(value):
+            return value.isoformat(timespec='seconds') if value else None
+
+        return {
+            'version': snapshot.version,
+            'rows': len(snapshot.dataframe) if snapshot.is_loaded else 0,
+            'snapshot_loaded_at': _iso(snapshot.loaded_at),
+            'last_check_at': _iso(self.last_check_at),
+            'last_refresh_at': _iso(self.last_refresh_at),
+            'last_change_token': self.last_change_token,
+            'last_error': self.last_error,
+            'refresher_running': self.is_running,
+            'interval_seconds': self.interval_seconds,
+        }
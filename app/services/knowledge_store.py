@@ -0,0 +1,319 @@
+# /chatbotAI/app/services/knowledge_store.py
+import datetime
+import itertools
+import threading
+
+import pandas as pd
+
+from app.services import bm25_index, gazetteer, search_index, vector_index
+from app.services.gazetteer import UNIT_COLUMNS
+
+
+def _unit_text(record):
+    """Phần chữ của một hàng dùng để nhận ra đơn vị (các cột trong UNIT_COLUMNS)."""
+    return ' '.join(str(record[column]) for column in UNIT_COLUMNS if column in record)
+
+
+def build_unit_labels(dataframe, gazetteer):
+    """
+    Ánh xạ tên đơn vị -> tập nhãn hàng nhắc tới đơn vị đó (theo cột đơn vị trả lời và câu hỏi).
+    Tính cả các đơn vị nằm lồng trong tên dài hơn, để câu hỏi chỉ nhắc "Bến Nghé"
+    vẫn tìm được hàng của "UBND phường Bến Nghé". Duyệt toàn bảng nên chỉ gọi khi dựng snapshot.
+    """
+    mapping = {}
+    columns = [column for column in UNIT_COLUMNS if dataframe is not None and column in dataframe.columns]
+    if len(gazetteer) and columns:
+        texts = dataframe[columns].astype(str).agg(' '.join, axis=1)
+        for label, text in texts.items():
+            for name in gazetteer.extract(text, overlapping=True):
+                mapping.setdefault(name, set()).add(label)
+    return mapping
+
+
+def _batch_dataframe(dataframe, new_rows, updates):
+    """
+    Áp dụng một lô thay đổi (xem apply_batch) lên bản sao của `dataframe`.
+    Trả về (DataFrame mới, nhãn các hàng được sửa, nhãn các hàng mới), hoặc None nếu không áp dụng được.
+    """
+    if dataframe is None or any(len(row) > len(dataframe.columns) for row in new_rows):
+        return None
+
+    new_df = dataframe.copy()
+    updated_labels = {}
+    if updates:
+        id_column = new_df.columns[0]
+        # ID trùng thì giữ hàng đầu tiên, giống find_label
+        labels = dict(zip(reversed(new_df[id_column].astype(str).tolist()), reversed(new_df.index.tolist())))
+        for item_id, new_data in updates:
+            label = labels.get(str(item_id))
+            if label is None:
+                return None
+            updated_labels[label] = None
+            for key, value in new_data.items():
+                if key in new_df.columns:
+                    if new_df[key].dtype != object:
+                        new_df[key] = new_df[key].astype(object)
+                    new_df.at[label, key] = value
+
+    added_labels = []
+    if new_rows:
+        width = len(new_df.columns)
+        padded = [list(row) + [''] * (width - len(row)) for row in new_rows]
+        first_label = int(new_df.index.max()) + 1 if len(new_df) else 0
+        added_labels = list(range(first_label, first_label + len(padded)))
+        added = pd.DataFrame(padded, columns=new_df.columns, index=added_labels)
+        new_df = pd.concat([new_df, added]) if len(new_df) else added
+    return new_df, list(updated_labels), added_labels
+
+
+class KnowledgeSnapshot:
+    """
+    Ảnh chụp (snapshot) bất biến của dữ liệu kiến thức cùng các chỉ mục dẫn xuất.
+    Nhiều request đọc chung một snapshot, vì vậy KHÔNG được sửa DataFrame bên trong;
+    mọi thay đổi phải tạo snapshot mới và hoán đổi qua KnowledgeStore.
+    """
+
+    def __init__(self, dataframe, version, index=None, vectors=None, bm25=None, unit_labels=None):
+        self.dataframe = dataframe
+        self.version = version
+        self.loaded_at = datetime.datetime.now()
+        self.index = index if index is not None else search_index.build_index(dataframe)
+        # Chỉ mục vector n-gram (None nếu tắt tìm kiếm vector)
+        self.vectors = vectors if vectors is not None else vector_index.build_vector_index(dataframe)
+        # Ma trận BM25 theo cột dùng để xếp hạng các hàng đưa vào prompt (None nếu tắt)
+        self.bm25 = bm25 if bm25 is not None else bm25_index.build_bm25_index(dataframe)
+        # (danh mục, tên đơn vị -> tập nhãn hàng), dựng cùng snapshot và cập nhật dạng delta
+        if unit_labels is None:
+            current = gazetteer.get_gazetteer()
+            unit_labels = (current, build_unit_labels(dataframe, current))
+        self._unit_labels = unit_labels
+        self._unit_lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        return self.dataframe is not None
+
+    def find_label(self, item_id):
+        """Trả về nhãn hàng có ID (cột đầu tiên) bằng item_id, hoặc None."""
+        if self.dataframe is None or self.dataframe.empty:
+            return None
+        id_column = self.dataframe.columns[0]
+        matches = self.dataframe.index[self.dataframe[id_column].astype(str) == str(item_id)]
+        return matches[0] if len(matches) else None
+
+    def worksheet_of(self, item_id):
+        """Tên worksheet chứa hàng có ID item_id (theo cách chia của ShardedIndex), hoặc None nếu không rõ."""
+        owners = getattr(self.index, 'owners', None)
+        label = self.find_label(item_id) if owners else None
+        return owners.get(label) if label is not None else None
+
+    def unit_labels(self, gazetteer):
+        """
+        Ánh xạ tên đơn vị -> tập nhãn hàng của snapshot (xem build_unit_labels).
+        Bình thường đã được dựng sẵn; chỉ khi danh mục vừa được nạp lại mà KnowledgeStore
+        chưa kịp cập nhật (refresh_unit_labels) thì mới phải dựng tại chỗ.
+        """
+        cached = self._unit_labels
+        if cached[0] is gazetteer:
+            return cached[1]
+        with self._unit_lock:
+            if self._unit_labels[0] is not gazetteer:
+                self._unit_labels = (gazetteer, build_unit_labels(self.dataframe, gazetteer))
+            return self._unit_labels[1]
+
+    def set_unit_labels(self, gazetteer, mapping):
+        """Gắn ánh xạ đơn vị đã dựng sẵn (ở luồng nền) cho danh mục mới."""
+        with self._unit_lock:
+            self._unit_labels = (gazetteer, mapping)
+
+    def derive_unit_labels(self, removed=(), added=()):
+        """
+        Ánh xạ đơn vị cho snapshot kế tiếp: bỏ các hàng `removed` và thêm các hàng `added`
+        (danh sách (nhãn, dict cột -> giá trị)). Chỉ nhận diện đơn vị trên các hàng thay đổi,
+        các tập nhãn không bị ảnh hưởng được dùng chung với snapshot hiện tại.
+        """
+        current, mapping = self._unit_labels
+        mapping = dict(mapping)
+        changed = set()
+        for label, record in removed:
+            for name in current.extract(_unit_text(record), overlapping=True):
+                if name not in changed:
+                    mapping[name] = set(mapping.get(name, ()))
+                    changed.add(name)
+                mapping[name].discard(label)
+                if not mapping[name]:
+                    del mapping[name]
+                    changed.discard(name)
+        for label, record in added:
+            for name in current.extract(_unit_text(record), overlapping=True):
+                if name not in changed:
+                    mapping[name] = set(mapping.get(name, ()))
+                    changed.add(name)
+                mapping[name].add(label)
+        return current, mapping
+
+
+class KnowledgeStore:
+    """
+    Giữ snapshot hiện tại; hoán đổi snapshot mới một cách nguyên tử.
+    Thay đổi nhỏ (thêm/sửa/xóa một hàng) được áp dụng dạng delta lên snapshot hiện tại
+    thay vì tải lại toàn bộ sheet.
+    """
+
+    def __init__(self, dataframe=None, index=None, vectors=None, bm25=None):
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+        self._snapshot = KnowledgeSnapshot(dataframe, next(self._versions), index, vectors, bm25)
+
+    def get(self):
+        """Trả về snapshot hiện tại (đọc một tham chiếu nên không cần khóa)."""
+        return self._snapshot
+
+    def load(self, dataframe, base_version=None):
+        """
+        Tạo snapshot mới từ DataFrame (đồng bộ toàn bộ) và hoán đổi vào thay cho snapshot cũ.
+        Nếu có `base_version` (phiên bản snapshot lúc bắt đầu tải dữ liệu) mà snapshot hiện tại đã khác,
+        tức có delta được áp dụng trong lúc tải và dữ liệu vừa tải có thể chưa chứa nó, thì không hoán đổi
+        và trả về None.
+        """
+        # Xây chỉ mục bên ngoài khóa để không chặn các luồng khác quá lâu
+        index = search_index.build_index(dataframe)
+        vectors = vector_index.build_vector_index(dataframe)
+        bm25 = bm25_index.build_bm25_index(dataframe)
+        current = gazetteer.get_gazetteer()
+        unit_labels = (current, build_unit_labels(dataframe, current))
+        with self._lock:
+            if base_version is not None and self._snapshot.version != base_version:
+                return None
+            self._snapshot = KnowledgeSnapshot(dataframe, next(self._versions), index, vectors, bm25, unit_labels)
+            return self._snapshot
+
+    def refresh_unit_labels(self):
+        """
+        Dựng lại ánh xạ đơn vị của snapshot hiện tại theo danh mục đơn vị mới nhất (gọi sau khi
+        nạp lại danh mục, ở luồng nền), để request không phải tự dựng trên đường trả lời.
+        """
+        current = gazetteer.get_gazetteer()
+        while True:
+            snapshot = self._snapshot
+            if not snapshot.is_loaded:
+                return
+            mapping = build_unit_labels(snapshot.dataframe, current)
+            with self._lock:
+                snapshot.set_unit_labels(current, mapping)
+                # Có delta xen vào trong lúc dựng thì snapshot mới được suy ra từ ánh xạ cũ: dựng lại
+                if self._snapshot is snapshot:
+                    print(f"Đã dựng ánh xạ đơn vị cho snapshot phiên bản {snapshot.version}: {len(mapping)} đơn vị.")
+                    return
+
+    def _swap(self, dataframe, index, vectors, bm25, unit_labels):
+        self._snapshot = KnowledgeSnapshot(dataframe, next(self._versions), index, vectors, bm25, unit_labels)
+        return self._snapshot
+
+    # --- CẬP NHẬT DẠNG DELTA ---
+    # Trả về False nếu không áp dụng được (dữ liệu trong bộ nhớ đã lệch so với sheet),
+    # khi đó nơi gọi nên đồng bộ lại toàn bộ.
+
+    def apply_add(self, values):
+        """Thêm một hàng; `values` theo đúng thứ tự cột trong sheet."""
+        with self._lock:
+            snapshot = self._snapshot
+            dataframe = snapshot.dataframe
+            if dataframe is None or len(values) > len(dataframe.columns):
+                return False
+
+            values = list(values) + [''] * (len(dataframe.columns) - len(values))
+            label = int(dataframe.index.max()) + 1 if len(dataframe) else 0
+            new_row = pd.DataFrame([values], columns=dataframe.columns, index=[label])
+            new_df = pd.concat([dataframe, new_row]) if len(dataframe) else new_row
+            vectors = snapshot.vectors
+            if vectors is not None:
+                vectors = vectors.with_row(label, dict(zip(dataframe.columns, values)))
+            bm25 = snapshot.bm25
+            if bm25 is not None:
+                bm25 = bm25.with_row(label, dict(zip(dataframe.columns, values)))
+            unit_labels = snapshot.derive_unit_labels(added=[(label, dict(zip(dataframe.columns, values)))])
+            self._swap(new_df, snapshot.index.with_row(label, values), vectors, bm25, unit_labels)
+            return True
+
+    def apply_update(self, item_id, new_data):
+        """Cập nhật các cột có trong `new_data` của hàng có ID tương ứng."""
+        with self._lock:
+            snapshot = self._snapshot
+            label = snapshot.find_label(item_id)
+            if label is None:
+                return False
+
+            dataframe = snapshot.dataframe
+            old_row = tuple(dataframe.loc[label])
+            new_df = dataframe.copy()
+            for key, value in new_data.items():
+                if key in new_df.columns:
+                    new_df[key] = new_df[key].astype(object)
+                    new_df.at[label, key] = value
+            new_row = tuple(new_df.loc[label])
+            vectors = snapshot.vectors
+            if vectors is not None:
+                vectors = vectors.with_updated_row(label, new_df.loc[label].to_dict())
+            bm25 = snapshot.bm25
+            if bm25 is not None:
+                bm25 = bm25.with_updated_row(label, new_df.loc[label].to_dict())
+            unit_labels = snapshot.derive_unit_labels(removed=[(label, dataframe.loc[label].to_dict())],
+                                                      added=[(label, new_df.loc[label].to_dict())])
+            self._swap(new_df, snapshot.index.with_updated_row(label, old_row, new_row), vectors, bm25, unit_labels)
+            return True
+
+    def apply_delete(self, item_id):
+        """Xóa hàng có ID tương ứng."""
+        with self._lock:
+            snapshot = self._snapshot
+            label = snapshot.find_label(item_id)
+            if label is None:
+                return False
+
+            dataframe = snapshot.dataframe
+            old_row = tuple(dataframe.loc[label])
+            vectors = snapshot.vectors
+            if vectors is not None:
+                vectors = vectors.without_row(label)
+            bm25 = snapshot.bm25
+            if bm25 is not None:
+                bm25 = bm25.without_row(label)
+            unit_labels = snapshot.derive_unit_labels(removed=[(label, dataframe.loc[label].to_dict())])
+            self._swap(dataframe.drop(index=label), snapshot.index.without_row(label, old_row), vectors, bm25,
+                       unit_labels)
+            return True
+
+    def apply_batch(self, new_rows=(), updates=()):
+        """
+        Áp dụng nhiều thay đổi một lần (dùng cho nhập hàng loạt): thêm `new_rows`
+        (theo thứ tự cột trong sheet) và cập nhật `updates` (danh sách (item_id, new_data)).
+        Giống các delta khác, chỉ mục được cập nhật tăng dần (with_changes) thay vì dựng lại toàn bộ,
+        và chỉ tạo một snapshot mới ở cuối.
+        """
+        if not new_rows and not updates:
+            return True
+        with self._lock:
+            snapshot = self._snapshot
+            batch = _batch_dataframe(snapshot.dataframe, new_rows, updates)
+            if batch is None:
+                return False
+
+            new_df, updated_labels, added_labels = batch
+            dataframe, columns = snapshot.dataframe, list(new_df.columns)
+            old_rows = list(dataframe.loc[updated_labels].itertuples(index=False, name=None))
+            changed_rows = list(new_df.loc[updated_labels + added_labels].itertuples(index=False, name=None))
+            removed = list(zip(updated_labels, old_rows))
+            added = list(zip(updated_labels + added_labels, changed_rows))
+            removed_records = [(label, dict(zip(columns, row))) for label, row in removed]
+            added_records = [(label, dict(zip(columns, row))) for label, row in added]
+
+            vectors = snapshot.vectors
+            if vectors is not None:
+                vectors = vectors.with_changes(updated_labels, added_records)
+            bm25 = snapshot.bm25
+            if bm25 is not None:
+                bm25 = bm25.with_changes(updated_labels, added_records)
+            unit_labels = snapshot.derive_unit_labels(removed=removed_records, added=added_records)
+            self._swap(new_df, snapshot.index.with_changes(removed, added), vectors, bm25, unit_labels)
+            return True
@@ -0,0 +1,262 @@
+# /chatbotAI/app/services/search_index.py
+import heapq
+from collections import defaultdict
+
+from app.services import spell_correction
+from app.services.vietnamese_text import query_terms, tokenize
+
+
+def row_to_text(row):
+    """Ghép toàn bộ giá trị của một hàng thành một chuỗi để đánh chỉ mục."""
+    return ' '.join(str(value) for value in row)
+
+
+class InvertedIndex:
+    """
+    Chỉ mục ngược: ánh xạ từ -> danh sách nhãn hàng (posting list).
+    Được xây dựng một lần khi tải dữ liệu, để mỗi câu hỏi chỉ cần duyệt
+    các hàng có chung ít nhất một từ với câu hỏi thay vì quét toàn bộ bảng.
+
+    Posting list lưu nhãn index của DataFrame (số nguyên tăng dần theo thứ tự trong sheet)
+    thay vì vị trí, nên khi xóa một hàng không phải dịch lại các hàng phía sau.
+    Chỉ mục coi như bất biến: các hàm with_* trả về chỉ mục mới, dùng chung
+    các posting list không bị ảnh hưởng.
+    """
+
+    def __init__(self, dataframe=None):
+        self.postings = {}
+        self.num_rows = 0
+        # Bộ sửa lỗi gõ cho câu hỏi (dựng trong build_index, dùng chung cho các chỉ mục dẫn xuất)
+        self.corrector = None
+        if dataframe is None:
+            return
+
+        postings = defaultdict(list)
+        self.num_rows = len(dataframe)
+        for label, row in zip(dataframe.index, dataframe.itertuples(index=False, name=None)):
+            for term in set(tokenize(row_to_text(row))):
+                postings[term].append(label)
+        # Chuyển về dict thường để tra cứu từ không tồn tại không tạo key mới
+        self.postings = dict(postings)
+
+    def correct(self, syllable):
+        """Âm tiết không có trong chỉ mục thì thay bằng âm tiết gần nhất trong từ điển (nếu có)."""
+        if syllable in self.postings:
+            return syllable
+        return self.corrector.lookup(syllable) or syllable
+
+    def query_terms(self, question):
+        return query_terms(question, self.correct if self.corrector else None)
+
+    def search(self, question, max_rows=5, allowed=None):
+        """
+        Trả về danh sách (nhãn hàng, điểm) của các hàng liên quan nhất,
+        điểm là số term (âm tiết và cặp âm tiết) chung giữa câu hỏi và hàng. Chỉ trả về hàng có điểm > 0.
+        `allowed` (tập nhãn) giới hạn các hàng được chấm điểm.
+        """
+        return self.search_terms(self.query_terms(question), max_rows, allowed)
+
+    def search_terms(self, terms, max_rows=5, allowed=None):
+        """Như search() nhưng nhận tập term đã tách sẵn."""
+        scores = defaultdict(int)
+        for term in terms:
+            for label in self.postings.get(term, ()):
+                if allowed is None or label in allowed:
+                    scores[label] += 1
+
+        # Điểm cao trước, cùng điểm thì ưu tiên hàng đứng trước trong sheet
+        return heapq.nlargest(max_rows, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def _derive(self, num_rows):
+        derived = InvertedIndex()
+        derived.postings = dict(self.postings)
+        derived.num_rows = num_rows
+        derived.corrector = self.corrector
+        return derived
+
+    def with_row(self, label, row):
+        """Trả về chỉ mục mới có thêm một hàng (nhãn phải lớn hơn mọi nhãn hiện có)."""
+        derived = self._derive(self.num_rows + 1)
+        for term in set(tokenize(row_to_text(row))):
+            derived.postings[term] = derived.postings.get(term, []) + [label]
+        return derived
+
+    def without_row(self, label, row):
+        """Trả về chỉ mục mới đã bỏ một hàng (`row` là giá trị cũ của hàng đó)."""
+        derived = self._derive(self.num_rows - 1)
+        for term in set(tokenize(row_to_text(row))):
+            remaining = [item for item in derived.postings.get(term, ()) if item != label]
+            if remaining:
+                derived.postings[term] = remaining
+            else:
+                derived.postings.pop(term, None)
+        return derived
+
+    def with_updated_row(self, label, old_row, new_row):
+        """Trả về chỉ mục mới sau khi một hàng đổi giá trị."""
+        old_terms = set(tokenize(row_to_text(old_row)))
+        new_terms = set(tokenize(row_to_text(new_row)))
+        derived = self._derive(self.num_rows)
+        for term in old_terms - new_terms:
+            remaining = [item for item in derived.postings.get(term, ()) if item != label]
+            if remaining:
+                derived.postings[term] = remaining
+            else:
+                derived.postings.pop(term, None)
+        for term in new_terms - old_terms:
+            # Giữ posting list theo thứ tự nhãn tăng dần
+            derived.postings[term] = sorted(derived.postings.get(term, []) + [label])
+        return derived
+
+    def with_changes(self, removed=(), added=()):
+        """
+        Áp dụng nhiều thay đổi cùng lúc (nhập hàng loạt), chỉ sao chép chỉ mục một lần.
+        `removed`/`added` là danh sách (nhãn, giá trị hàng); hàng bị sửa có mặt ở cả hai danh sách
+        (giá trị cũ và giá trị mới).
+        """
+        removals, additions = defaultdict(set), defaultdict(list)
+        for label, row in removed:
+            for term in set(tokenize(row_to_text(row))):
+                removals[term].add(label)
+        for label, row in added:
+            for term in set(tokenize(row_to_text(row))):
+                additions[term].append(label)
+
+        derived = self._derive(self.num_rows - len(removed) + len(added))
+        for term in removals.keys() | additions.keys():
+            dropped = removals.get(term, ())
+            postings = [item for item in derived.postings.get(term, ()) if item not in dropped]
+            if term in additions:
+                # Giữ posting list theo thứ tự nhãn tăng dần
+                postings = sorted(postings + additions[term])
+            if postings:
+                derived.postings[term] = postings
+            else:
+                derived.postings.pop(term, None)
+        return derived
+
+
+class ShardedIndex:
+    """
+    Gồm một chỉ mục ngược riêng cho mỗi worksheet kiến thức, tìm kiếm hợp nhất trên tất cả.
+    `shards` là dict tên worksheet -> InvertedIndex (worksheet đầu tiên là worksheet chính,
+    nơi các hàng mới được thêm vào); `owners` ánh xạ nhãn hàng -> tên worksheet.
+    Cùng giao diện với InvertedIndex nên KnowledgeSnapshot dùng được cả hai.
+    """
+
+    def __init__(self, shards, owners, corrector=None):
+        self.shards = shards
+        self.owners = owners
+        self.corrector = corrector
+
+    @property
+    def num_rows(self):
+        return sum(shard.num_rows for shard in self.shards.values())
+
+    def _owner(self, label):
+        return self.owners.get(label, next(iter(self.shards)))
+
+    def correct(self, syllable):
+        if any(syllable in shard.postings for shard in self.shards.values()):
+            return syllable
+        return self.corrector.lookup(syllable) or syllable
+
+    def query_terms(self, question):
+        return query_terms(question, self.correct if self.corrector else None)
+
+    def search(self, question, max_rows=5, allowed=None):
+        """Tìm trên từng worksheet rồi gộp kết quả, cùng cách xếp hạng với InvertedIndex."""
+        terms = self.query_terms(question)
+        results = [item for shard in self.shards.values() for item in shard.search_terms(terms, max_rows, allowed)]
+        return heapq.nlargest(max_rows, results, key=lambda item: (item[1], -item[0]))
+
+    def _with_shard(self, name, shard, owners=None):
+        shards = dict(self.shards)
+        shards[name] = shard
+        return ShardedIndex(shards, self.owners if owners is None else owners, self.corrector)
+
+    def with_row(self, label, row):
+        """Hàng mới luôn thuộc worksheet chính."""
+        name = next(iter(self.shards))
+        owners = self.owners
+        if label in owners:
+            owners = dict(owners)
+            owners[label] = name
+        return self._with_shard(name, self.shards[name].with_row(label, row), owners)
+
+    def without_row(self, label, row):
+        name = self._owner(label)
+        owners = dict(self.owners)
+        owners.pop(label, None)
+        return self._with_shard(name, self.shards[name].without_row(label, row), owners)
+
+    def with_updated_row(self, label, old_row, new_row):
+        name = self._owner(label)
+        return self._with_shard(name, self.shards[name].with_updated_row(label, old_row, new_row))
+
+
+    def with_changes(self, removed=(), added=()):
+        """Như InvertedIndex.with_changes; hàng sửa giữ worksheet cũ, hàng mới thuộc worksheet chính."""
+        main = next(iter(self.shards))
+        removed_labels = {label for label, _ in removed}
+        owners = dict(self.owners)
+        changes = defaultdict(lambda: ([], []))
+        for label, row in removed:
+            changes[self._owner(label)][0].append((label, row))
+            owners.pop(label, None)
+        for label, row in added:
+            name = self._owner(label) if label in removed_labels else main
+            changes[name][1].append((label, row))
+            owners[label] = name
+
+        shards = dict(self.shards)
+        for name, (shard_removed, shard_added) in changes.items():
+            shards[name] = shards[name].with_changes(shard_removed, shard_added)
+        return ShardedIndex(shards, owners, self.corrector)
+
+
+def fuse_rankings(rankings, max_rows=5, k=60):
+    """
+    Gộp nhiều danh sách (nhãn hàng, điểm) đã xếp hạng bằng Reciprocal Rank Fusion:
+    mỗi hàng được cộng 1 / (k + thứ hạng) trong từng danh sách, nên không cần chuẩn hóa
+    các thang điểm khác nhau (số từ chung, cosine...).
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, (label, _) in enumerate(ranking, start=1):
+            fused[label] += 1.0 / (k + rank)
+    return heapq.nlargest(max_rows, fused.items(), key=lambda item: (item[1], -item[0]))
+
+
+def build_index(dataframe, previous=None):
+    """
+    Xây dựng chỉ mục cho DataFrame kiến thức (trả về None nếu không có dữ liệu).
+    Nếu dữ liệu gộp từ nhiều worksheet (DataFrame.attrs['worksheets'] là danh sách (tên, số hàng)
+    theo thứ tự), mỗi worksheet có một chỉ mục riêng. Khi dựng lại từ DataFrame đã sửa
+    (không còn attrs), truyền chỉ mục cũ qua `previous` để giữ nguyên cách chia worksheet.
+    """
+    if dataframe is None:
+        return None
+
+    if isinstance(previous, ShardedIndex):
+        names = list(previous.shards)
+        owners = previous.owners
+    else:
+        layout = dataframe.attrs.get('worksheets') or []
+        names = [name for name, _ in layout]
+        owners = dict(zip(dataframe.index, [name for name, count in layout for _ in range(count)]))
+    if len(names) < 2:
+        index = InvertedIndex(dataframe)
+        print(f"Đã xây dựng chỉ mục tìm kiếm: {index.num_rows} hàng, {len(index.postings)} từ.")
+        index.corrector = spell_correction.build_corrector([index.postings])
+        return index
+
+    # Hàng không rõ worksheet (mới thêm) thuộc worksheet chính
+    row_owners = [owners.get(label, names[0]) for label in dataframe.index]
+    shards = {}
+    for name in names:
+        shards[name] = InvertedIndex(dataframe[[owner == name for owner in row_owners]])
+        print(f"Đã xây dựng chỉ mục tìm kiếm cho worksheet '{name}': "
+              f"{shards[name].num_rows} hàng, {len(shards[name].postings)} từ.")
+    corrector = spell_correction.build_corrector([shard.postings for shard in shards.values()])
+    return ShardedIndex(shards, dict(zip(dataframe.index, row_owners)), corrector)
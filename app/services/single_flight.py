@@ -0,0 +1,97 @@
+# /chatbotAI/app/services/single_flight.py
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi trùng nhau đang chạy cùng lúc: với mỗi khóa chỉ lời gọi đầu tiên thực sự chạy,
+    các lời gọi đến trong lúc đó chờ và nhận chung kết quả (hoặc chung lỗi).
+    Khóa được bỏ ngay khi lời gọi đầu tiên xong, nên lần hỏi sau sẽ chạy lại (hoặc lấy từ bộ nhớ đệm).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, function):
+        """Chạy `function()` cho `key`, hoặc chờ lời gọi đang chạy với cùng khóa. Trả về kết quả."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                print(f"Đã gộp {call.waiters} câu hỏi trùng vào một lần gọi AI.")
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._calls), 'leaders': self.leaders, 'coalesced': self.coalesced}
+
+
+# Dùng chung cho toàn bộ tiến trình: gộp các câu hỏi giống nhau gửi tới DeepSeek cùng lúc
+answer_flight = SingleFlight()
+
+
+class AsyncSingleFlight:
+    """
+    Bản asyncio của SingleFlight cho chế độ ASGI: lời gọi đầu tiên chạy thành một task riêng,
+    các lời gọi trùng khóa chỉ chờ task đó. Nhờ vậy một client ngắt kết nối (bị hủy) không làm hủy
+    lời gọi mà các client khác đang chờ. Chỉ dùng trong một event loop nên không cần khóa.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, function):
+        """Chạy coroutine `function()` cho `key`, hoặc chờ task đang chạy với cùng khóa."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(function())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {'in_flight': len(self._calls), 'leaders': self.leaders, 'coalesced': self.coalesced}
+
+
+# Dùng trong event loop của server ASGI (xem app/asgi.py)
+async_answer_flight = AsyncSingleFlight()
@@ -0,0 +1,89 @@
+# /chatbotAI/app/services/snapshot_cache.py
+import datetime
+import os
+import pickle
+import tempfile
+
+from config import Config
+
+# Tăng số này mỗi khi cấu trúc snapshot/chỉ mục thay đổi để bỏ qua file cache cũ
+FORMAT_VERSION = 6
+
+# Các cấu hình quyết định nội dung chỉ mục: đổi bất kỳ giá trị nào thì file cache cũ không còn dùng được
+INDEX_CONFIG_KEYS = (
+    'GOOGLE_SHEET_NAME',
+    'KNOWLEDGE_WORKSHEET_NAMES',
+    'SEARCH_FOLD_DIACRITICS',
+    'SPELL_MAX_EDIT_DISTANCE',
+    'SPELL_MAX_VOCABULARY',
+    'VECTOR_SEARCH_MODE',
+    'VECTOR_DIMENSIONS',
+    'BM25_FIELD_WEIGHTS',
+    'BM25_K1',
+    'BM25_B',
+)
+
+
+def config_fingerprint():
+    """Giá trị hiện tại của các cấu hình trong INDEX_CONFIG_KEYS, lưu kèm snapshot để so khi đọc lại."""
+    return {key: getattr(Config, key, None) for key in INDEX_CONFIG_KEYS}
+
+
+def save_snapshot(path, snapshot, change_token=None):
+    """
+    Lưu snapshot (dữ liệu + chỉ mục đã dựng sẵn) ra file nhị phân cục bộ.
+    Ghi ra file tạm rồi đổi tên để không bao giờ để lại file hỏng nếu tiến trình bị dừng giữa chừng.
+    """
+    if not path or not snapshot.is_loaded:
+        return False
+    payload = {
+        'format_version': FORMAT_VERSION,
+        'config': config_fingerprint(),
+        'saved_at': datetime.datetime.now(),
+        'change_token': change_token,
+        'dataframe': snapshot.dataframe,
+        'index': snapshot.index,
+        'vectors': snapshot.vectors,
+        'bm25': snapshot.bm25,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        print(f"Đã lưu snapshot kiến thức ra '{path}'.")
+        return True
+    except Exception as e:
+        print(f"Lỗi khi lưu snapshot kiến thức: {e}")
+        try:
+            os.remove(tmp_path)
+        except (OSError, UnboundLocalError):
+            pass
+        return False
+
+
+def load_snapshot(path):
+    """
+    Đọc snapshot đã lưu. Trả về dict gồm dataframe, index, vectors, bm25, change_token, saved_at
+    hoặc None nếu không có file, file hỏng, khác phiên bản định dạng hoặc được dựng với cấu hình chỉ mục khác.
+    File này do chính ứng dụng ghi ra nên được coi là tin cậy.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        print(f"Lỗi khi đọc snapshot kiến thức '{path}': {e}")
+        return None
+    if not isinstance(payload, dict) or payload.get('format_version') != FORMAT_VERSION:
+        print(f"Bỏ qua snapshot '{path}' do khác phiên bản định dạng.")
+        return None
+    saved_config = payload.get('config') or {}
+    changed = [key for key, value in config_fingerprint().items() if saved_config.get(key) != value]
+    if changed:
+        print(f"Bỏ qua snapshot '{path}' do cấu hình chỉ mục đã thay đổi: {', '.join(changed)}.")
+        return None
+    print(f"Đã đọc snapshot kiến thức từ '{path}' (lưu lúc {payload['saved_at']:%Y-%m-%d %H:%M:%S}).")
+    return payload
@@ -0,0 +1,118 @@
+# /chatbotAI/app/services/spell_correction.py
+from config import Config
+from app.services.vietnamese_text import FOLDED_STOPWORDS, fold_diacritics
+
+# Chỉ sinh các bản xóa trên tiền tố này của mỗi từ: bộ nhớ không tăng theo độ dài từ,
+# mà âm tiết tiếng Việt hầu như không dài hơn 7 ký tự
+PREFIX_LENGTH = 7
+# Số kết quả sửa gần nhất được ghi nhớ cho mỗi bộ sửa lỗi
+LOOKUP_CACHE_SIZE = 10000
+# Âm tiết ngắn hơn độ dài này không được sửa: sai một ký tự đã thành một âm tiết khác hẳn ("hoi" / "hon")
+MIN_CORRECTABLE_LENGTH = 4
+
+
+def _deletes(word, max_distance):
+    """Tất cả chuỗi nhận được khi xóa tối đa `max_distance` ký tự của `word`."""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {item[:i] + item[i + 1:] for item in frontier if len(item) > 1 for i in range(len(item))}
+        results |= frontier
+    return results
+
+
+def edit_distance(first, second, max_distance):
+    """
+    Khoảng cách Damerau-Levenshtein (có hoán vị hai ký tự liền nhau) giữa hai chuỗi ngắn.
+    Trả về max_distance + 1 nếu chắc chắn vượt ngưỡng.
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        current = [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = 0 if first[i - 1] == second[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SpellCorrector:
+    """
+    Sửa lỗi gõ theo kiểu SymSpell (symmetric delete): khi dựng, mỗi từ trong từ điển sinh ra
+    các bản xóa tối đa `max_distance` ký tự (trên tiền tố PREFIX_LENGTH ký tự) và được ghi vào
+    bảng bản xóa -> từ. Khi tra, chỉ cần sinh bản xóa của từ cần sửa rồi tra bảng, nên thời gian
+    gần như không đổi theo kích thước từ điển. Từ điển giới hạn `max_words` từ phổ biến nhất.
+    """
+
+    def __init__(self, frequencies, max_distance=2, max_words=50000):
+        self.max_distance = max_distance
+        ranked = sorted(frequencies.items(), key=lambda item: (-item[1], item[0]))[:max_words]
+        self.frequencies = dict(ranked)
+        self._deletes = {}
+        for word in self.frequencies:
+            for deleted in _deletes(word[:PREFIX_LENGTH], max_distance):
+                self._deletes.setdefault(deleted, []).append(word)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def lookup(self, word):
+        """
+        Trả về từ trong từ điển gần `word` nhất (ưu tiên từ phổ biến hơn), hoặc None.
+        Hư từ (kể cả gõ không dấu) và âm tiết quá ngắn không bao giờ được sửa: hư từ không có
+        trong chỉ mục nên luôn trông như lỗi gõ, và sẽ bị "sửa" thành từ có nghĩa ("khong" -> "phong").
+        """
+        if word in self.frequencies:
+            return word
+        if word in self._cache:
+            return self._cache[word]
+        if len(word) < MIN_CORRECTABLE_LENGTH or fold_diacritics(word) in FOLDED_STOPWORDS:
+            return None
+
+        # Từ càng ngắn càng cho phép ít lỗi, tránh "sửa" một âm tiết ngắn thành từ bất kỳ
+        max_distance = min(self.max_distance, (len(word) - 1) // 2)
+        best, best_key = None, None
+        seen = set()
+        for deleted in _deletes(word[:PREFIX_LENGTH], max_distance):
+            for candidate in self._deletes.get(deleted, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self.frequencies[candidate], candidate)
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+
+        if len(self._cache) >= LOOKUP_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[word] = best
+        return best
+
+
+def build_corrector(postings_list):
+    """
+    Dựng bộ sửa lỗi từ các posting list của chỉ mục (âm tiết -> nhãn hàng); tần suất là số hàng chứa âm tiết.
+    Trả về None nếu tắt (SPELL_MAX_EDIT_DISTANCE = 0).
+    """
+    if Config.SPELL_MAX_EDIT_DISTANCE <= 0:
+        return None
+    frequencies = {}
+    for postings in postings_list:
+        for term, labels in postings.items():
+            # Chỉ âm tiết chữ; bỏ bigram, số và mã (id, ngày tháng...)
+            if '_' not in term and term.isalpha() and len(term) > 1:
+                frequencies[term] = frequencies.get(term, 0) + len(labels)
+    corrector = SpellCorrector(frequencies, Config.SPELL_MAX_EDIT_DISTANCE, Config.SPELL_MAX_VOCABULARY)
+    print(f"Đã xây dựng bộ sửa lỗi chính tả: {len(corrector)} từ, {len(corrector._deletes)} bản xóa.")
+    return corrector
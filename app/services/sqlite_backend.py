@@ -0,0 +1,342 @@
+# /chatbotAI/app/services/sqlite_backend.py
+import json
+import sqlite3
+import threading
+import uuid
+
+import pandas as pd
+
+from app.services import google_sheets_service as gs
+
+# Thứ tự cột kiến thức, trùng với build_knowledge_row / sheet kiến thức
+KNOWLEDGE_COLUMNS = [
+    'id', 'sender', 'question', 'time_question', 'answer', 'answering_unit',
+    'time_answer', 'document', 'question_no', 'Date_of_issue', 'Text_link',
+]
+HISTORY_COLUMNS = ['id', 'timestamp', 'question', 'answer']
+# Cột lưu (dạng JSON) các cột của sheet không nằm trong KNOWLEDGE_COLUMNS
+EXTRA_COLUMN = 'extra'
+# Danh sách cột khi đọc kiến thức (bảng knowledge có bí danh k)
+_KNOWLEDGE_SELECT = ', '.join(f'k."{column}"' for column in KNOWLEDGE_COLUMNS + [EXTRA_COLUMN])
+
+# Trọng số BM25 của từng cột trong bảng FTS kiến thức (question, answer, document)
+KNOWLEDGE_FTS_WEIGHTS = (2.0, 1.0, 0.5)
+
+# Cột không khai báo kiểu để giữ nguyên kiểu dữ liệu đọc từ sheet (số vẫn là số)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS knowledge (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    {', '.join(f'"{column}"' for column in KNOWLEDGE_COLUMNS)},
+    "{EXTRA_COLUMN}" TEXT
+);
+CREATE INDEX IF NOT EXISTS knowledge_id ON knowledge(id);
+CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_fts USING fts5(
+    question, answer, document,
+    content='knowledge', content_rowid='seq', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS knowledge_ai AFTER INSERT ON knowledge BEGIN
+    INSERT INTO knowledge_fts(rowid, question, answer, document)
+    VALUES (new.seq, new.question, new.answer, new.document);
+END;
+CREATE TRIGGER IF NOT EXISTS knowledge_ad AFTER DELETE ON knowledge BEGIN
+    INSERT INTO knowledge_fts(knowledge_fts, rowid, question, answer, document)
+    VALUES ('delete', old.seq, old.question, old.answer, old.document);
+END;
+CREATE TRIGGER IF NOT EXISTS knowledge_au AFTER UPDATE ON knowledge BEGIN
+    INSERT INTO knowledge_fts(knowledge_fts, rowid, question, answer, document)
+    VALUES ('delete', old.seq, old.question, old.answer, old.document);
+    INSERT INTO knowledge_fts(rowid, question, answer, document)
+    VALUES (new.seq, new.question, new.answer, new.document);
+END;
+
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE, timestamp TEXT, question TEXT, answer TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    question, answer, content='history', content_rowid='seq', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts(rowid, question, answer) VALUES (new.seq, new.question, new.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts(history_fts, rowid, question, answer)
+    VALUES ('delete', old.seq, old.question, old.answer);
+END;
+
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+INSERT OR IGNORE INTO meta(key, value) VALUES ('knowledge_version', 0);
+"""
+
+
+def _fts_query(text):
+    """Đưa câu hỏi tự do thành truy vấn FTS5 an toàn: mỗi từ là một cụm trong ngoặc kép, nối bằng OR."""
+    terms = [term.replace('"', '""') for term in str(text).split()]
+    return ' OR '.join(f'"{term}"' for term in terms if term)
+
+
+class SQLiteBackend:
+    """
+    Lưu kiến thức và lịch sử chat trong một file SQLite cục bộ, kèm bảng FTS5 để tìm kiếm toàn văn.
+    Dùng một kết nối chung (chế độ WAL) được bảo vệ bằng khóa; mọi thao tác đều ở tốc độ đĩa cục bộ.
+    Cùng giao diện với SheetsBackend trong storage.py.
+    """
+
+    name = 'sqlite'
+    supports_search = True
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # File tạo từ phiên bản trước chưa có cột extra
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(knowledge)")}
+        if EXTRA_COLUMN not in existing:
+            self._conn.execute(f'ALTER TABLE knowledge ADD COLUMN "{EXTRA_COLUMN}" TEXT')
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _bump_knowledge_version(self):
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'knowledge_version'")
+
+    def is_empty(self):
+        with self._lock:
+            knowledge = self._conn.execute("SELECT 1 FROM knowledge LIMIT 1").fetchone()
+            history = self._conn.execute("SELECT 1 FROM history LIMIT 1").fetchone()
+        return knowledge is None and history is None
+
+    def import_data(self, dataframe, history_records):
+        """
+        Nạp dữ liệu ban đầu (thường là từ Google Sheet) vào các bảng; dữ liệu cũ bị thay thế.
+        Giống sheet, cột đầu tiên luôn là ID dù tiêu đề của nó là gì. Tiêu đề thật của sheet được lưu lại
+        để load_knowledge trả về đúng các cột đó; cột không có trong KNOWLEDGE_COLUMNS được giữ trong cột extra.
+        """
+        knowledge_rows, headers = [], None
+        if dataframe is not None:
+            headers = [str(header) for header in dataframe.columns]
+            for values in dataframe.itertuples(index=False, name=None):
+                knowledge_rows.append(self._row_from_record(headers, dict(zip(headers, values))))
+        history_rows = [list(record.values())[:len(HISTORY_COLUMNS)] for record in history_records or []]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM knowledge")
+            self._conn.execute("DELETE FROM history")
+            self._insert_knowledge(knowledge_rows)
+            self._insert_history(history_rows)
+            if headers:
+                self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('knowledge_headers', ?)",
+                                   (json.dumps(headers, ensure_ascii=False),))
+            self._bump_knowledge_version()
+        print(f"Đã nạp {len(knowledge_rows)} kiến thức và {len(history_rows)} lịch sử chat vào SQLite.")
+
+    # --- KIẾN THỨC ---
+
+    def _headers(self):
+        """Tiêu đề cột kiến thức của sheet đã nạp (mặc định KNOWLEDGE_COLUMNS)."""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'knowledge_headers'").fetchone()
+        return json.loads(row[0]) if row else list(KNOWLEDGE_COLUMNS)
+
+    @staticmethod
+    def _row_from_record(headers, record):
+        """Hàng theo KNOWLEDGE_COLUMNS + extra từ một bản ghi theo tiêu đề sheet (ID lấy từ cột đầu tiên)."""
+        row = [record.get(headers[0], '')] + [record.get(column, '') for column in KNOWLEDGE_COLUMNS[1:]]
+        extra = {header: record[header] for header in headers[1:]
+                 if header not in KNOWLEDGE_COLUMNS and header in record}
+        return row + [json.dumps(extra, ensure_ascii=False, default=str) if extra else None]
+
+    @staticmethod
+    def _record_from_row(headers, row):
+        """Ngược lại với _row_from_record: dict theo tiêu đề sheet từ hàng KNOWLEDGE_COLUMNS + extra."""
+        fixed = dict(zip(KNOWLEDGE_COLUMNS, row))
+        extra = json.loads(row[len(KNOWLEDGE_COLUMNS)]) if row[len(KNOWLEDGE_COLUMNS)] else {}
+        record = {headers[0]: fixed['id']}
+        for header in headers[1:]:
+            record[header] = fixed[header] if header in fixed else extra.get(header, '')
+        return record
+
+    def _insert_knowledge(self, rows):
+        """`rows` theo thứ tự KNOWLEDGE_COLUMNS (hàng thiếu được đệm ''), có thể kèm giá trị cột extra ở cuối."""
+        width = len(KNOWLEDGE_COLUMNS)
+        columns = ', '.join(f'"{column}"' for column in KNOWLEDGE_COLUMNS + [EXTRA_COLUMN])
+        placeholders = ', '.join('?' * (width + 1))
+        self._conn.executemany(
+            f"INSERT INTO knowledge ({columns}) VALUES ({placeholders})",
+            [list(row[:width]) + [''] * (width - len(row[:width])) + [row[width] if len(row) > width else None]
+             for row in rows],
+        )
+
+    def load_knowledge(self):
+        try:
+            with self._lock:
+                headers = self._headers()
+                rows = self._conn.execute(f"SELECT {_KNOWLEDGE_SELECT} FROM knowledge k ORDER BY seq").fetchall()
+            return pd.DataFrame([self._record_from_row(headers, row) for row in rows], columns=headers)
+        except Exception as e:
+            print(f"Lỗi khi đọc kiến thức từ SQLite: {e}")
+            return None
+
+    def get_change_token(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'knowledge_version'").fetchone()
+        return str(row[0]) if row else None
+
+    def append_knowledge_rows(self, rows):
+        try:
+            with self._lock, self._conn:
+                self._insert_knowledge(rows)
+                self._bump_knowledge_version()
+            return True, None
+        except Exception as e:
+            print(f"Lỗi khi thêm kiến thức vào SQLite: {e}")
+            return False, str(e)
+
+    def add_knowledge(self, knowledge_data):
+        new_id = str(uuid.uuid4())
+        success, error_message = self.append_knowledge_rows([gs.build_knowledge_row(knowledge_data, new_id)])
+        return success, error_message, new_id if success else None
+
+    def _find_seq(self, item_id):
+        """seq của hàng đầu tiên có ID tương ứng (giống cách tìm trên sheet); ID rỗng không khớp hàng nào."""
+        if not str(item_id).strip():
+            return None
+        row = self._conn.execute("SELECT seq FROM knowledge WHERE id = ? ORDER BY seq LIMIT 1",
+                                 (str(item_id),)).fetchone()
+        return row[0] if row else None
+
+    def _update_row(self, item_id, new_data):
+        """Cập nhật hàng có ID tương ứng. Trả về dict các trường đã ghi, hoặc None nếu không có hàng."""
+        seq = self._find_seq(item_id)
+        if seq is None:
+            return None
+        headers = self._headers()
+        fields = {key: value for key, value in new_data.items() if key in KNOWLEDGE_COLUMNS[1:]}
+        extra_fields = {key: value for key, value in new_data.items()
+                        if key in headers[1:] and key not in KNOWLEDGE_COLUMNS}
+        written = {**fields, **extra_fields}
+        if extra_fields:
+            current = self._conn.execute(f'SELECT "{EXTRA_COLUMN}" FROM knowledge WHERE seq = ?', (seq,)).fetchone()[0]
+            extra = {**(json.loads(current) if current else {}), **extra_fields}
+            fields[EXTRA_COLUMN] = json.dumps(extra, ensure_ascii=False, default=str)
+        if fields:
+            assignments = ', '.join(f'"{key}" = ?' for key in fields)
+            self._conn.execute(f"UPDATE knowledge SET {assignments} WHERE seq = ?", [*fields.values(), seq])
+        return written
+
+    # worksheet_name / worksheet_names chỉ có ý nghĩa với Google Sheet (SQLite chỉ có một bảng kiến thức)
+
+    def update_knowledge_by_id(self, item_id, new_data, worksheet_name=None):
+        try:
+            with self._lock, self._conn:
+                written = self._update_row(item_id, new_data)
+                if written is None:
+                    return False, f"Không tìm thấy kiến thức với ID: {item_id}", None
+                self._bump_knowledge_version()
+            return True, None, written
+        except Exception as e:
+            print(f"Lỗi khi cập nhật kiến thức trong SQLite: {e}")
+            return False, str(e), None
+
+    def delete_knowledge_by_id(self, item_id, worksheet_name=None):
+        try:
+            with self._lock, self._conn:
+                seq = self._find_seq(item_id)
+                if seq is None:
+                    return False, f"Không tìm thấy kiến thức với ID: {item_id}"
+                self._conn.execute("DELETE FROM knowledge WHERE seq = ?", (seq,))
+                self._bump_knowledge_version()
+            return True, None
+        except Exception as e:
+            print(f"Lỗi khi xóa kiến thức trong SQLite: {e}")
+            return False, str(e)
+
+    def bulk_add_knowledge(self, items, chunk_size=500):
+        """Thêm nhiều kiến thức trong một transaction. Trả về giống google_sheets_service.bulk_add_knowledge."""
+        rows = [gs.build_knowledge_row(item, str(uuid.uuid4())) for item in items]
+        success, error_message = self.append_knowledge_rows(rows)
+        if not success:
+            return [{'id': None, 'error': error_message} for _ in items], []
+        return [{'id': row[0], 'error': None} for row in rows], rows
+
+    def bulk_update_knowledge(self, updates, chunk_size=500, worksheet_names=None):
+        """Cập nhật nhiều kiến thức trong một transaction. Trả về danh sách lỗi theo thứ tự `updates`."""
+        errors = [None] * len(updates)
+        try:
+            with self._lock, self._conn:
+                for position, (item_id, new_data) in enumerate(updates):
+                    if self._update_row(item_id, new_data) is None:
+                        errors[position] = f"Không tìm thấy kiến thức với ID: {item_id}"
+                self._bump_knowledge_version()
+        except Exception as e:
+            print(f"Lỗi khi cập nhật kiến thức hàng loạt trong SQLite: {e}")
+            return [str(e)] * len(updates)
+        return errors
+
+    def search_knowledge(self, query, limit=10):
+        """Tìm kiến thức bằng FTS5 (không phân biệt dấu), xếp hạng theo BM25. Trả về danh sách dict."""
+        match = _fts_query(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for weight in KNOWLEDGE_FTS_WEIGHTS)
+        with self._lock:
+            headers = self._headers()
+            rows = self._conn.execute(
+                f"SELECT {_KNOWLEDGE_SELECT}, bm25(knowledge_fts, {weights}) AS rank "
+                "FROM knowledge_fts JOIN knowledge k ON k.seq = knowledge_fts.rowid "
+                "WHERE knowledge_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        # bm25() càng nhỏ càng khớp; đổi dấu để điểm càng lớn càng tốt
+        return [{**self._record_from_row(headers, row[:-1]), 'score': round(-row[-1], 4)} for row in rows]
+
+    # --- LỊCH SỬ CHAT ---
+
+    def _insert_history(self, rows):
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO history (id, timestamp, question, answer) VALUES (?, ?, ?, ?)",
+            [[str(row[0])] + list(row[1:4]) + [''] * (4 - len(row)) for row in rows],
+        )
+
+    def log_chat_history_rows(self, rows):
+        try:
+            with self._lock, self._conn:
+                self._insert_history(rows)
+            return True, None
+        except Exception as e:
+            print(f"Lỗi khi ghi lịch sử chat vào SQLite: {e}")
+            return False, str(e)
+
+    def get_chat_history_data(self):
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT id, timestamp, question, answer FROM history ORDER BY seq").fetchall()
+            return [dict(zip(HISTORY_COLUMNS, row)) for row in rows]
+        except Exception as e:
+            print(f"Lỗi khi đọc lịch sử chat từ SQLite: {e}")
+            return None
+
+    def get_chat_history_detail_by_id(self, chat_id):
+        with self._lock:
+            row = self._conn.execute("SELECT id, timestamp, question, answer FROM history WHERE id = ?",
+                                     (str(chat_id),)).fetchone()
+        return dict(zip(HISTORY_COLUMNS, row)) if row else None
+
+    def search_chat_history(self, keyword):
+        """
+        Trả về tập ID lịch sử có câu hỏi/câu trả lời chứa `keyword` (không phân biệt hoa thường),
+        dùng FTS5 trigram. Từ khóa ngắn hơn 3 ký tự không tra được bằng trigram nên trả về None.
+        """
+        keyword = str(keyword).strip()
+        if len(keyword) < 3:
+            return None
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT h.id FROM history_fts JOIN history h ON h.seq = history_fts.rowid WHERE history_fts MATCH ?",
+                (phrase,),
+            ).fetchall()
+        return {row[0] for row in rows}
@@ -0,0 +1,226 @@
+# /chatbotAI/app/services/storage.py
+import atexit
+import threading
+
+from config import Config
+from app.services import google_sheets_service as gs
+
+# --- LỚP LƯU TRỮ ---
+# Các API và luồng nền đọc/ghi kiến thức và lịch sử chat qua module này thay vì gọi thẳng
+# google_sheets_service. Backend được chọn bằng STORAGE_BACKEND:
+# - 'sheets': đọc/ghi trực tiếp Google Sheet như trước
+# - 'sqlite': file SQLite cục bộ (kèm FTS5) là nơi lưu chính; Google Sheet (nếu bật
+#   SHEETS_MIRROR) được cập nhật bất đồng bộ ở luồng nền
+
+
+class SheetsBackend:
+    """Backend Google Sheet: chuyển tiếp tới các hàm trong google_sheets_service."""
+
+    name = 'sheets'
+    supports_search = False
+
+    def load_knowledge(self):
+        return gs.get_google_sheet_data()
+
+    def get_change_token(self):
+        return gs.get_change_token()
+
+    def add_knowledge(self, knowledge_data):
+        return gs.add_knowledge(knowledge_data)
+
+    def update_knowledge_by_id(self, item_id, new_data, worksheet_name=None):
+        return gs.update_knowledge_by_id(item_id, new_data, worksheet_name)
+
+    def delete_knowledge_by_id(self, item_id, worksheet_name=None):
+        return gs.delete_knowledge_by_id(item_id, worksheet_name)
+
+    def bulk_add_knowledge(self, items, chunk_size=500):
+        return gs.bulk_add_knowledge(items, chunk_size)
+
+    def bulk_update_knowledge(self, updates, chunk_size=500, worksheet_names=None):
+        return gs.bulk_update_knowledge(updates, chunk_size, worksheet_names)
+
+    def search_knowledge(self, query, limit=10):
+        return None
+
+    def log_chat_history_rows(self, rows):
+        return gs.log_chat_history_rows(rows)
+
+    def get_chat_history_data(self):
+        return gs.get_chat_history_data()
+
+    def get_chat_history_detail_by_id(self, chat_id):
+        return gs.get_chat_history_detail_by_id(chat_id)
+
+    def search_chat_history(self, keyword):
+        return None
+
+
+# --- ĐỒNG BỘ BẤT ĐỒNG BỘ LÊN GOOGLE SHEET ---
+# Mỗi thao tác ghi thành công vào SQLite được đưa vào hàng đợi dạng (loại, tham số...)
+# và phát lại lên Google Sheet theo đúng thứ tự bởi một luồng nền (dùng lại HistoryLogger).
+
+def _is_missing_error(error_message):
+    # Hàng đã bị xóa/sửa trực tiếp trên sheet: thử lại cũng không được, bỏ qua thao tác
+    return bool(error_message) and "Không tìm thấy" in error_message
+
+def _replay_on_sheets(operations):
+    """
+    Phát lại các thao tác lên Google Sheet theo thứ tự; các thao tác thêm hàng (hoặc cập nhật)
+    liền nhau được gộp thành một lần gọi. Thao tác đã ghi xong được xóa khỏi danh sách ngay,
+    nên khi HistoryLogger thử lại (với cùng danh sách) chỉ phần còn lại được ghi lại.
+    """
+    while operations:
+        kind = operations[0][0]
+        count = 1
+        while count < len(operations) and operations[count][0] == kind and kind != 'delete_knowledge':
+            count += 1
+        group = operations[:count]
+        if kind in ('append_knowledge', 'log_history'):
+            rows = [row for operation in group for row in operation[1]]
+            write = gs.append_knowledge_rows if kind == 'append_knowledge' else gs.log_chat_history_rows
+            success, error_message = write(rows)
+        elif kind == 'update_knowledge':
+            # Ghi lại cùng giá trị không gây hại, nên khi lỗi có thể thử lại cả nhóm
+            errors = gs.bulk_update_knowledge([operation[1:3] for operation in group],
+                                              worksheet_names=[operation[3] for operation in group])
+            errors = [error for error in errors if error and not _is_missing_error(error)]
+            success, error_message = not errors, errors[0] if errors else None
+        else:
+            success, error_message = gs.delete_knowledge_by_id(operations[0][1], operations[0][2])
+            if not success and _is_missing_error(error_message):
+                print(f"Bỏ qua thao tác xóa trên Google Sheet: {error_message}")
+                success = True
+        if not success:
+            return False, error_message
+        del operations[:count]
+    return True, None
+
+
+_backend = None
+_mirror = None
+_backend_lock = threading.Lock()
+
+
+def _create_backend():
+    global _mirror
+    if Config.STORAGE_BACKEND != 'sqlite':
+        return SheetsBackend()
+
+    from app.services.history_logger import HistoryLogger
+    from app.services.sqlite_backend import SQLiteBackend
+
+    backend = SQLiteBackend(Config.SQLITE_DB_PATH)
+    print(f"Dùng SQLite '{Config.SQLITE_DB_PATH}' làm nơi lưu dữ liệu chính.")
+    if backend.is_empty() and Config.SQLITE_SEED_FROM_SHEETS:
+        # Lần chạy đầu: lấy dữ liệu hiện có trên Google Sheet làm dữ liệu ban đầu
+        print("SQLite chưa có dữ liệu, đang nạp từ Google Sheet...")
+        dataframe = gs.get_google_sheet_data()
+        if dataframe is not None:
+            backend.import_data(dataframe, gs.get_chat_history_data())
+    if Config.SHEETS_MIRROR:
+        _mirror = HistoryLogger(
+            _replay_on_sheets,
+            max_queue_size=Config.HISTORY_QUEUE_SIZE,
+            batch_size=Config.HISTORY_BATCH_SIZE,
+            flush_interval_ms=Config.HISTORY_FLUSH_INTERVAL_MS,
+            max_retries=Config.HISTORY_MAX_RETRIES,
+        )
+        _mirror.start()
+        atexit.register(_mirror.stop)
+    return backend
+
+
+def get_backend():
+    """Trả về backend dùng chung (tạo lần đầu khi cần)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+def _mirror_operation(*operation):
+    if _mirror is not None:
+        _mirror.submit(operation)
+
+
+def status():
+    """Thông tin backend đang dùng và số thao tác chờ đồng bộ lên Google Sheet."""
+    return {
+        'backend': get_backend().name,
+        'sheets_mirror': _mirror is not None,
+        'mirror_pending': _mirror.pending() if _mirror is not None else 0,
+        'mirror_dropped': _mirror.dropped if _mirror is not None else 0,
+    }
+
+
+# --- KIẾN THỨC ---
+
+def get_knowledge_data():
+    """Đọc toàn bộ kiến thức dưới dạng DataFrame (None nếu lỗi)."""
+    return get_backend().load_knowledge()
+
+def get_change_token():
+    """Tín hiệu thay đổi rẻ của dữ liệu kiến thức (None nếu không lấy được)."""
+    return get_backend().get_change_token()
+
+def add_knowledge(knowledge_data):
+    success, error_message, new_id = get_backend().add_knowledge(knowledge_data)
+    if success:
+        _mirror_operation('append_knowledge', [gs.build_knowledge_row(knowledge_data, new_id)])
+    return success, error_message, new_id
+
+def update_knowledge_by_id(item_id, new_data, worksheet_name=None):
+    """
+    `worksheet_name`: worksheet Google Sheet chứa hàng (nếu biết), để ghi đúng chỗ khi có nhiều worksheet.
+    Trả về (thành công, thông báo lỗi, các trường đã thực sự ghi).
+    """
+    success, error_message, written = get_backend().update_knowledge_by_id(item_id, new_data, worksheet_name)
+    if success:
+        _mirror_operation('update_knowledge', item_id, written, worksheet_name)
+    return success, error_message, written
+
+def delete_knowledge_by_id(item_id, worksheet_name=None):
+    success, error_message = get_backend().delete_knowledge_by_id(item_id, worksheet_name)
+    if success:
+        _mirror_operation('delete_knowledge', item_id, worksheet_name)
+    return success, error_message
+
+def bulk_add_knowledge(items, chunk_size=500):
+    results, written_rows = get_backend().bulk_add_knowledge(items, chunk_size)
+    if written_rows:
+        _mirror_operation('append_knowledge', written_rows)
+    return results, written_rows
+
+def bulk_update_knowledge(updates, chunk_size=500, worksheet_names=None):
+    worksheet_names = worksheet_names or [None] * len(updates)
+    errors = get_backend().bulk_update_knowledge(updates, chunk_size, worksheet_names)
+    for (item_id, new_data), worksheet_name, error_message in zip(updates, worksheet_names, errors):
+        if error_message is None:
+            _mirror_operation('update_knowledge', item_id, new_data, worksheet_name)
+    return errors
+
+def search_knowledge(query, limit=10):
+    """Tìm kiếm toàn văn trong kho kiến thức; None nếu backend không hỗ trợ."""
+    return get_backend().search_knowledge(query, limit)
+
+
+# --- LỊCH SỬ CHAT ---
+
+def log_chat_history_rows(rows):
+    success, error_message = get_backend().log_chat_history_rows(rows)
+    if success:
+        _mirror_operation('log_history', list(rows))
+    return success, error_message
+
+def get_chat_history_data():
+    return get_backend().get_chat_history_data()
+
+def get_chat_history_detail_by_id(chat_id):
+    return get_backend().get_chat_history_detail_by_id(chat_id)
+
+def search_chat_history(keyword):
+    """Tập ID lịch sử chứa từ khóa; None nếu backend không hỗ trợ (khi đó lọc trong bộ nhớ)."""
+    return get_backend().search_chat_history(keyword)
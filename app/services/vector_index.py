@@ -0,0 +1,197 @@
+# /chatbotAI/app/services/vector_index.py
+import itertools
+import zlib
+
+import numpy as np
+
+from config import Config
+from app.services.vietnamese_text import split_syllables
+
+# Độ dài các n-gram ký tự được băm vào vector
+NGRAM_SIZES = (2, 3, 4)
+# Các cột dùng để tạo vector cho mỗi hàng (không có thì dùng toàn bộ các cột)
+VECTOR_COLUMNS = ('question', 'answer', 'answering_unit')
+# Độ tương đồng cosine tối thiểu để một hàng được coi là liên quan
+MIN_SIMILARITY = 0.1
+# Số hàng xử lý mỗi lần khi dựng ma trận, để bộ nhớ tạm không tăng theo kích thước cả bảng
+BUILD_CHUNK_ROWS = 2000
+
+
+def _ngrams(text):
+    """Các n-gram ký tự trên chuỗi đã bỏ dấu, bỏ dấu câu (mỗi từ được đệm khoảng trắng hai đầu)."""
+    padded = f" {' '.join(split_syllables(text, fold=True)[0])} "
+    return [padded[start:start + size] for size in NGRAM_SIZES for start in range(len(padded) - size + 1)]
+
+
+class HashedVectorizer:
+    """
+    Băm n-gram ký tự vào vector kích thước cố định (có dấu +/- để giảm sai lệch khi trùng ô).
+    Dùng crc32 thay cho hash() của Python để vector giống nhau giữa các tiến trình
+    (vector được lưu cùng snapshot trên đĩa).
+    """
+
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self.idf = np.ones(dimensions, dtype=np.float32)
+        self._codes = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_codes'] = {}
+        return state
+
+    def _code(self, gram):
+        """Mã của một n-gram: (ô + 1) mang dấu +/-."""
+        code = self._codes.get(gram)
+        if code is None:
+            digest = zlib.crc32(gram.encode('utf-8'))
+            code = (digest % self.dimensions + 1) * (1 if digest & 0x80000000 else -1)
+            if len(self._codes) < 500000:
+                self._codes[gram] = code
+        return code
+
+    def raw_matrix(self, texts):
+        """
+        Ma trận tần suất (log, giữ dấu) của nhiều chuỗi, chưa nhân IDF, chưa chuẩn hóa.
+        Xử lý theo từng khối BUILD_CHUNK_ROWS hàng: mã n-gram của một khối được đưa thẳng vào mảng
+        int32 rồi cộng dồn bằng bincount, không bao giờ giữ danh sách mã của cả bảng.
+        """
+        texts = list(texts)
+        raw = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for start in range(0, len(texts), BUILD_CHUNK_ROWS):
+            raw[start:start + BUILD_CHUNK_ROWS] = self._raw_chunk(texts[start:start + BUILD_CHUNK_ROWS])
+        return raw
+
+    def _raw_chunk(self, texts):
+        grams = [_ngrams(text) for text in texts]
+        lengths = np.fromiter(map(len, grams), dtype=np.int32, count=len(grams))
+        codes = np.fromiter(map(self._code, itertools.chain.from_iterable(grams)), dtype=np.int32,
+                            count=int(lengths.sum()))
+        rows = np.repeat(np.arange(len(texts), dtype=np.int32), lengths)
+        cells = rows * np.int32(self.dimensions) + np.abs(codes) - 1
+        raw = np.bincount(cells, weights=np.sign(codes).astype(np.float32), minlength=len(texts) * self.dimensions)
+        raw = raw.reshape(len(texts), self.dimensions).astype(np.float32)
+        return np.sign(raw) * np.log1p(np.abs(raw))
+
+    def fit_idf(self, raw_matrix):
+        """Trọng số IDF theo ô băm, tính một lần khi dựng toàn bộ."""
+        document_frequency = np.count_nonzero(raw_matrix, axis=0)
+        total = raw_matrix.shape[0]
+        self.idf = (np.log((total + 1) / (document_frequency + 1)) + 1).astype(np.float32)
+
+    def finish(self, raw):
+        """Nhân IDF và chuẩn hóa L2 từng hàng để tích vô hướng là cosine."""
+        weighted = raw * self.idf
+        norms = np.linalg.norm(weighted, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (weighted / norms).astype(np.float32, copy=False)
+
+    def transform(self, text):
+        return self.finish(self.raw_matrix([text]))[0]
+
+
+def _record_text(record):
+    values = [record[column] for column in VECTOR_COLUMNS if column in record]
+    if not values:
+        values = list(record.values())
+    return ' '.join(str(value) for value in values)
+
+
+class VectorIndex:
+    """
+    Tìm kiếm ngữ nghĩa cục bộ: mỗi hàng kiến thức được nhúng một lần thành vector n-gram băm,
+    lưu trong một ma trận NumPy liên tục. Một câu hỏi chỉ cần một phép nhân ma trận-vector
+    và argpartition để lấy top-k, không cần GPU hay mạng.
+
+    Giống InvertedIndex, chỉ mục coi như bất biến: các hàm with_* trả về chỉ mục mới.
+    Thêm/sửa hàng chỉ ghi thêm vector vào cuối vùng đệm dùng chung (có dư chỗ) và đánh dấu
+    hàng cũ là đã bỏ; chỉ mục cũ chỉ đọc phần `size` hàng đầu nên không bị ảnh hưởng.
+    """
+
+    def __init__(self, vectorizer, matrix, labels, alive, size, shared_size=None):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.labels = labels
+        self.alive = alive
+        self.size = size
+        # Số hàng đã dùng của vùng đệm dùng chung; chỉ chỉ mục mới nhất mới được ghi tiếp
+        self._shared_size = shared_size if shared_size is not None else [size]
+
+    @property
+    def num_rows(self):
+        return int(np.count_nonzero(self.alive[:self.size]))
+
+    def _append(self, labels, records):
+        """Trả về chỉ mục mới có thêm vector của `records` ở cuối (dùng lại vùng đệm nếu được)."""
+        if not records:
+            return self
+        count = len(records)
+        matrix, buffer_labels, shared_size = self.matrix, self.labels, self._shared_size
+        if shared_size[0] != self.size or self.size + count > len(matrix):
+            # Hết chỗ (hoặc vùng đệm đã bị chỉ mục khác ghi tiếp): cấp vùng đệm mới gấp đôi
+            capacity = max(16, 2 * (self.size + count))
+            matrix = np.zeros((capacity, self.vectorizer.dimensions), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            buffer_labels = np.zeros(capacity, dtype=np.int64)
+            buffer_labels[:self.size] = self.labels[:self.size]
+            shared_size = [self.size]
+        end = self.size + count
+        matrix[self.size:end] = self.vectorizer.finish(
+            self.vectorizer.raw_matrix([_record_text(record) for record in records]))
+        buffer_labels[self.size:end] = labels
+        shared_size[0] = end
+        alive = np.zeros(len(matrix), dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        alive[self.size:end] = True
+        return VectorIndex(self.vectorizer, matrix, buffer_labels, alive, end, shared_size)
+
+    def _without(self, labels):
+        alive = self.alive.copy()
+        alive[:self.size] &= ~np.isin(self.labels[:self.size], labels)
+        return VectorIndex(self.vectorizer, self.matrix, self.labels, alive, self.size, self._shared_size)
+
+    def with_row(self, label, record):
+        return self._append([label], [record])
+
+    def without_row(self, label):
+        return self._without([label])
+
+    def with_updated_row(self, label, record):
+        return self._without([label])._append([label], [record])
+
+    def with_changes(self, removed_labels=(), added=()):
+        """Áp dụng nhiều thay đổi cùng lúc: bỏ `removed_labels`, thêm `added` (danh sách (nhãn, bản ghi))."""
+        index = self._without(list(removed_labels)) if removed_labels else self
+        return index._append([label for label, _ in added], [record for _, record in added])
+
+    def search(self, question, max_rows=5, allowed=None):
+        """Trả về danh sách (nhãn hàng, độ tương đồng cosine) giảm dần, chỉ gồm hàng đạt MIN_SIMILARITY."""
+        if self.size == 0:
+            return []
+        scores = self.matrix[:self.size] @ self.vectorizer.transform(question)
+        valid = self.alive[:self.size]
+        if allowed is not None:
+            valid = valid & np.isin(self.labels[:self.size], np.fromiter(allowed, dtype=np.int64))
+        scores = np.where(valid, scores, -1.0)
+
+        k = min(max_rows, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.labels[i]), round(float(scores[i]), 4)) for i in top if scores[i] >= MIN_SIMILARITY]
+
+
+def build_vector_index(dataframe):
+    """Nhúng toàn bộ DataFrame kiến thức thành VectorIndex (None nếu không có dữ liệu hoặc đã tắt)."""
+    if dataframe is None or Config.VECTOR_SEARCH_MODE == 'off':
+        return None
+    vectorizer = HashedVectorizer(Config.VECTOR_DIMENSIONS)
+    columns = [column for column in VECTOR_COLUMNS if column in dataframe.columns] or list(dataframe.columns)
+    texts = dataframe[columns].astype(str).agg(' '.join, axis=1) if len(dataframe) else []
+    matrix = vectorizer.raw_matrix(texts)
+    vectorizer.fit_idf(matrix)
+    # Nhân IDF và chuẩn hóa tại chỗ theo khối, không tạo thêm bản sao của cả ma trận
+    for start in range(0, len(matrix), BUILD_CHUNK_ROWS):
+        matrix[start:start + BUILD_CHUNK_ROWS] = vectorizer.finish(matrix[start:start + BUILD_CHUNK_ROWS])
+    labels = np.asarray(dataframe.index, dtype=np.int64)
+    print(f"Đã xây dựng chỉ mục vector: {len(dataframe)} hàng x {vectorizer.dimensions} chiều.")
+    return VectorIndex(vectorizer, matrix, labels, np.ones(len(dataframe), dtype=bool), len(dataframe))
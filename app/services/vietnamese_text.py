@@ -0,0 +1,95 @@
+# /chatbotAI/app/services/vietnamese_text.py
+import functools
+import re
+import unicodedata
+
+from config import Config
+
+# Hư từ / từ xưng hô rất phổ biến, gần như không giúp phân biệt các hàng kiến thức
+STOPWORDS = frozenset("""
+a à ạ ơi nhé nhỉ vậy thế thì là mà và với của cho các những một này kia đó ấy nào gì
+có không được bị đã đang sẽ rồi cũng vẫn còn nữa lại ra vào để khi nếu như theo tại ở
+tôi em anh chị bạn mình chúng ta họ ông bà xin hỏi giúp cần muốn biết
+""".split())
+
+_WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    """Chuẩn hóa Unicode về NFC, chữ thường và gộp khoảng trắng."""
+    text = unicodedata.normalize('NFC', str(text)).lower()
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def fold_diacritics(text):
+    """Bỏ dấu tiếng Việt ('Bến Nghé' -> 'ben nghe'), dùng để so khớp không phân biệt dấu."""
+    decomposed = unicodedata.normalize('NFD', normalize_text(text))
+    stripped = ''.join(char for char in decomposed if unicodedata.category(char) != 'Mn')
+    return stripped.replace('đ', 'd')
+
+
+# Số âm tiết tiếng Việt có hạn nên bỏ dấu từng âm tiết qua cache nhanh hơn nhiều khi dựng chỉ mục
+_fold_syllable = functools.lru_cache(maxsize=65536)(fold_diacritics)
+
+# Hư từ ở dạng không dấu, dùng cho âm tiết người dùng gõ không dấu ("khong", "duoc", "thi")
+FOLDED_STOPWORDS = frozenset(_fold_syllable(word) for word in STOPWORDS)
+
+
+def words(text):
+    """Tách chuỗi thành danh sách từ (âm tiết), bỏ dấu câu."""
+    return _WORD_PATTERN.findall(str(text))
+
+
+def split_syllables(text, fold=None):
+    """
+    Tách chuỗi thành (danh sách âm tiết, danh sách cờ hư từ) theo cùng thứ tự.
+    Với `fold` (mặc định theo SEARCH_FOLD_DIACRITICS), âm tiết được bỏ dấu để câu hỏi gõ không dấu vẫn khớp.
+    """
+    fold = Config.SEARCH_FOLD_DIACRITICS if fold is None else fold
+    syllables = words(normalize_text(text))
+    folded = [_fold_syllable(syllable) for syllable in syllables]
+    # Âm tiết có dấu được so với hư từ có dấu, vì sau khi bỏ dấu nhiều hư từ trùng với từ có nghĩa
+    # ("đang" / "đăng"); âm tiết gõ không dấu thì chỉ so được với hư từ đã bỏ dấu
+    is_stopword = [
+        syllable in STOPWORDS if plain != syllable else plain in FOLDED_STOPWORDS
+        for syllable, plain in zip(syllables, folded)
+    ]
+    return (folded if fold else syllables), is_stopword
+
+
+def syllables_to_terms(syllables, is_stopword):
+    """Âm tiết (bỏ hư từ) và cặp âm tiết liền nhau (bigram, nối bằng '_')."""
+    terms = [syllable for syllable, stop in zip(syllables, is_stopword) if not stop]
+    terms.extend(
+        f"{syllables[i]}_{syllables[i + 1]}" for i in range(len(syllables) - 1)
+        if not (is_stopword[i] and is_stopword[i + 1])
+    )
+    return terms
+
+
+def tokenize(text, fold=None):
+    """
+    Tách chuỗi thành các term dùng cho tìm kiếm: âm tiết (bỏ hư từ) và cặp âm tiết liền nhau,
+    vì tiếng Việt ghép từ bằng nhiều âm tiết ("kết hôn", "khai sinh").
+    """
+    return syllables_to_terms(*split_syllables(text, fold))
+
+
+@functools.lru_cache(maxsize=4096)
+def _query_syllables(question):
+    syllables, is_stopword = split_syllables(question)
+    return tuple(syllables), tuple(is_stopword)
+
+
+def query_terms(question, correct=None):
+    """
+    Tập term của một câu hỏi; phần tách âm tiết được ghi nhớ để câu hỏi lặp lại không phải tách lại.
+    `correct` (nếu có) là hàm sửa một âm tiết gõ sai, chỉ áp dụng cho âm tiết không phải hư từ hay số.
+    """
+    syllables, is_stopword = _query_syllables(question)
+    if correct is not None:
+        syllables = [
+            syllable if stop or syllable.isdigit() else correct(syllable)
+            for syllable, stop in zip(syllables, is_stopword)
+        ]
+    return frozenset(syllables_to_terms(syllables, is_stopword))
@@ -7,4 +7,85 @@ load_dotenv()
 class Config:
     DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
     GOOGLE_SHEET_NAME = os.getenv("GOOGLE_SHEET_NAME")
-    HISTORY_WORKSHEET_NAME = os.getenv("HISTORY_WORKSHEET_NAME")
\ No newline at end of file
+    HISTORY_WORKSHEET_NAME = os.getenv("HISTORY_WORKSHEET_NAME")
+    WORK_SHEET_PHUONG_XA = os.getenv("WORK_SHEET_PHUONG_XA")
+    WORK_SHEET_CO_QUAN = os.getenv("WORK_SHEET_CO_QUAN")
+
+    # Các worksheet chứa kiến thức, cách nhau bởi dấu phẩy (worksheet đầu tiên là nơi ghi kiến thức mới).
+    # Để trống thì chỉ dùng worksheet đầu tiên của bảng tính như trước
+    KNOWLEDGE_WORKSHEET_STR = os.getenv("KNOWLEDGE_WORKSHEET_NAMES", "")
+    KNOWLEDGE_WORKSHEET_NAMES = [name.strip() for name in KNOWLEDGE_WORKSHEET_STR.split(',') if name.strip()]
+    # Số luồng tối đa dùng để tải các worksheet kiến thức song song
+    KNOWLEDGE_LOAD_WORKERS = int(os.getenv("KNOWLEDGE_LOAD_WORKERS", "4"))
+
+    # Ngân sách token (ước lượng) cho phần dữ liệu đưa vào prompt
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    # Các cột kiến thức được đưa vào prompt; cột quản trị (id, thời gian, link...) bị loại bỏ
+    CONTEXT_COLUMNS_STR = os.getenv("CONTEXT_COLUMNS", "question,answer,answering_unit,document,Date_of_issue")
+    CONTEXT_COLUMNS = [name.strip() for name in CONTEXT_COLUMNS_STR.split(',') if name.strip()]
+
+    # Tìm kiếm không phân biệt dấu tiếng Việt ("ket hon" khớp "kết hôn"); đặt false để phân biệt dấu
+    SEARCH_FOLD_DIACRITICS = os.getenv("SEARCH_FOLD_DIACRITICS", "true").strip().lower() in ("1", "true", "yes")
+
+    # Sửa lỗi gõ trong câu hỏi: số ký tự sai tối đa mỗi âm tiết (0 để tắt) và số từ tối đa trong từ điển sửa lỗi
+    SPELL_MAX_EDIT_DISTANCE = int(os.getenv("SPELL_MAX_EDIT_DISTANCE", "2"))
+    SPELL_MAX_VOCABULARY = int(os.getenv("SPELL_MAX_VOCABULARY", "50000"))
+
+    # Tìm kiếm vector n-gram ký tự cục bộ: 'fallback' (chỉ dùng khi tìm theo từ không ra kết quả),
+    # 'hybrid' (kết hợp thứ hạng với tìm theo từ) hoặc 'off'; và số chiều của vector
+    VECTOR_SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "fallback").strip().lower()
+    VECTOR_DIMENSIONS = int(os.getenv("VECTOR_DIMENSIONS", "256"))
+
+    # Xếp hạng BM25 theo cột cho các hàng đưa vào prompt: trọng số từng cột (để trống để tắt,
+    # khi đó dùng điểm của chỉ mục ngược) và hai tham số k1, b của BM25
+    BM25_FIELD_WEIGHTS = os.getenv("BM25_FIELD_WEIGHTS", "question:2,answer:1,document:0.5")
+    BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+    # Bộ nhớ đệm câu trả lời: số mục tối đa và thời gian sống (giây)
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+    # Ngưỡng độ tin cậy (0..1) để trả thẳng câu trả lời có sẵn trong sheet mà không gọi AI; > 1 để tắt
+    DIRECT_ANSWER_THRESHOLD = float(os.getenv("DIRECT_ANSWER_THRESHOLD", "0.9"))
+
+    # Client DeepSeek dùng chung: kích thước pool, timeout (giây), keep-alive và số kết nối làm nóng khi khởi động
+    DEEPSEEK_POOL_SIZE = int(os.getenv("DEEPSEEK_POOL_SIZE", "20"))
+    DEEPSEEK_CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "5"))
+    DEEPSEEK_READ_TIMEOUT = float(os.getenv("DEEPSEEK_READ_TIMEOUT", "60"))
+    DEEPSEEK_KEEPALIVE_SECONDS = float(os.getenv("DEEPSEEK_KEEPALIVE_SECONDS", "120"))
+    DEEPSEEK_MAX_RETRIES = int(os.getenv("DEEPSEEK_MAX_RETRIES", "2"))
+    DEEPSEEK_WARMUP_CONNECTIONS = int(os.getenv("DEEPSEEK_WARMUP_CONNECTIONS", "0"))
+    # Kích thước pool của client DeepSeek bất đồng bộ (chế độ ASGI, xem asgi.py)
+    DEEPSEEK_ASYNC_POOL_SIZE = int(os.getenv("DEEPSEEK_ASYNC_POOL_SIZE", "200"))
+
+    # Hỏi hàng loạt (/api/chat/ask-batch): số câu hỏi tối đa mỗi request và số lời gọi DeepSeek chạy song song
+    BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+    BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+    # Ghi lịch sử chat nền theo lô: kích thước hàng đợi, số hàng mỗi lô, chu kỳ ghi (ms) và số lần thử lại
+    HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+    HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "50"))
+    HISTORY_FLUSH_INTERVAL_MS = int(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "1000"))
+    HISTORY_MAX_RETRIES = int(os.getenv("HISTORY_MAX_RETRIES", "5"))
+    # Chu kỳ (giây) tải lại lịch sử chat trong bộ nhớ từ nơi lưu trữ, để thấy hàng do worker/tiến trình
+    # khác ghi hoặc xóa (chạy nhiều worker gunicorn); 0 để chỉ tải một lần khi chạy một tiến trình
+    HISTORY_RELOAD_INTERVAL = int(os.getenv("HISTORY_RELOAD_INTERVAL", "60"))
+
+    # Làm mới dữ liệu kiến thức nền: chu kỳ kiểm tra thay đổi (giây, 0 để tắt) và chu kỳ đồng bộ toàn bộ bắt buộc
+    KNOWLEDGE_REFRESH_INTERVAL = int(os.getenv("KNOWLEDGE_REFRESH_INTERVAL", "60"))
+    KNOWLEDGE_FULL_RESYNC_INTERVAL = int(os.getenv("KNOWLEDGE_FULL_RESYNC_INTERVAL", "3600"))
+
+    # File lưu snapshot kiến thức cục bộ để khởi động nhanh, không phụ thuộc mạng (để trống để tắt)
+    SNAPSHOT_CACHE_PATH = os.getenv("SNAPSHOT_CACHE_PATH", "knowledge_snapshot.pkl")
+
+    # Nhập kiến thức hàng loạt: số hàng tối đa mỗi request và số hàng/ô mỗi lần ghi lên Google Sheet
+    BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "5000"))
+    BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
+    # Nơi lưu dữ liệu chính: 'sheets' (Google Sheet) hoặc 'sqlite' (file cục bộ, có tìm kiếm toàn văn FTS5).
+    # Với 'sqlite': nạp dữ liệu ban đầu từ Google Sheet khi file còn trống, và (tùy chọn) đồng bộ ngược lên sheet ở luồng nền
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sheets").strip().lower()
+    SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "chatbot.db")
+    SQLITE_SEED_FROM_SHEETS = os.getenv("SQLITE_SEED_FROM_SHEETS", "true").strip().lower() in ("1", "true", "yes")
+    SHEETS_MIRROR = os.getenv("SHEETS_MIRROR", "true").strip().lower() in ("1", "true", "yes")
@@ -0,0 +1,12 @@
+# /chatbotAI/run_asgi.py
+# Chế độ phục vụ bất đồng bộ (ASGI), chạy song song với run.py:
+#   uvicorn run_asgi:app --host 0.0.0.0 --port 5000
+import uvicorn
+
+from app.asgi import create_asgi_app
+
+# Tạo ứng dụng ASGI (bọc ứng dụng Flask cho các endpoint còn lại)
+app = create_asgi_app()
+
+if __name__ == '__main__':
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,30 @@
+# /chatbotAI/tests/test_context_builder.py
+import pandas as pd
+
+from app.services.context_builder import build_context, estimate_tokens
+
+
+def _ranked(first_answer):
+    return pd.DataFrame({
+        'question': ['thủ tục khai sinh', 'thủ tục kết hôn', 'cấp căn cước'],
+        'answer': [first_answer, 'tại UBND xã', 'tại công an'],
+    })
+
+
+def test_oversized_first_row_is_cut_to_budget():
+    context = build_context(_ranked('điều khoản ' * 500), token_budget=100)
+    assert context.rows_used >= 1
+    assert context.truncated
+    assert 'thủ tục khai sinh' in context.text
+    assert context.tokens_used <= 100
+    assert estimate_tokens(context.text) <= 100
+
+
+def test_rows_after_a_skipped_row_are_still_packed():
+    ranked = pd.DataFrame({
+        'question': ['khai sinh', 'kết hôn', 'căn cước'],
+        'answer': ['ngắn', 'dài ' * 200, 'tại công an'],
+    })
+    context = build_context(ranked, token_budget=60)
+    assert context.rows_used == 2
+    assert 'căn cước' in context.text and 'kết hôn' not in context.text
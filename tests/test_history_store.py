@@ -0,0 +1,73 @@
+# /chatbotAI/tests/test_history_store.py
+from app.services.history_store import HistoryStore
+
+
+def _store(rows):
+    headers = ['id', 'timestamp', 'question', 'answer']
+    store = HistoryStore(lambda: [dict(zip(headers, row)) for row in rows])
+    assert store.ensure_loaded()
+    return store
+
+
+def test_page_filters_by_ids():
+    store = _store([
+        ['20240101000000000001', '2024-01-01 00:00:00', 'đăng ký kết hôn', 'a'],
+        ['20240101000000000002', '2024-01-01 00:00:00', 'làm căn cước', 'b'],
+        ['20240101000000000003', '2024-01-01 00:00:00', 'khai sinh', 'c'],
+    ])
+    items, next_cursor = store.page(10, ids={'20240101000000000001'})
+    assert [item['id'] for item in items] == ['20240101000000000001']
+    assert next_cursor is None
+
+
+def test_page_with_empty_ids_returns_nothing():
+    store = _store([['20240101000000000001', '2024-01-01 00:00:00', 'q', 'a']])
+    assert store.page(10, ids=set()) == ([], None)
+
+
+def test_rows_added_while_loading_are_merged_without_waiting():
+    import threading
+    import time
+
+    started, release = threading.Event(), threading.Event()
+
+    def load_records():
+        started.set()
+        release.wait(5)
+        return [{'id': '1', 'timestamp': '', 'question': 'q1', 'answer': 'a1'}]
+
+    store = HistoryStore(load_records)
+    loader = threading.Thread(target=store.ensure_loaded)
+    loader.start()
+    started.wait(5)
+
+    begin = time.monotonic()
+    store.add(['2', '', 'q2', 'a2'])
+    assert time.monotonic() - begin < 0.5
+
+    release.set()
+    loader.join(5)
+    items, _ = store.page(10)
+    assert [item['id'] for item in items] == ['2', '1']
+
+
+def test_stale_store_reloads_rows_written_by_other_processes():
+    import time
+
+    headers = ['id', 'timestamp', 'question', 'answer']
+    shared = [['20240101000000000001', '2024-01-01 00:00:00', 'q1', 'a1']]
+    store = HistoryStore(lambda: [dict(zip(headers, row)) for row in shared], reload_seconds=0.01)
+    assert store.ensure_loaded()
+    # Hàng của tiến trình này chưa được ghi xuống nơi lưu trữ; hàng của tiến trình khác thì đã có
+    store.add(['20240101000000000003', '2024-01-01 00:00:00', 'q3', 'a3'])
+    shared.append(['20240101000000000002', '2024-01-01 00:00:00', 'q2', 'a2'])
+
+    time.sleep(0.02)
+    assert store.ensure_loaded()
+    deadline = time.monotonic() + 2
+    while store.get('20240101000000000002') is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    items, _ = store.page(10)
+    assert [item['id'] for item in items] == [
+        '20240101000000000003', '20240101000000000002', '20240101000000000001',
+    ]
@@ -0,0 +1,67 @@
+# /chatbotAI/tests/test_knowledge_refresher.py
+import pandas as pd
+
+from app.services.knowledge_refresher import KnowledgeRefresher
+from app.services.knowledge_store import KnowledgeStore
+
+COLUMNS = ['id', 'question', 'answer']
+
+
+class FakeSheet:
+    """Nguồn dữ liệu giả: danh sách hàng và tín hiệu thay đổi tăng sau mỗi lần ghi."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.token = 1
+        self.during_load = None
+
+    def write(self, row):
+        self.rows.append(row)
+        self.token += 1
+
+    def load(self):
+        data = pd.DataFrame(self.rows, columns=COLUMNS)
+        if self.during_load:
+            callback, self.during_load = self.during_load, None
+            callback()
+        return data
+
+
+def _setup():
+    sheet = FakeSheet([['1', 'đăng ký khai sinh', 'tại UBND xã']])
+    store = KnowledgeStore(sheet.load())
+    refresher = KnowledgeRefresher(store, sheet.load, lambda: sheet.token, interval_seconds=0,
+                                   change_token=sheet.token)
+    return sheet, store, refresher
+
+
+def _admin_add(sheet, store, refresher, row):
+    token_before = refresher.read_change_token()
+    sheet.write(row)
+    assert store.apply_add(row)
+    return refresher.acknowledge_own_write(token_before)
+
+
+def test_write_during_refresh_is_not_lost():
+    sheet, store, refresher = _setup()
+    sheet.write(['2', 'đăng ký kết hôn', 'tại UBND xã'])   # sửa từ bên ngoài
+    sheet.during_load = lambda: _admin_add(sheet, store, refresher, ['3', 'cấp căn cước', 'tại công an'])
+
+    assert refresher.refresh()
+    assert sorted(store.get().dataframe['id']) == ['1', '2', '3']
+    assert not refresher.refresh()
+
+
+def test_own_write_does_not_hide_external_edit():
+    sheet, store, refresher = _setup()
+    sheet.write(['2', 'đăng ký kết hôn', 'tại UBND xã'])   # sửa từ bên ngoài, chưa được đồng bộ
+    assert not _admin_add(sheet, store, refresher, ['3', 'cấp căn cước', 'tại công an'])
+
+    assert refresher.refresh()
+    assert sorted(store.get().dataframe['id']) == ['1', '2', '3']
+
+
+def test_own_write_alone_does_not_trigger_reload():
+    sheet, store, refresher = _setup()
+    assert _admin_add(sheet, store, refresher, ['2', 'đăng ký kết hôn', 'tại UBND xã'])
+    assert not refresher.refresh()
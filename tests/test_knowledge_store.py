@@ -0,0 +1,53 @@
+# /chatbotAI/tests/test_knowledge_store.py
+import pandas as pd
+
+from app.services import knowledge_store
+from app.services.knowledge_store import KnowledgeStore
+from app.services.vietnamese_text import tokenize
+
+COLUMNS = ['id', 'question', 'answer']
+ROWS = [
+    ['1', 'đăng ký khai sinh', 'tại UBND xã'],
+    ['2', 'đăng ký kết hôn', 'tại UBND xã'],
+]
+
+
+def _fail_build(*args, **kwargs):
+    raise AssertionError('apply_batch không được dựng lại toàn bộ chỉ mục')
+
+
+def test_apply_batch_updates_indexes_incrementally(monkeypatch):
+    store = KnowledgeStore(pd.DataFrame(ROWS, columns=COLUMNS))
+    monkeypatch.setattr(knowledge_store.search_index, 'build_index', _fail_build)
+    monkeypatch.setattr(knowledge_store.vector_index, 'build_vector_index', _fail_build)
+    monkeypatch.setattr(knowledge_store.bm25_index, 'build_bm25_index', _fail_build)
+
+    assert store.apply_batch([['3', 'cấp căn cước', 'tại công an']], [('2', {'question': 'ly hôn'})])
+
+    snapshot = store.get()
+    assert sorted(snapshot.dataframe['id']) == ['1', '2', '3']
+    assert [label for label, _ in snapshot.index.search('căn cước')] == [2]
+    assert [label for label, _ in snapshot.index.search('ly hôn')] == [1]
+    assert not snapshot.index.search('kết')
+    assert [label for label, _ in snapshot.bm25.search_terms(set(tokenize('căn cước')))] == [2]
+    assert not snapshot.bm25.search_terms(set(tokenize('kết')))
+    assert snapshot.vectors.num_rows == 3
+
+
+def test_apply_batch_keeps_worksheet_of_updated_rows():
+    dataframe = pd.DataFrame(ROWS, columns=COLUMNS)
+    dataframe.attrs['worksheets'] = [('A', 1), ('B', 1)]
+    store = KnowledgeStore(dataframe)
+
+    assert store.apply_batch([['3', 'cấp căn cước', 'tại công an']], [('2', {'question': 'ly hôn'})])
+
+    snapshot = store.get()
+    assert snapshot.worksheet_of('2') == 'B'
+    assert snapshot.worksheet_of('3') == 'A'
+    assert [label for label, _ in snapshot.index.search('ly hôn')] == [1]
+
+
+def test_apply_batch_rejects_unknown_id():
+    store = KnowledgeStore(pd.DataFrame(ROWS, columns=COLUMNS))
+    assert not store.apply_batch([], [('9', {'question': 'x'})])
+    assert store.get().version == 1
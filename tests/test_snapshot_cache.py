@@ -0,0 +1,22 @@
+# /chatbotAI/tests/test_snapshot_cache.py
+import pandas as pd
+
+from config import Config
+from app.services import snapshot_cache
+from app.services.knowledge_store import KnowledgeSnapshot
+
+
+def _save(path):
+    dataframe = pd.DataFrame([{'id': '1', 'question': 'đăng ký khai sinh', 'answer': 'tại UBND xã'}])
+    assert snapshot_cache.save_snapshot(str(path), KnowledgeSnapshot(dataframe, 1, unit_labels=(None, {})))
+
+
+def test_loads_snapshot_saved_with_same_config(tmp_path):
+    _save(tmp_path / 'snapshot.pkl')
+    assert snapshot_cache.load_snapshot(str(tmp_path / 'snapshot.pkl')) is not None
+
+
+def test_rejects_snapshot_when_index_config_changes(tmp_path, monkeypatch):
+    _save(tmp_path / 'snapshot.pkl')
+    monkeypatch.setattr(Config, 'SEARCH_FOLD_DIACRITICS', not Config.SEARCH_FOLD_DIACRITICS)
+    assert snapshot_cache.load_snapshot(str(tmp_path / 'snapshot.pkl')) is None
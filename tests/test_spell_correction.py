@@ -0,0 +1,16 @@
+# /chatbotAI/tests/test_spell_correction.py
+from app.services.spell_correction import SpellCorrector
+
+
+def _corrector():
+    return SpellCorrector({'phong': 10, 'hon': 10, 'ket': 10, 'khai': 5, 'sinh': 5}, max_distance=2)
+
+
+def test_corrects_typo_in_content_syllable():
+    assert _corrector().lookup('sinhh') == 'sinh'
+
+
+def test_does_not_correct_stopwords_or_short_syllables():
+    corrector = _corrector()
+    assert corrector.lookup('khong') is None
+    assert corrector.lookup('hoi') is None
@@ -0,0 +1,35 @@
+# /chatbotAI/tests/test_sqlite_backend.py
+import pandas as pd
+
+from app.services.sqlite_backend import SQLiteBackend
+
+
+def _backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'data.db'))
+    dataframe = pd.DataFrame([
+        ['a1', 'đăng ký khai sinh', 'tại UBND xã', 'ghi chú 1'],
+        ['', 'hàng chưa có ID', 'không sửa được', ''],
+    ], columns=['ID', 'question', 'answer', 'note'])
+    backend.import_data(dataframe, [])
+    return backend
+
+
+def test_import_takes_id_from_first_column_and_keeps_headers(tmp_path):
+    loaded = _backend(tmp_path).load_knowledge()
+    assert list(loaded.columns) == ['ID', 'question', 'answer', 'note']
+    assert loaded.iloc[0].tolist() == ['a1', 'đăng ký khai sinh', 'tại UBND xã', 'ghi chú 1']
+
+
+def test_update_writes_extra_columns(tmp_path):
+    backend = _backend(tmp_path)
+    assert backend.update_knowledge_by_id('a1', {'answer': 'tại UBND phường', 'note': 'đã sửa'})[:2] == (True, None)
+    record = backend.load_knowledge().iloc[0]
+    assert (record['answer'], record['note']) == ('tại UBND phường', 'đã sửa')
+    assert backend.search_knowledge('phường')[0]['ID'] == 'a1'
+
+
+def test_blank_id_matches_nothing(tmp_path):
+    backend = _backend(tmp_path)
+    assert not backend.update_knowledge_by_id('', {'answer': 'x'})[0]
+    assert not backend.delete_knowledge_by_id('  ')[0]
+    assert len(backend.load_knowledge()) == 2
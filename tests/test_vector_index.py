@@ -0,0 +1,22 @@
+# /chatbotAI/tests/test_vector_index.py
+import numpy as np
+import pandas as pd
+
+from app.services import vector_index
+
+
+def _dataframe():
+    return pd.DataFrame({
+        'question': [f'thủ tục đăng ký khai sinh số {i}' for i in range(7)] + ['đăng ký kết hôn'],
+        'answer': ['nộp tờ khai tại UBND xã'] * 8,
+    })
+
+
+def test_chunked_build_matches_single_chunk(monkeypatch):
+    whole = vector_index.build_vector_index(_dataframe())
+    monkeypatch.setattr(vector_index, 'BUILD_CHUNK_ROWS', 3)
+    chunked = vector_index.build_vector_index(_dataframe())
+
+    assert chunked.matrix.dtype == np.float32
+    np.testing.assert_allclose(chunked.matrix, whole.matrix, atol=1e-6)
+    assert chunked.search('ket hon')[0][0] == 7
@@ -0,0 +1,14 @@
+# /chatbotAI/tests/test_vietnamese_text.py
+from app.services.vietnamese_text import split_syllables, tokenize
+
+
+def test_unaccented_stopwords_are_dropped():
+    terms = set(tokenize('khong dang ky ket hon duoc thi sao', fold=True))
+    assert not {'khong', 'duoc', 'thi', 'duoc_thi'} & terms
+    assert {'ket', 'hon', 'ket_hon', 'dang_ky'} <= terms
+
+
+def test_accented_check_keeps_dang_ky():
+    syllables, is_stopword = split_syllables('đang đăng ký', fold=True)
+    assert syllables == ['dang', 'dang', 'ky']
+    assert is_stopword == [True, False, False]
@@ -3,8 +3,9 @@ import gspread
 import pandas as pd
 from openai import OpenAI
 from flask import Flask, request, jsonify
+from app.services.google_sheets_service import get_spreadsheet, open_worksheet
 import datetime
-from threading import Thread
+from app.services.history_logger import history_logger
 # --- KHỞI TẠO ỨNG DỤNG FLASK ---
 app = Flask(__name__)
 
@@ -22,9 +23,7 @@ HISTORY_WORKSHEET_NAME = os.getenv("HISTORY_WORKSHEET_NAME")
 def get_google_sheet_data(sheet_name):
     """Kết nối với Google Sheets và đọc dữ liệu vào một DataFrame."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(sheet_name)
-        worksheet = spreadsheet.sheet1
+        worksheet = open_worksheet(sheet_name)
         data = worksheet.get_all_records()
         df = pd.DataFrame(data)
         print(f"Đọc dữ liệu từ Google Sheet '{sheet_name}' thành công.")
@@ -39,8 +38,7 @@ def get_google_sheet_data(sheet_name):
 def get_worksheet(sheet_name, worksheet_index=0):
     """Hàm trợ giúp để lấy đối tượng worksheet."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(sheet_name)
+        spreadsheet = get_spreadsheet(sheet_name)
         # Lấy sheet đầu tiên theo index
         worksheet = spreadsheet.get_worksheet(worksheet_index)
         return worksheet
@@ -81,9 +79,7 @@ def find_relevant_data(question, dataframe, max_rows=5):
 def add_data_to_google_sheet(sheet_name, data_to_add):
     """Thêm một hàng dữ liệu mới vào cuối Google Sheet."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(sheet_name)
-        worksheet = spreadsheet.sheet1
+        worksheet = open_worksheet(sheet_name)
         worksheet.append_row(data_to_add)
         return True, None
     except Exception as e:
@@ -92,9 +88,7 @@ def add_data_to_google_sheet(sheet_name, data_to_add):
 def log_chat_history(spreadsheet_name, worksheet_name, data_to_log):
     """Ghi lịch sử chat vào một trang tính cụ thể."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(spreadsheet_name)
-        worksheet = spreadsheet.worksheet(worksheet_name)
+        worksheet = open_worksheet(spreadsheet_name, worksheet_name)
         worksheet.append_row(data_to_log)
         return True, None
     except Exception as e:
@@ -149,18 +143,6 @@ def answer_question_with_deepseek(question, dataframe):
         return "Đã có lỗi xảy ra khi kết nối tới dịch vụ AI."
 
 
-def log_in_background(app_context, spreadsheet_name, worksheet_name, data_to_log):
-    """Hàm này sẽ chạy trên một thread riêng để không chặn request chính."""
-    with app_context:
-        try:
-            gc = gspread.service_account(filename='credentials.json')
-            spreadsheet = gc.open(spreadsheet_name)
-            worksheet = spreadsheet.worksheet(worksheet_name)
-            worksheet.append_row(data_to_log)
-            print("Lịch sử chat đã được ghi lại trong nền.")
-        except Exception as e:
-            print(f"Lỗi khi ghi lịch sử chat trong nền: {e}")
-
 # --- PHẦN 2: TẢI DỮ LIỆU KHI KHỞI ĐỘNG SERVER ---
 
 # Đọc dữ liệu một lần duy nhất để tối ưu hiệu suất
@@ -192,9 +174,8 @@ def ask():
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     # Thêm ID vào đầu danh sách dữ liệu để ghi lại
     log_data = [chat_id, timestamp, question, answer] 
-    # --- TỐI ƯU HÓA: GỌI HÀM GHI LOG TRONG MỘT THREAD RIÊNG ---
-    thread = Thread(target=log_in_background, args=(app.app_context(), GOOGLE_SHEET_NAME, HISTORY_WORKSHEET_NAME, log_data))
-    thread.start()
+    # --- TỐI ƯU HÓA: ĐẨY VÀO HÀNG ĐỢI, MỘT LUỒNG NỀN DUY NHẤT GHI THEO LÔ ---
+    history_logger.submit(log_data)
 
     return jsonify({'answer': answer})
 
@@ -324,9 +305,7 @@ def delete_knowledge(item_id):
 def get_log_chat():
     """Lấy danh sách toàn bộ lịch sử chat."""
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(GOOGLE_SHEET_NAME)
-        worksheet = spreadsheet.worksheet(HISTORY_WORKSHEET_NAME)
+        worksheet = open_worksheet(GOOGLE_SHEET_NAME, HISTORY_WORKSHEET_NAME)
         history_data = worksheet.get_all_records()
         return jsonify(history_data), 200
     except gspread.exceptions.WorksheetNotFound:
@@ -342,9 +321,7 @@ def get_chat_detail(chat_id):
         return jsonify({'error': 'Cần cung cấp chat_id.'}), 400
 
     try:
-        gc = gspread.service_account(filename='credentials.json')
-        spreadsheet = gc.open(GOOGLE_SHEET_NAME)
-        worksheet = spreadsheet.worksheet(HISTORY_WORKSHEET_NAME)
+        worksheet = open_worksheet(GOOGLE_SHEET_NAME, HISTORY_WORKSHEET_NAME)
         if worksheet is None:
             return jsonify({'error': f'Không tìm thấy trang tính lịch sử "{HISTORY_WORKSHEET_NAME}".'}), 404
         